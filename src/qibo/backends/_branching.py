@@ -0,0 +1,240 @@
+"""
+Branching execution of circuits with collapsing measurements used by
+:meth:`qibo.backends.numpy.NumpyBackend.execute_circuit_repeated`.
+
+Instead of simulating every shot separately, the shots are split among the
+branches of the circuit. At every collapsing measurement the outcome
+probabilities of a branch are computed once and its shots are split among the
+outcomes with a multinomial draw. Every outcome that receives shots continues
+as a new branch with the collapsed state. Unitary channels of state vector
+circuits are branched in the same way using the probabilities of their gates.
+Branches that reach the same state, up to a global phase, and agree on the
+outcomes used by the following gates are merged, so the cost of the simulation scales with the
+number of distinct branches instead of the number of shots.
+"""
+
+import numpy as np
+
+from qibo.backends._numpy_plan import ExecutionPlan
+
+
+class Branch:
+    """Group of shots that share the same state.
+
+    Args:
+        state (ndarray): state vector or density matrix of the branch.
+        histories (dict): maps the outcomes of the collapsing measurements
+            applied so far, as a tuple of decimal outcomes, to the number of
+            shots of the branch that obtained them.
+    """
+
+    def __init__(self, state, histories):
+        self.state = state
+        self.histories = histories
+
+    @property
+    def nshots(self):
+        return sum(self.histories.values())
+
+    def split(self, rng, probabilities, record):
+        """Splits the shots of the branch among the outcomes.
+
+        Args:
+            rng (:class:`numpy.random.Generator`): generator used for the draw.
+            probabilities (ndarray): probability of each outcome.
+            record (bool): if ``True`` the outcome is appended to the histories.
+
+        Returns:
+            dict: histories of the shots that obtained each outcome, for the
+            outcomes that were obtained at least once.
+        """
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        probabilities = probabilities / np.sum(probabilities)
+        histories = list(self.histories)
+        counts = rng.multinomial([self.histories[h] for h in histories], probabilities)
+        outcomes = {}
+        for outcome in np.flatnonzero(np.sum(counts, axis=0)):
+            outcomes[int(outcome)] = {
+                (h + (int(outcome),) if record else h): int(n)
+                for h, n in zip(histories, counts[:, outcome])
+                if n
+            }
+        return outcomes
+
+
+def _dependencies(steps, measurements):
+    """Collapsing measurements used by the parameters of the following steps.
+
+    Returns:
+        list: for every step, the positions in ``measurements`` of the
+        measurements whose outcomes are used by the steps after it.
+    """
+    positions = {id(gate.result): k for k, gate in enumerate(measurements)}
+    live, dependencies = set(), []
+    for step in reversed(steps):
+        dependencies.append(tuple(sorted(live)))
+        for parameter in getattr(step, "symbolic_parameters", {}).values():
+            for symbol in parameter.free_symbols:
+                result = getattr(symbol, "result", None)
+                if id(result) in positions:
+                    live.add(positions[id(result)])
+    return dependencies[::-1]
+
+
+def _live_outcomes(branch, dependencies):
+    """Outcomes of the branch that are used by the following steps."""
+    history = next(iter(branch.histories))
+    return tuple(history[k] for k in dependencies if k < len(history))
+
+
+def _equal(state, other, density_matrix, atol):
+    """Whether two states are equal, up to a global phase for state vectors."""
+    if not density_matrix:
+        overlap = np.vdot(state, other)
+        if abs(overlap) > 0:
+            other = other * (overlap / abs(overlap))
+    return np.allclose(state, other, rtol=0, atol=atol)
+
+
+def _merge(branches, dependencies, density_matrix, atol):
+    """Merges the branches with equal states and equal live outcomes."""
+    merged = []
+    for branch in branches:
+        key = _live_outcomes(branch, dependencies)
+        for other in merged:
+            if _live_outcomes(other, dependencies) == key and _equal(
+                other.state, branch.state, density_matrix, atol
+            ):
+                for h, n in branch.histories.items():
+                    other.histories[h] = other.histories.get(h, 0) + n
+                break
+        else:
+            merged.append(branch)
+    return merged
+
+
+def execute(backend, circuit, nshots, prefix_state, steps):
+    """Simulates ``nshots`` shots of a circuit by branching at every outcome.
+
+    Args:
+        backend (:class:`qibo.backends.numpy.NumpyBackend`): backend used for
+            the simulation.
+        circuit (:class:`qibo.models.circuit.Circuit`): circuit to execute.
+        nshots (int): number of shots.
+        prefix_state (ndarray): state after the deterministic prefix of the circuit.
+        steps (list): steps applied after the prefix, as returned by
+            :meth:`qibo.backends.numpy.NumpyBackend._trajectory_steps`.
+
+    Returns:
+        (ndarray, ndarray): the outcomes of the final measurements of each
+        shot in decimal form, or ``None`` if the circuit has no final
+        measurements, and for density matrices the average of the final
+        states of the branches weighted by their shots, otherwise ``None``.
+    """
+    from qibo import gates  # pylint: disable=C0415
+
+    nqubits = circuit.nqubits
+    density_matrix = circuit.density_matrix
+    measurements = [
+        step for step in steps if isinstance(step, gates.M) and step.collapse
+    ]
+    previous = [gate.result._samples for gate in measurements]
+    dependencies = _dependencies(steps, measurements)
+    atol = 10 * np.finfo(backend.dtype).eps
+
+    def substitute(step, history):
+        # outcomes of this branch are exposed as the last sample of each result
+        for gate, outcome in zip(measurements, history):
+            qubits = len(gate.target_qubits)
+            outcome = backend.samples_to_binary(np.array([outcome]), qubits)[0]
+            gate.result._samples = [outcome]
+        step.substitute_symbols()
+
+    branches = [Branch(backend.cast(prefix_state, copy=True), {(): nshots})]
+    try:
+        for step, live in zip(steps, dependencies):
+            if isinstance(step, gates.M) and step.collapse:
+                # branches may have become equal after the preceding gates
+                branches = _merge(branches, live, density_matrix, atol)
+                qubits = sorted(step.target_qubits)
+                new = []
+                for branch in branches:
+                    if density_matrix:
+                        probabilities = backend.calculate_probabilities_density_matrix(
+                            branch.state, qubits, nqubits
+                        )
+                        collapse = backend.collapse_density_matrix
+                    else:
+                        probabilities = backend.calculate_probabilities(
+                            branch.state, qubits, nqubits
+                        )
+                        collapse = backend.collapse_state
+                    outcomes = branch.split(backend.rng, probabilities, record=True)
+                    for outcome, histories in outcomes.items():
+                        state = collapse(
+                            branch.state, qubits, np.array([outcome]), nqubits
+                        )
+                        new.append(Branch(state, histories))
+                branches = _merge(new, live, density_matrix, atol)
+            elif isinstance(step, gates.UnitaryChannel) and not density_matrix:
+                branches = _merge(branches, live, density_matrix, atol)
+                probabilities = step.coefficients + (1 - np.sum(step.coefficients),)
+                new = []
+                for branch in branches:
+                    outcomes = branch.split(backend.rng, probabilities, record=False)
+                    for outcome, histories in outcomes.items():
+                        state = backend.cast(branch.state, copy=True)
+                        if outcome < len(step.gates):
+                            state = step.gates[outcome].apply(backend, state, nqubits)
+                        new.append(Branch(state, histories))
+                branches = _merge(new, live, density_matrix, atol)
+            else:
+                for branch in branches:
+                    if isinstance(step, ExecutionPlan):
+                        branch.state = step.apply(
+                            backend._writeable_state(branch.state)
+                        )
+                        continue
+                    if step.symbolic_parameters:
+                        substitute(step, next(iter(branch.histories)))
+                    if density_matrix:
+                        branch.state = step.apply_density_matrix(
+                            backend, branch.state, nqubits
+                        )
+                    else:
+                        branch.state = step.apply(backend, branch.state, nqubits)
+    finally:
+        for gate, samples in zip(measurements, previous):
+            gate.result._samples = samples
+
+    histories, samples = [], []
+    qubits = tuple(q for m in circuit.measurements for q in m.target_qubits)
+    for branch in branches:
+        for h, n in branch.histories.items():
+            histories.extend(n * [h])
+        if qubits:
+            if density_matrix:
+                probabilities = backend.calculate_probabilities_density_matrix(
+                    branch.state, qubits, nqubits
+                )
+            else:
+                probabilities = backend.calculate_probabilities(
+                    branch.state, qubits, nqubits
+                )
+            # shots of a branch are exchangeable, so the shuffled outcomes
+            # are assigned to the histories in order
+            samples.append(backend.sample_shots(probabilities, branch.nshots))
+
+    order = backend.rng.permutation(nshots)
+    histories = np.array(histories, dtype=np.int64)[order]
+    for k, gate in enumerate(measurements):
+        binary = backend.samples_to_binary(histories[:, k], len(gate.target_qubits))
+        for sample in binary:
+            gate.result.add_shot_from_sample(sample)
+
+    state = None
+    if density_matrix:
+        state = sum(branch.nshots / nshots * branch.state for branch in branches)
+    if not qubits:
+        return None, state
+    return np.concatenate(samples)[order], state
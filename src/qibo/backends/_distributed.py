@@ -0,0 +1,228 @@
+"""
+Multiprocess execution of distributed circuits used by
+:meth:`qibo.backends.numpy.NumpyBackend.execute_distributed_circuit`.
+
+The state vector is split to ``ndevices`` pieces of ``2 ** nlocal`` amplitudes
+following the global qubits chosen by
+:class:`qibo.models.distcircuit.DistributedQueues`. All pieces are stored in a
+single :class:`multiprocessing.shared_memory.SharedMemory` segment, so that
+worker processes update them in place without copying the state through
+pipes. Every gate group of the distributed queues is applied by the workers,
+one task per piece, with the in-place kernels. The SWAPs between global and
+local qubits exchange half of the amplitudes between pairs of pieces, which
+the workers also do directly in shared memory. Special gates, such as
+callbacks, are applied by the main process on the merged state.
+
+The workers belong to a persistent pool of :mod:`qibo.backends._process_pool`,
+which is reused by later executions with the same number of processes and
+terminated when the interpreter exits.
+"""
+
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from qibo.backends import _numpy_kernels, _process_pool
+from qibo.config import raise_error
+
+# shared memory segments attached by the current worker process
+_segments = {}
+
+
+def _pieces(name, shape, dtype):
+    """View of the state pieces stored in the shared memory segment ``name``."""
+    if name not in _segments:
+        # the workers are persistent, so the segments of previous executions,
+        # already unlinked by the main process, are released here
+        for segment in _segments.values():
+            segment.close()
+        _segments.clear()
+        _segments[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=_segments[name].buf)
+
+
+def _apply(task):
+    """Applies the gates of a group to a piece of the state in place."""
+    name, shape, dtype, index, ops = task
+    piece = _pieces(name, shape, dtype)[index]
+    nlocal = int(np.log2(shape[1]))
+    for matrix, targets, controls in ops:
+        result = _numpy_kernels.apply_gate_matrix(
+            piece, matrix, targets, nlocal, controls
+        )
+        if result is not piece:  # pragma: no cover
+            piece[:] = result
+
+
+def _swap(task):
+    """Exchanges the amplitudes of a global-local SWAP between two pieces.
+
+    Piece ``i`` has the global qubit in state 0 and piece ``j`` in state 1, so
+    the amplitudes of ``i`` with the local qubit in state 1 are exchanged with
+    the amplitudes of ``j`` with the local qubit in state 0.
+    """
+    name, shape, dtype, i, j, local = task
+    pieces = _pieces(name, shape, dtype)
+    view = (2**local, 2, -1)
+    first = np.reshape(pieces[i], view)
+    second = np.reshape(pieces[j], view)
+    # exchange in slices to bound the temporary buffer
+    step = max(1, _numpy_kernels.CHUNK_SIZE // (first.shape[2] or 1))
+    for start in range(0, first.shape[0], step):
+        rows = slice(start, start + step)
+        buffer = np.copy(first[rows, 1])
+        first[rows, 1] = second[rows, 0]
+        second[rows, 0] = buffer
+
+
+class DistributedState:
+    """State vector split to pieces in shared memory.
+
+    Args:
+        backend (:class:`qibo.backends.numpy.NumpyBackend`): backend used to
+            build the gate matrices and apply special gates.
+        circuit (:class:`qibo.models.circuit.Circuit`): distributed circuit.
+    """
+
+    def __init__(self, backend, circuit):
+        self.backend = backend
+        self.circuit = circuit
+        self.qubits = circuit.queues.qubits
+        self.shape = (circuit.ndevices, 2**circuit.nlocal)
+        self.dtype = np.dtype(backend.dtype)
+        size = 2**circuit.nqubits * self.dtype.itemsize
+        try:
+            memory = os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (AttributeError, ValueError, OSError):  # pragma: no cover
+            memory = None
+        # shared memory is allocated lazily, so it would only fail when written
+        if memory is not None and size > memory:
+            raise_error(
+                MemoryError,
+                f"State of {size} bytes does not fit in {memory} bytes of memory.",
+            )
+        self.segment = shared_memory.SharedMemory(create=True, size=size)
+        self.pieces = np.ndarray(self.shape, dtype=self.dtype, buffer=self.segment.buf)
+
+    def close(self):
+        """Releases the shared memory segment."""
+        # views of the buffer must be released before closing it
+        self.pieces = None
+        self.segment.close()
+        self.segment.unlink()
+
+    def set(self, state=None):
+        """Splits a full state vector to the pieces."""
+        if state is None:
+            self.pieces.fill(0)
+            self.pieces[0, 0] = 1
+            return
+        nqubits = self.circuit.nqubits
+        state = np.reshape(state, nqubits * (2,))
+        state = np.transpose(state, self.qubits.transpose_order)
+        self.pieces[:] = np.reshape(state, self.shape)
+
+    def merge(self):
+        """Returns the full state vector as a new array."""
+        nqubits = self.circuit.nqubits
+        state = np.reshape(self.pieces, nqubits * (2,))
+        state = np.transpose(state, self.qubits.reverse_transpose_order)
+        return np.array(np.reshape(state, (2**nqubits,)), copy=True)
+
+    def _ops(self, queue, matrices):
+        ops = []
+        for gate in queue:
+            if id(gate) not in matrices:
+                targets = gate.target_qubits
+                matrix = np.asarray(
+                    self.backend.to_numpy(self.backend._gate_matrix(gate))
+                )
+                if not gate.is_controlled_by:
+                    # controls defined in the matrix, such as the control of
+                    # CNOT, that may have been removed if they are global
+                    matrix = matrix[-(2 ** len(targets)) :, -(2 ** len(targets)) :]
+                matrices[id(gate)] = (matrix, targets, gate.control_qubits)
+            ops.append(matrices[id(gate)])
+        return ops
+
+    def _special(self, gate):
+        from qibo import gates  # pylint: disable=C0415
+
+        nqubits = self.circuit.nqubits
+        state = self.merge()
+        if isinstance(gate, gates.CallbackGate):
+            # callbacks see the original order of the qubits
+            for pair in reversed(gate.swap_reset):
+                state = self.backend.apply_gate(gates.SWAP(*pair), state, nqubits)
+            gate.apply(self.backend, state, nqubits)
+        else:
+            self.set(gate.apply(self.backend, state, nqubits))
+
+    def execute(self, pool):
+        """Applies the distributed queues of the circuit using ``pool``."""
+        queues = self.circuit.queues
+        name, dtype = self.segment.name, self.dtype.str
+        nglobal = self.circuit.nglobal
+        special = iter(queues.special_queue)
+        # matrices are calculated once for every device gate
+        matrices = {}
+        for group in queues.queues:
+            if group:
+                tasks = [
+                    (name, self.shape, dtype, index, self._ops(queue, matrices))
+                    for index, queue in enumerate(group)
+                    if queue
+                ]
+                pool.map(_apply, tasks)
+                continue
+
+            gate = next(special)
+            if isinstance(gate, tuple):
+                global_qubit, local_qubit = gate
+                bit = 2 ** (nglobal - self.qubits.reduced_global[global_qubit] - 1)
+                local = self.qubits.reduced_local[local_qubit]
+                tasks = [
+                    (name, self.shape, dtype, i, i | bit, local)
+                    for i in range(self.shape[0])
+                    if not i & bit
+                ]
+                pool.map(_swap, tasks)
+            else:
+                self._special(gate)
+
+
+def execute(backend, circuit, initial_state=None, processes=None):
+    """Executes a distributed circuit using worker processes.
+
+    Args:
+        backend (:class:`qibo.backends.numpy.NumpyBackend`): backend used for
+            the execution.
+        circuit (:class:`qibo.models.circuit.Circuit`): circuit with
+            ``accelerators``. Every logical device holds a piece of the state
+            and the device names are ignored.
+        initial_state (ndarray, optional): initial state vector. If ``None``,
+            the zero state is used.
+        processes (int, optional): number of worker processes. If ``None``,
+            it is the smaller of the number of logical devices and CPUs.
+
+    Returns:
+        ndarray: the final state vector.
+    """
+    queues = circuit.queues
+    if not queues.queues:
+        queues.set(circuit.queue)
+    if processes is None:
+        processes = min(circuit.ndevices, os.cpu_count() or 1)
+    if processes < 1:
+        raise_error(
+            ValueError, f"Number of processes must be positive, not {processes}."
+        )
+
+    state = DistributedState(backend, circuit)
+    try:
+        state.set(None if initial_state is None else backend.to_numpy(initial_state))
+        state.execute(_process_pool.get_plain_pool(processes))
+        return state.merge()
+    finally:
+        state.close()
@@ -0,0 +1,171 @@
+"""
+Asynchronous circuit execution used by :meth:`qibo.backends.abstract.Backend.submit`.
+
+Submitted circuits are executed by a pool of local worker threads, so that
+the caller can prepare the next circuits or process the previous results
+while the simulations run. The numpy kernels release the GIL on large
+operations, which lets several simulations proceed at the same time. The
+number of jobs that are waiting or running is bounded: when the queue is
+full, :meth:`JobExecutor.submit` blocks until a job finishes, which applies
+backpressure to producers that submit faster than the workers execute.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from qibo.config import raise_error
+
+# default number of jobs waiting for a worker, per worker thread
+QUEUE_PER_WORKER = 4
+
+
+@dataclass
+class JobTiming:
+    """Timestamps of a job, from :func:`time.perf_counter`.
+
+    Args:
+        submitted (float): time when the job was submitted.
+        started (float): time when a worker started executing the job, or
+            ``None`` if it has not started.
+        finished (float): time when the job finished, or ``None`` if it has
+            not finished.
+    """
+
+    submitted: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def queued(self):
+        """Seconds that the job waited for a worker."""
+        if self.started is None:
+            return None
+        return self.started - self.submitted
+
+    @property
+    def duration(self):
+        """Seconds that the execution of the job took."""
+        if self.finished is None or self.started is None:
+            return None
+        return self.finished - self.started
+
+
+class Job(Future):
+    """Future of a circuit submitted with :meth:`qibo.backends.abstract.Backend.submit`.
+
+    It is a :class:`concurrent.futures.Future`, whose result is the result of
+    the circuit execution, and it can also be awaited in a coroutine.
+
+    Args:
+        circuit (:class:`qibo.models.circuit.Circuit`): the submitted circuit.
+    """
+
+    def __init__(self, circuit):
+        super().__init__()
+        self.circuit = circuit
+        self.timing = JobTiming(time.perf_counter())
+
+    def __await__(self):
+        return asyncio.wrap_future(self).__await__()
+
+
+class JobExecutor:
+    """Pool of worker threads executing circuits with a bounded queue.
+
+    Args:
+        backend (:class:`qibo.backends.abstract.Backend`): backend executing
+            the circuits.
+        workers (int, optional): number of worker threads. If ``None``, the
+            number of CPUs is used.
+        max_queue (int, optional): maximum number of jobs waiting for a
+            worker. If ``None``, it is ``QUEUE_PER_WORKER`` jobs per worker.
+    """
+
+    def __init__(self, backend, workers=None, max_queue=None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if max_queue is None:
+            max_queue = QUEUE_PER_WORKER * workers
+        if workers < 1 or max_queue < 0:
+            raise_error(
+                ValueError,
+                f"Invalid job executor with {workers} workers and queue of {max_queue}.",
+            )
+        self.backend = backend
+        self.workers = workers
+        self.max_queue = max_queue
+        # a slot is taken by every job that is waiting or running
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="qibo-job")
+
+    def _run(self, job, initial_state, nshots):
+        if not job.set_running_or_notify_cancel():
+            return
+        job.timing.started = time.perf_counter()
+        try:
+            result = self.backend.execute_circuit(job.circuit, initial_state, nshots)
+        except BaseException as exception:  # pylint: disable=broad-except
+            job.timing.finished = time.perf_counter()
+            job.set_exception(exception)
+        else:
+            job.timing.finished = time.perf_counter()
+            job.set_result(result)
+
+    def _release(self, job):
+        with self._lock:
+            self._pending.discard(job)
+        self._slots.release()
+
+    def submit(self, circuit, initial_state=None, nshots=1000, timeout=None):
+        """Submits a circuit for execution.
+
+        Args:
+            circuit (:class:`qibo.models.circuit.Circuit`): circuit to execute.
+            initial_state (ndarray, optional): initial state of the execution.
+            nshots (int, optional): number of shots.
+            timeout (float, optional): seconds to wait for a free place in the
+                queue. If ``None``, it waits until a place is free. If the
+                queue is still full after ``timeout``, ``TimeoutError`` is raised.
+
+        Returns:
+            :class:`qibo.backends._jobs.Job`: the future of the execution.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise_error(
+                TimeoutError,
+                f"Job queue is full with {self.workers + self.max_queue} jobs.",
+            )
+        job = Job(circuit)
+        with self._lock:
+            self._pending.add(job)
+        job.add_done_callback(self._release)
+        try:
+            self._pool.submit(self._run, job, initial_state, nshots)
+        except RuntimeError:
+            # the executor was shut down
+            job.cancel()
+            raise
+        return job
+
+    def shutdown(self, wait=True, cancel=False):
+        """Stops the workers after the submitted jobs.
+
+        Args:
+            wait (bool, optional): if ``True``, waits for the running and
+                queued jobs to finish.
+            cancel (bool, optional): if ``True``, the jobs that did not start
+                are cancelled.
+        """
+        if cancel:
+            with self._lock:
+                pending = list(self._pending)
+            for job in pending:
+                job.cancel()
+        self._pool.shutdown(wait=wait)
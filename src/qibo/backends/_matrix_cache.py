@@ -0,0 +1,107 @@
+"""
+Bounded cache of gate matrices used by :class:`qibo.backends.numpy.NumpyBackend`.
+"""
+
+import collections
+import threading
+
+from qibo.config import raise_error
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "maxsize", "currsize", "policy"]
+)
+
+
+class MatrixCache:
+    """Bounded mapping from gate keys to gate matrices.
+
+    Args:
+        maxsize (int): maximum number of matrices held in the cache. If ``0``,
+            nothing is cached. Defaults to ``1024``.
+        policy (str): eviction policy applied when the cache is full. ``"lru"``
+            evicts the least recently used matrix, ``"fifo"`` evicts the oldest
+            one. Defaults to ``"lru"``.
+    """
+
+    POLICIES = ("lru", "fifo")
+
+    def __init__(self, maxsize=1024, policy="lru"):
+        self._data = collections.OrderedDict()
+        # circuits may be executed concurrently, for example by submitted jobs
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.configure(maxsize, policy)
+
+    def configure(self, maxsize=None, policy=None):
+        """Changes the size and eviction policy of the cache.
+
+        Args:
+            maxsize (int, optional): new maximum number of cached matrices.
+                If ``None``, the size is not changed.
+            policy (str, optional): new eviction policy, either ``"lru"`` or
+                ``"fifo"``. If ``None``, the policy is not changed.
+        """
+        if maxsize is not None:
+            if not isinstance(maxsize, int) or maxsize < 0:
+                raise_error(
+                    ValueError,
+                    f"Matrix cache size must be a non-negative integer, not {maxsize}.",
+                )
+            self.maxsize = maxsize
+        if policy is not None:
+            if policy not in self.POLICIES:
+                raise_error(
+                    ValueError,
+                    f"Unknown matrix cache policy {policy}. "
+                    f"Available policies are {self.POLICIES}.",
+                )
+            self.policy = policy
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key, build):
+        """Returns the matrix stored under ``key``, building it on a miss.
+
+        Args:
+            key (tuple): hashable key identifying the matrix. If ``None``, the
+                matrix is built and returned without being cached.
+            build (callable): function without arguments that builds the matrix.
+        """
+        if key is None or not self.maxsize:
+            return build()
+        with self._lock:
+            matrix = self._data.get(key)
+            if matrix is not None:
+                self.hits += 1
+                if self.policy == "lru":
+                    self._data.move_to_end(key)
+                return matrix
+            self.misses += 1
+        matrix = build()
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                self._data.popitem(last=False)
+            self._data[key] = matrix
+        return matrix
+
+    def clear(self):
+        """Removes all matrices from the cache and resets the statistics."""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """Returns the hit and miss statistics of the cache.
+
+        Returns:
+            ``CacheInfo``: named tuple with the number of ``hits`` and ``misses``,
+            the ``maxsize``, the current number of cached matrices
+            ``currsize`` and the eviction ``policy``.
+        """
+        return CacheInfo(
+            self.hits, self.misses, self.maxsize, len(self._data), self.policy
+        )
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,374 @@
+"""
+In-place kernels used by :meth:`qibo.backends.numpy.NumpyBackend.apply_gate`.
+
+Instead of contracting the full state with ``einsum``, which allocates a new
+state for every gate, the kernels below update strided views of the state
+vector. Temporary buffers are bounded to ``CHUNK_SIZE`` elements, so that the
+memory required to apply a gate does not scale with the size of the state.
+
+Chunks are selected along axes that the gate does not act on, therefore they
+are independent and, when the kernels are given :class:`Threads` with more
+than one thread, they are updated concurrently by a thread pool. Numpy
+releases the GIL during these element-wise operations.
+"""
+
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from qibo.backends import einsum_utils
+
+# maximum number of state elements that are copied at once by the kernels
+CHUNK_SIZE = 2**18
+
+# maximum number of qubits of the phase tensor of merged diagonal gates
+MAX_DIAGONAL_QUBITS = 10
+
+# minimum number of state elements per chunk when more than one thread is used
+MIN_THREAD_CHUNK_SIZE = 2**14
+
+
+class Threads:
+    """Threads that update independent chunks of the state concurrently.
+
+    Every :class:`qibo.backends.numpy.NumpyBackend` holds its own instance,
+    so that the number of threads of a backend does not affect the others.
+    The thread pool is created lazily in the process that uses it.
+
+    Args:
+        nthreads (int): number of threads. Defaults to ``1``.
+    """
+
+    def __init__(self, nthreads=1):
+        self.nthreads = nthreads
+        # thread pool and the id of the process that created it
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None or self._pool[0] != os.getpid():
+            # threads are not inherited by forked processes
+            self._pool = (os.getpid(), ThreadPoolExecutor(self.nthreads))
+        return self._pool[1]
+
+    def map(self, func, indices):
+        """Calls ``func`` on each chunk index, concurrently if ``nthreads > 1``."""
+        if self.nthreads > 1:
+            indices = list(indices)
+            if len(indices) > 1:
+                # consuming the results raises the exceptions of the threads
+                list(self._executor().map(func, indices))
+                return
+        for index in indices:
+            func(index)
+
+    def shutdown(self):
+        """Stops the threads of the pool, which is created again when needed."""
+        if self._pool is not None and self._pool[0] == os.getpid():
+            self._pool[1].shutdown(wait=False)
+        self._pool = None
+
+    def __getstate__(self):
+        # thread pools cannot be copied or sent to other processes
+        return {"nthreads": self.nthreads, "_pool": None}
+
+
+# threads of kernels called without a backend
+SERIAL = Threads()
+
+
+def target_view(state, targets, nqubits):
+    """Reshapes ``state`` so that every target qubit has its own axis.
+
+    Args:
+        state (ndarray): contiguous state vector of ``2 ** nqubits`` elements,
+            or batch of such state vectors stacked along the first axis.
+        targets (tuple): qubit ids that the gate acts on.
+        nqubits (int): total number of qubits in ``state``.
+
+    Returns:
+        (ndarray, list): view of ``state`` with shape
+        ``(L0, 2, L1, 2, ..., Lk)`` and the axis corresponding to each
+        qubit of ``targets``.
+    """
+    sorted_targets = sorted(targets)
+    shape, previous = [], -1
+    for target in sorted_targets:
+        shape.extend((2 ** (target - previous - 1), 2))
+        previous = target
+    shape.append(2 ** (nqubits - previous - 1))
+    # a leading batch of states is merged to the most significant axis
+    shape[0] = -1
+    axes = [2 * sorted_targets.index(target) + 1 for target in targets]
+    return np.reshape(state, shape), axes
+
+
+def chunks(view, axes, nthreads=1):
+    """Splits ``view`` along its largest axis that is not in ``axes``.
+
+    When ``nthreads > 1``, the view is split to at least ``nthreads`` chunks,
+    as long as they contain ``MIN_THREAD_CHUNK_SIZE`` elements or more.
+
+    Yields:
+        list: index (one entry per axis of ``view``) selecting a chunk of
+        at most ``CHUNK_SIZE`` elements.
+    """
+    free = [axis for axis in range(view.ndim) if axis not in axes]
+    axis = max(free, key=lambda a: view.shape[a])
+    size = view.shape[axis]
+    step = max(1, CHUNK_SIZE * size // view.size)
+    if nthreads > 1:
+        minimum = max(1, MIN_THREAD_CHUNK_SIZE * size // view.size)
+        step = min(step, max(-(-size // nthreads), minimum))
+    for start in range(0, size, step):
+        index = view.ndim * [slice(None)]
+        index[axis] = slice(start, start + step)
+        yield index
+
+
+def _matrix_rows(matrix):
+    """Splits each row of ``matrix`` to its diagonal and non-zero off-diagonal entries."""
+    rows = []
+    for i, row in enumerate(matrix):
+        offdiagonal = [(j, value) for j, value in enumerate(row) if j != i and value]
+        rows.append((row[i], offdiagonal))
+    return rows
+
+
+def _update(target, diagonal, offdiagonal, originals):
+    """Computes ``diagonal * target + sum(value * originals[j])`` in place."""
+    if diagonal:
+        if diagonal != 1:
+            target *= diagonal
+    elif offdiagonal:
+        (j, value), offdiagonal = offdiagonal[0], offdiagonal[1:]
+        if value == 1:
+            target[...] = originals[j]
+        else:
+            np.multiply(originals[j], value, out=target)
+    else:
+        target[...] = 0
+    for j, value in offdiagonal:
+        if value == 1:
+            target += originals[j]
+        else:
+            target += value * originals[j]
+
+
+def apply_matrix(state, matrix, targets, nqubits, controls=(), threads=SERIAL):
+    """Applies ``matrix`` to the ``targets`` of ``state`` modifying it in place.
+
+    Zero entries of ``matrix`` are skipped and only the slices that are read
+    after being overwritten are copied. Therefore, diagonal gates reduce to
+    in-place multiplications and permutation gates such as
+    :class:`qibo.gates.CNOT` or :class:`qibo.gates.SWAP` reduce to copies.
+
+    Args:
+        state (ndarray): contiguous and writeable state vector.
+        matrix (ndarray): ``2 ** k x 2 ** k`` matrix, where ``k = len(targets)``.
+        targets (tuple): qubit ids that ``matrix`` acts on, ordered as the
+            matrix indices.
+        nqubits (int): total number of qubits in ``state``.
+        controls (tuple): qubit ids that control the gate. Only the part of
+            ``state`` where all controls are active is updated.
+        threads (:class:`Threads`): threads that update the chunks of ``state``.
+
+    Returns:
+        ndarray: the updated ``state``.
+    """
+    view, axes = target_view(state, tuple(controls) + tuple(targets), nqubits)
+    control_axes, axes = axes[: len(controls)], axes[len(controls) :]
+    basis = list(itertools.product((0, 1), repeat=len(targets)))
+    rows = _matrix_rows(matrix)
+    needed = {j for _, offdiagonal in rows for j, _ in offdiagonal}
+
+    def update(index):
+        for axis in control_axes:
+            index[axis] = 1
+        slices = []
+        for bits in basis:
+            for axis, bit in zip(axes, bits):
+                index[axis] = bit
+            slices.append(view[tuple(index)])
+        originals = {j: slices[j].copy() for j in needed}
+        for target, (diagonal, offdiagonal) in zip(slices, rows):
+            _update(target, diagonal, offdiagonal, originals)
+
+    threads.map(update, chunks(view, control_axes + axes, threads.nthreads))
+    return state
+
+
+def apply_einsum(state, matrix, targets, nqubits, controls=(), threads=SERIAL):
+    """Equivalent to :func:`apply_matrix` using ``einsum`` on chunks of ``state``.
+
+    Used for gates acting on many target qubits, where the number of
+    terms in :func:`apply_matrix` grows exponentially.
+    """
+    view, axes = target_view(state, tuple(controls) + tuple(targets), nqubits)
+    control_axes, axes = axes[: len(controls)], axes[len(controls) :]
+    matrix = np.reshape(matrix, 2 * len(targets) * (2,))
+    labels = list(range(view.ndim))
+    new_labels = list(range(view.ndim, view.ndim + len(targets)))
+    out_labels = list(labels)
+    for axis, label in zip(axes, new_labels):
+        out_labels[axis] = label
+    subscripts = (tuple(new_labels + axes), tuple(labels), tuple(out_labels))
+
+    def update(index):
+        for axis in control_axes:
+            index[axis] = slice(1, 2)
+        piece = view[tuple(index)]
+        path = einsum_utils.einsum_path(subscripts, matrix.shape, piece.shape)
+        piece[...] = np.einsum(
+            matrix, new_labels + axes, piece, labels, out_labels, optimize=path
+        )
+
+    threads.map(update, chunks(view, control_axes + axes, threads.nthreads))
+    return state
+
+
+def apply_batched(state, matrices, targets, nqubits, controls=(), threads=SERIAL):
+    """Applies a different matrix to each state of a batch modifying it in place.
+
+    Args:
+        state (ndarray): contiguous and writeable batch of state vectors, of
+            shape ``(batch, 2 ** nqubits)``.
+        matrices (ndarray): batch of matrices, of shape
+            ``(batch, 2 ** k, 2 ** k)`` where ``k = len(targets)``.
+        targets (tuple): qubit ids that the matrices act on, ordered as the
+            matrix indices.
+        nqubits (int): total number of qubits in each state.
+        controls (tuple): qubit ids that control the gate.
+        threads (:class:`Threads`): threads that update the chunks of ``state``.
+
+    Returns:
+        ndarray: the updated ``state``.
+    """
+    batch, ntargets = len(matrices), len(targets)
+    view, axes = target_view(state, tuple(controls) + tuple(targets), nqubits)
+    view = np.reshape(view, (batch, -1) + view.shape[1:])
+    axes = [axis + 1 for axis in axes]
+    control_axes, axes = axes[: len(controls)], axes[len(controls) :]
+    phases = np.diagonal(matrices, axis1=1, axis2=2)
+    if np.count_nonzero(matrices) == np.count_nonzero(phases):
+        order = [0] + [1 + i for i in np.argsort(targets)]
+        phases = np.transpose(np.reshape(phases, (batch,) + ntargets * (2,)), order)
+        shape = [batch] + (view.ndim - 1) * [1]
+        for axis in axes:
+            shape[axis] = 2
+        index = view.ndim * [slice(None)]
+        for axis in control_axes:
+            index[axis] = slice(1, 2)
+        view[tuple(index)] *= np.reshape(phases, shape)
+        return state
+
+    matrices = np.reshape(matrices, (batch,) + 2 * ntargets * (2,))
+    labels = list(range(view.ndim))
+    new_labels = list(range(view.ndim, view.ndim + ntargets))
+    out_labels = list(labels)
+    for axis, label in zip(axes, new_labels):
+        out_labels[axis] = label
+
+    def update(index):
+        for axis in control_axes:
+            index[axis] = slice(1, 2)
+        piece = view[tuple(index)]
+        piece[...] = np.einsum(
+            matrices[index[0]], [0] + new_labels + axes, piece, labels, out_labels
+        )
+
+    threads.map(update, chunks(view, control_axes + axes, threads.nthreads))
+    return state
+
+
+def diagonal(matrix):
+    """Returns the diagonal of ``matrix`` if it is diagonal, otherwise ``None``."""
+    phases = np.diagonal(matrix)
+    if np.count_nonzero(matrix) != np.count_nonzero(phases):
+        return None
+    return np.array(phases)
+
+
+def _broadcast(phases, targets, axes, ndim):
+    """Reshapes the diagonal of a gate acting on ``targets`` for broadcasting.
+
+    Args:
+        phases (ndarray): diagonal of the gate matrix.
+        targets (tuple): qubit ids that the gate acts on.
+        axes (list): axis corresponding to each qubit of ``targets`` in
+            the array that ``phases`` is broadcasted to.
+        ndim (int): rank of the array that ``phases`` is broadcasted to.
+    """
+    order = np.argsort(targets)
+    phases = np.transpose(np.reshape(phases, len(targets) * (2,)), order)
+    shape = ndim * [1]
+    for axis in axes:
+        shape[axis] = 2
+    return np.reshape(phases, shape)
+
+
+def apply_diagonal(state, phases, targets, nqubits, controls=(), threads=SERIAL):
+    """Multiplies ``state`` in place with the diagonal of a gate.
+
+    Args:
+        state (ndarray): contiguous and writeable state vector.
+        phases (ndarray): diagonal of the gate matrix, of ``2 ** k`` elements.
+        targets (tuple): qubit ids that the gate acts on, ordered as the
+            matrix indices.
+        nqubits (int): total number of qubits in ``state``.
+        controls (tuple): qubit ids that control the gate.
+        threads (:class:`Threads`): threads that update the chunks of ``state``.
+
+    Returns:
+        ndarray: the updated ``state``.
+    """
+    view, axes = target_view(state, tuple(controls) + tuple(targets), nqubits)
+    control_axes, axes = axes[: len(controls)], axes[len(controls) :]
+    phases = _broadcast(phases, targets, axes, view.ndim)
+    if threads.nthreads == 1:
+        index = view.ndim * [slice(None)]
+        for axis in control_axes:
+            index[axis] = slice(1, 2)
+        view[tuple(index)] *= phases
+        return state
+
+    def update(index):
+        for axis in control_axes:
+            index[axis] = slice(1, 2)
+        view[tuple(index)] *= phases
+
+    threads.map(update, chunks(view, control_axes + axes, threads.nthreads))
+    return state
+
+
+def merge_diagonals(phases1, targets1, phases2, targets2):
+    """Merges the diagonals of two gates to the diagonal of their product.
+
+    Returns:
+        (ndarray, tuple): diagonal of the product and the qubit ids that it
+        acts on, in increasing order.
+    """
+    targets = tuple(sorted(set(targets1) | set(targets2)))
+    ndim = len(targets)
+    axes1 = [targets.index(q) for q in targets1]
+    axes2 = [targets.index(q) for q in targets2]
+    phases = _broadcast(phases1, targets1, axes1, ndim) * _broadcast(
+        phases2, targets2, axes2, ndim
+    )
+    return np.reshape(phases, (2**ndim,)), targets
+
+
+def apply_gate_matrix(state, matrix, targets, nqubits, controls=(), threads=SERIAL):
+    """Applies a gate matrix to ``state`` in place using the best suited kernel.
+
+    Diagonal matrices are applied with :func:`apply_diagonal`, one- and
+    two-qubit matrices with :func:`apply_matrix` and larger matrices with
+    :func:`apply_einsum`.
+    """
+    phases = diagonal(matrix)
+    if phases is not None:
+        return apply_diagonal(state, phases, targets, nqubits, controls, threads)
+    if len(targets) <= 2:
+        return apply_matrix(state, matrix, targets, nqubits, controls, threads)
+    return apply_einsum(state, matrix, targets, nqubits, controls, threads)
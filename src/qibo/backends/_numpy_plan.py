@@ -0,0 +1,179 @@
+"""
+Execution plans used by :meth:`qibo.backends.numpy.NumpyBackend.compile_circuit`.
+
+A plan walks the circuit queue once and stores, for every gate, the kernel of
+:mod:`qibo.backends._numpy_kernels` that applies it together with its
+arguments. Matrices of gates whose parameters cannot change are built, cast and
+classified (diagonal, one- and two-qubit or larger) at compile time, and
+consecutive diagonal gates are merged to a single phase tensor. Parametrized
+gates are kept as slots whose matrix is read from the gate on every execution,
+so that :meth:`qibo.models.circuit.Circuit.set_parameters` still applies to
+compiled circuits. Plans of circuit templates instead bind the trainable gates
+to a flat array of parameters given to every execution, so that the gates are
+never modified and a plan can be executed concurrently.
+"""
+
+import numpy as np
+
+from qibo.backends import _numpy_kernels
+
+
+def _kernel(matrix):
+    """Kernel of :mod:`qibo.backends._numpy_kernels` and the array passed to it."""
+    phases = _numpy_kernels.diagonal(matrix)
+    if phases is not None:
+        return _numpy_kernels.apply_diagonal, phases
+    if len(matrix) <= 4:
+        return _numpy_kernels.apply_matrix, matrix
+    return _numpy_kernels.apply_einsum, matrix
+
+
+class ExecutionPlan:
+    """Precompiled sequence of in-place kernels executing a state vector circuit.
+
+    Args:
+        backend (:class:`qibo.backends.numpy.NumpyBackend`): backend used to
+            build the gate matrices.
+        circuit (:class:`qibo.models.circuit.Circuit`): circuit to compile.
+            It should be a state vector circuit without collapsing
+            measurements, channels and callbacks.
+        queue (list, optional): gates of ``circuit`` to compile. If ``None``,
+            the whole queue of ``circuit`` is compiled. Defaults to ``None``.
+        bind (bool, optional): if ``True``, the matrices of the trainable gates
+            are built from the parameters given to :meth:`apply` and all other
+            gates are compiled with their current parameters. Defaults to
+            ``False``.
+    """
+
+    def __init__(self, backend, circuit, queue=None, bind=False):
+        self.backend = backend
+        self.circuit = circuit
+        self.nqubits = circuit.nqubits
+        # offsets of the parameters of the bound gates in the flat parameters
+        self.bind = bind
+        self.offsets = {}
+        if bind:
+            offset = 0
+            for gate in circuit.trainable_gates:
+                self.offsets[gate] = offset
+                offset += gate.nparams
+        self.steps = []
+        phases, targets = None, ()
+        for gate in circuit.queue if queue is None else queue:
+            diagonal = None if self._is_slot(gate) else backend._diagonal(gate)
+            if diagonal is not None and phases is not None:
+                qubits = set(targets) | set(diagonal[1])
+                if len(qubits) <= _numpy_kernels.MAX_DIAGONAL_QUBITS:
+                    phases, targets = _numpy_kernels.merge_diagonals(
+                        phases, targets, *diagonal
+                    )
+                    continue
+            if phases is not None:
+                self._add_kernel(_numpy_kernels.apply_diagonal, phases, targets)
+                phases = None
+            if diagonal is not None:
+                phases, targets = diagonal
+            else:
+                self._add_gate(gate)
+        if phases is not None:
+            self._add_kernel(_numpy_kernels.apply_diagonal, phases, targets)
+
+    def _is_unitary(self, gate):
+        """Whether ``gate`` can be applied through its matrix."""
+        from qibo import gates  # pylint: disable=C0415
+
+        if isinstance(gate, gates.FusedGate):
+            return all(self._is_unitary(subgate) for subgate in gate.gates)
+        return gate.unitary
+
+    def _is_slot(self, gate):
+        """Whether the matrix of ``gate`` has to be rebuilt on every execution."""
+        from qibo import gates  # pylint: disable=C0415
+
+        if isinstance(gate, gates.FusedGate):
+            return any(self._is_slot(subgate) for subgate in gate.gates)
+        if self.bind:
+            return gate in self.offsets
+        return isinstance(gate, gates.ParametrizedGate)
+
+    def _add_kernel(self, kernel, matrix, targets, controls=()):
+        self.steps.append((kernel, matrix, tuple(targets), tuple(controls)))
+
+    def _add_gate(self, gate):
+        if not self._is_unitary(gate):
+            # for example measurements that do not collapse the state
+            self.steps.append((None, gate, None, None))
+            return
+        targets, controls = self.backend._kernel_qubits(gate)
+        if self._is_slot(gate):
+            self._add_kernel(None, gate, targets, controls)
+            return
+        matrix = np.array(self.backend.to_numpy(self.backend._gate_matrix(gate)))
+        self._add_kernel(*_kernel(matrix), targets, controls)
+
+    def __call__(self, initial_state=None, nshots=1000):
+        """Executes the plan and returns the final state vector.
+
+        Initial states that are not a single state vector, such as batches
+        of states or circuits, are executed with
+        :meth:`qibo.backends.numpy.NumpyBackend.execute_circuit`.
+        """
+        backend, nqubits = self.backend, self.nqubits
+        if initial_state is None:
+            state = backend.zero_state(nqubits)
+        elif getattr(initial_state, "shape", None) == (2**nqubits,):
+            # copy, because gates are applied in place
+            state = np.array(initial_state, dtype=backend.dtype)
+        else:
+            return backend.execute_circuit(self.circuit, initial_state, nshots).state()
+        return self.apply(state)
+
+    def _bound_matrix(self, gate, parameters):
+        """Matrix of a bound gate, or batch of matrices for a batch of parameters."""
+        offset = self.offsets[gate]
+        values = parameters[..., offset : offset + gate.nparams]
+        if gate.__class__.__name__ == "Unitary":
+            dim = 2 ** len(gate.target_qubits)
+            shape = values.shape[:-1] + (dim, dim)
+            return np.reshape(values, shape).astype(self.backend.dtype)
+        if values.ndim == 1:
+            return self.backend._batched_matrix(gate, values[:, None])[0]
+        return self.backend._batched_matrix(gate, values.T)
+
+    def apply(self, state, parameters=None):
+        """Applies the compiled gates to a contiguous and writeable state vector,
+        modifying it in place.
+
+        For plans with bound gates, ``parameters`` is the flat array of the
+        parameters of the trainable gates, or an array of shape
+        ``(batch, nparams)`` with different parameters for each state of a
+        batch of shape ``(batch, 2 ** nqubits)``.
+        """
+        backend, nqubits = self.backend, self.nqubits
+        threads = backend._threads
+        for kernel, matrix, targets, controls in self.steps:
+            if targets is None:
+                state = matrix.apply(backend, state, nqubits)
+            elif kernel is None and matrix in self.offsets:
+                bound = self._bound_matrix(matrix, parameters)
+                if bound.ndim == 3:
+                    state = _numpy_kernels.apply_batched(
+                        state, bound, targets, nqubits, controls, threads
+                    )
+                else:
+                    state = _numpy_kernels.apply_gate_matrix(
+                        state, bound, targets, nqubits, controls, threads
+                    )
+            elif kernel is None:
+                # slot of a parametrized gate
+                state = _numpy_kernels.apply_gate_matrix(
+                    state,
+                    backend.to_numpy(backend._gate_matrix(matrix)),
+                    targets,
+                    nqubits,
+                    controls,
+                    threads,
+                )
+            else:
+                state = kernel(state, matrix, targets, nqubits, controls, threads)
+        return state
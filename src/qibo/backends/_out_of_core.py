@@ -0,0 +1,156 @@
+"""
+Out-of-core execution of state vector circuits used by
+:meth:`qibo.backends.numpy.NumpyBackend.execute_circuit`.
+
+The state vector lives in a memory-mapped file and is split to ``2 ** nglobal``
+contiguous blocks of ``2 ** nlocal`` amplitudes, where the ``nglobal`` most
+significant qubits are global. Gates that act on local qubits are grouped and
+each group is applied with a single pass over the file, loading one block in
+memory at a time. Gates that act on global qubits are replaced by SWAPs between
+global and local qubits using the same scheme as distributed circuits
+(:class:`qibo.models.distcircuit.DistributedQueues`). These SWAPs are applied
+to the memory-mapped state with the in-place kernels, which only load chunks
+of ``_numpy_kernels.CHUNK_SIZE`` elements.
+"""
+
+import copy
+import tempfile
+
+import numpy as np
+
+from qibo.backends import _numpy_kernels
+from qibo.config import raise_error
+
+
+def _transform(queue, nqubits, nglobal):
+    """Replaces the gates that act on global qubits by global-local SWAPs.
+
+    Returns:
+        list: gates equivalent to ``queue`` where only SWAPs act on global qubits.
+    """
+    from qibo import gates  # pylint: disable=C0415
+    from qibo.models.circuit import Circuit  # pylint: disable=C0415
+    from qibo.models.distcircuit import DistributedQubits  # pylint: disable=C0415
+
+    for gate in queue:
+        if isinstance(gate, gates.FusedGate) or not gate.target_qubits:
+            raise_error(
+                NotImplementedError,
+                "Out-of-core execution is not available for fused gates and "
+                "special gates.",
+            )
+        if len(gate.target_qubits) > nqubits - nglobal:
+            raise_error(
+                ValueError,
+                f"Gate {gate.name} acts on more target qubits than the "
+                f"{nqubits - nglobal} local qubits of out-of-core execution.",
+            )
+    # gates are copied because the swaps modify their qubits
+    queue = [copy.copy(gate) for gate in queue if not isinstance(gate, gates.M)]
+    # virtual devices that hold the blocks of the state
+    queues = Circuit(nqubits, accelerators={"/CPU:0": 2**nglobal}).queues
+    # the global qubits are fixed by the memory layout of the state
+    queues.qubits = DistributedQubits(range(nglobal), nqubits)
+    return queues.transform(queue)
+
+
+class OutOfCoreState:
+    """Executes gates on a state vector stored in a memory-mapped file.
+
+    Args:
+        backend (:class:`qibo.backends.numpy.NumpyBackend`): backend used to
+            build the gate matrices.
+        nqubits (int): number of qubits of the state.
+        nlocal (int): number of qubits of each block that is loaded in memory.
+        directory (str): directory where the memory-mapped file is created.
+            The file is deleted when the state is no longer used.
+    """
+
+    def __init__(self, backend, nqubits, nlocal, directory):
+        self.backend = backend
+        self.nqubits = nqubits
+        self.nlocal = nlocal
+        self.nglobal = nqubits - nlocal
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.state = np.memmap(
+            self.file, dtype=backend.dtype, mode="w+", shape=(2**nqubits,)
+        )
+
+    def blocks(self):
+        """Yields the index and slice of each block of the state."""
+        size = 2**self.nlocal
+        for index in range(2**self.nglobal):
+            yield index, slice(index * size, (index + 1) * size)
+
+    def set(self, initial_state=None):
+        """Writes the initial state to the file, block by block."""
+        if initial_state is None:
+            self.state[0] = 1
+        else:
+            for _, block in self.blocks():
+                self.state[block] = initial_state[block]
+        return self
+
+    def _global_bit(self, index, qubit):
+        return (index >> (self.nglobal - qubit - 1)) & 1
+
+    def _apply_local(self, queue):
+        """Applies gates that act on local qubits with one pass over the file."""
+        ops = []
+        for gate in queue:
+            targets = gate.target_qubits
+            matrix = np.asarray(self.backend.to_numpy(self.backend._gate_matrix(gate)))
+            if not gate.is_controlled_by:
+                # controls defined in the matrix, such as the control of CNOT
+                matrix = matrix[-(2 ** len(targets)) :, -(2 ** len(targets)) :]
+            global_controls = [q for q in gate.control_qubits if q < self.nglobal]
+            local_controls = tuple(
+                q - self.nglobal for q in gate.control_qubits if q >= self.nglobal
+            )
+            local_targets = tuple(q - self.nglobal for q in targets)
+            ops.append((matrix, local_targets, local_controls, global_controls))
+
+        for index, block in self.blocks():
+            piece = None
+            for matrix, targets, controls, global_controls in ops:
+                if all(self._global_bit(index, q) for q in global_controls):
+                    if piece is None:
+                        piece = np.array(self.state[block])
+                    piece = _numpy_kernels.apply_gate_matrix(
+                        piece,
+                        matrix,
+                        targets,
+                        self.nlocal,
+                        controls,
+                        self.backend._threads,
+                    )
+            if piece is not None:
+                self.state[block] = piece
+
+    def execute(self, queue):
+        """Applies the gates of ``queue`` to the state.
+
+        Returns:
+            :class:`numpy.memmap`: the final state.
+        """
+        group = []
+        for gate in _transform(queue, self.nqubits, self.nglobal):
+            if set(gate.target_qubits) & set(range(self.nglobal)):
+                # global-local SWAP gate
+                if group:
+                    self._apply_local(group)
+                    group = []
+                _numpy_kernels.apply_gate_matrix(
+                    self.state,
+                    self.backend.matrices.SWAP,
+                    gate.target_qubits,
+                    self.nqubits,
+                    gate.control_qubits,
+                    self.backend._threads,
+                )
+            else:
+                group.append(gate)
+        if group:
+            self._apply_local(group)
+        self.state.flush()
+        return self.state
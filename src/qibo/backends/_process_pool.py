@@ -0,0 +1,320 @@
+"""
+Process pool used by the ``mode="processes"`` option of :mod:`qibo.parallel`.
+
+Threads scale poorly for small and medium circuits, because the Python
+dispatch of the gates holds the GIL. The pool keeps persistent worker
+processes, each holding a backend constructed with the name, platform,
+precision and threads of the caller's backend and warmed up by a small
+execution, so that later calls do not pay for the start up of the workers.
+The pool is reused while the calls use the same backend configuration.
+
+Circuits are sent to the workers as pickled circuits without measurements,
+which the workers decode once and keep in a small cache keyed by the hash of
+the payload. Parameter sweeps only send the parameters of every execution,
+which the workers bind to a template of the circuit when it is supported,
+so the circuit is never copied. Initial and final states are not pickled: they
+are written to :class:`multiprocessing.shared_memory.SharedMemory` segments
+that the workers read and write in place.
+"""
+
+import atexit
+import copy
+import hashlib
+import multiprocessing
+import os
+import pickle
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from qibo.config import raise_error
+
+# maximum number of decoded circuits kept by every worker
+CIRCUIT_CACHE = 16
+# number of tasks per worker process, to balance executions of different cost
+TASKS_PER_PROCESS = 4
+
+# backend and decoded circuits of the current worker process
+_backend = None
+_circuits = OrderedDict()
+
+# pool of the main process and the configuration it was created with
+_pool = None
+_config = None
+# pool without worker backends and its number of processes, used by
+# :mod:`qibo.backends._distributed`
+_plain_pool = None
+_plain_processes = None
+
+
+def _initialize(name, platform, precision, nthreads):
+    """Constructs and warms up the backend of a worker process."""
+    # pylint: disable=import-outside-toplevel
+    from qibo import gates
+    from qibo.backends import construct_backend
+    from qibo.models import Circuit
+
+    global _backend  # pylint: disable=global-statement
+    backend = construct_backend(name, platform=platform)
+    backend.set_precision(precision)
+    backend.set_threads(nthreads)
+    circuit = Circuit(1)
+    circuit.add(gates.H(0))
+    backend.execute_circuit(circuit)
+    _backend = backend
+
+
+def _circuit(key, payload):
+    """Decoded circuit of ``key`` and its template for parameter sweeps,
+    using the cache of the worker."""
+    from qibo.models import _template  # pylint: disable=C0415
+
+    if key in _circuits:
+        _circuits.move_to_end(key)
+    else:
+        circuit, template = pickle.loads(payload), None
+        if key[1] and _template.unsupported(circuit, _backend) is None:
+            template = circuit.template(_backend)
+        _circuits[key] = (circuit, template)
+        if len(_circuits) > CIRCUIT_CACHE:
+            _circuits.popitem(last=False)
+    return _circuits[key]
+
+
+def _view(segment, dtype, offset, shape):
+    return np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=offset)
+
+
+def _execute(task):
+    """Executes a chunk of jobs and writes the final states to shared memory."""
+    inputs, outputs, dtype, jobs = task
+    source = None if inputs is None else shared_memory.SharedMemory(name=inputs)
+    target = shared_memory.SharedMemory(name=outputs)
+    # circuits of the chunk, in case they are evicted from the cache
+    circuits = {}
+    try:
+        for key, payload, parameters, state, final in jobs:
+            if key not in circuits:
+                circuits[key] = _circuit(key, payload)
+            circuit, template = circuits[key]
+            if state is not None:
+                state = _view(source, dtype, *state)
+            if template is not None and np.ndim(parameters) == 1:
+                result = template.execute(parameters, state)
+            else:
+                if parameters is not None:
+                    circuit.set_parameters(parameters)
+                result = _backend.execute_circuit(circuit, state)
+            _view(target, dtype, *final)[...] = _backend.to_numpy(result.state())
+            # views of the buffers must be released before closing them
+            state = None
+    finally:
+        target.close()
+        if source is not None:
+            source.close()
+
+
+def _get_pool(backend, processes):
+    global _pool, _config  # pylint: disable=global-statement
+    config = (
+        backend.name,
+        backend.platform,
+        backend.precision,
+        backend.nthreads,
+        processes,
+    )
+    if config != _config:
+        shutdown()
+        _pool = multiprocessing.get_context().Pool(
+            processes, initializer=_initialize, initargs=config[:-1]
+        )
+        _config = config
+    return _pool
+
+
+def get_plain_pool(processes):
+    """Persistent pool of ``processes`` workers without a backend.
+
+    The pool is reused while the calls ask for the same number of processes.
+    """
+    global _plain_pool, _plain_processes  # pylint: disable=global-statement
+    if processes != _plain_processes:
+        if _plain_pool is not None:
+            _plain_pool.terminate()
+            _plain_pool.join()
+        _plain_pool = multiprocessing.get_context().Pool(processes)
+        _plain_processes = processes
+    return _plain_pool
+
+
+def shutdown():
+    """Terminates the worker processes of the pools."""
+    global _pool, _config  # pylint: disable=global-statement
+    global _plain_pool, _plain_processes  # pylint: disable=global-statement
+    for pool in (_pool, _plain_pool):
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    _pool, _config = None, None
+    _plain_pool, _plain_processes = None, None
+
+
+atexit.register(shutdown)
+
+
+def _payload(circuit):
+    """Serializes the circuit without its measurements.
+
+    Final measurements do not change the state and they are sampled by the
+    main process from the final state.
+    """
+    # pylint: disable=import-outside-toplevel
+    from qibo import gates
+    from qibo.models import Circuit
+
+    if circuit.accelerators:
+        raise_error(
+            NotImplementedError,
+            "Distributed circuits cannot be executed in a process pool.",
+        )
+    if circuit.repeated_execution:
+        raise_error(
+            NotImplementedError,
+            "Circuits that require repeated execution, such as circuits with "
+            + "collapsing measurements or noise, cannot be executed in a process pool.",
+        )
+    reduced = Circuit(circuit.nqubits, density_matrix=circuit.density_matrix)
+    for gate in circuit.queue:
+        if isinstance(gate, gates.CallbackGate):
+            raise_error(
+                NotImplementedError,
+                "Circuits with callbacks cannot be executed in a process pool.",
+            )
+        if not isinstance(gate, gates.M):
+            reduced.add(gate)
+    return pickle.dumps(reduced, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _shape(circuit):
+    if circuit.density_matrix:
+        return 2 * (2**circuit.nqubits,)
+    return (2**circuit.nqubits,)
+
+
+def _segment(size):
+    return shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+
+def execute(backend, jobs, nshots=1000, processes=None):
+    """Executes circuits in the worker processes of the pool.
+
+    Args:
+        backend (:class:`qibo.backends.abstract.Backend`): backend of the
+            caller, whose configuration is used by the workers and which holds
+            the returned states.
+        jobs (list): ``(circuit, parameters, initial_state)`` tuples. If
+            ``parameters`` is not ``None`` they are set to the circuit of the
+            worker before its execution. The ``initial_state`` may be ``None``
+            for the default initial state.
+        nshots (int, optional): number of shots of circuits with measurements.
+        processes (int, optional): number of worker processes. If ``None``,
+            the number of CPUs is used.
+
+    Returns:
+        list: the :class:`qibo.result.QuantumState` or
+        :class:`qibo.result.CircuitResult` of every job.
+    """
+    # pylint: disable=import-outside-toplevel
+    from qibo.result import CircuitResult, QuantumState
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes < 1:
+        raise_error(
+            ValueError, f"Number of processes must be positive, not {processes}."
+        )
+
+    dtype = np.dtype("complex64" if backend.precision == "single" else "complex128")
+    payloads, counts = {}, {}
+    inputs, outputs = [], []
+    input_size, output_size = 0, 0
+    for circuit, parameters, state in jobs:
+        if id(circuit) not in payloads:
+            payload = _payload(circuit)
+            # swept circuits are modified by the workers, so they are cached apart
+            key = (hashlib.sha1(payload).hexdigest(), parameters is not None)
+            payloads[id(circuit)] = (key, payload)
+        counts[id(circuit)] = counts.get(id(circuit), 0) + 1
+        shape = _shape(circuit)
+        size = int(np.prod(shape)) * dtype.itemsize
+        if state is None:
+            inputs.append(None)
+        else:
+            state = backend.to_numpy(state)
+            if tuple(state.shape) != shape:
+                raise_error(
+                    ValueError,
+                    f"Given initial state has shape {state.shape} instead of "
+                    + f"the expected {shape}.",
+                )
+            inputs.append((state, (input_size, shape)))
+            input_size += size
+        outputs.append((output_size, shape))
+        output_size += size
+
+    source = _segment(input_size) if input_size else None
+    target = _segment(output_size)
+    try:
+        for entry in inputs:
+            if entry is not None:
+                _view(source, dtype, *entry[1])[...] = entry[0]
+
+        # every chunk sends the payload of each circuit at most once
+        nchunks = min(len(jobs), processes * TASKS_PER_PROCESS) or 1
+        tasks = []
+        for chunk in range(nchunks):
+            sent, chunk_jobs = set(), []
+            for k in range(chunk, len(jobs), nchunks):
+                circuit, parameters, _ = jobs[k]
+                key, payload = payloads[id(circuit)]
+                chunk_jobs.append(
+                    (
+                        key,
+                        None if key in sent else payload,
+                        parameters,
+                        None if inputs[k] is None else inputs[k][1],
+                        outputs[k],
+                    )
+                )
+                sent.add(key)
+            tasks.append(
+                (
+                    None if source is None else source.name,
+                    target.name,
+                    dtype.str,
+                    chunk_jobs,
+                )
+            )
+        _get_pool(backend, processes).map(_execute, tasks)
+
+        results = []
+        for (circuit, parameters, _), final in zip(jobs, outputs):
+            state = backend.cast(np.copy(_view(target, dtype, *final)))
+            if circuit.measurements:
+                measurements = circuit.measurements
+                if counts[id(circuit)] > 1:
+                    # results of the same circuit sample their own measurements
+                    measurements = copy.deepcopy(measurements)
+                results.append(
+                    CircuitResult(state, measurements, backend=backend, nshots=nshots)
+                )
+            else:
+                results.append(QuantumState(state, backend=backend))
+        return results
+    finally:
+        target.close()
+        target.unlink()
+        if source is not None:
+            source.close()
+            source.unlink()
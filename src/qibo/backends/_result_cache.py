@@ -0,0 +1,165 @@
+"""
+Bounded cache of final states used by :class:`qibo.backends.numpy.NumpyBackend`.
+
+Circuits are identified by :meth:`qibo.models.circuit.Circuit.content_hash`,
+so that identical circuits built again, for example the calibration circuits
+of error mitigation routines, reuse the state of the first execution. Only
+final states are cached: results with shots sample new measurements from the
+cached state, using the random number generator of the backend.
+"""
+
+import collections
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from qibo.config import raise_error
+
+ResultCacheInfo = collections.namedtuple(
+    "ResultCacheInfo", ["hits", "misses", "maxsize", "currsize", "nbytes"]
+)
+
+
+class ResultCache:
+    """Bounded mapping from circuit keys to final states, with LRU eviction.
+
+    Args:
+        maxsize (int): maximum number of states held in the cache.
+        max_bytes (int, optional): maximum total size of the cached states in
+            bytes. If ``None``, only the number of states is bounded.
+        directory (str, optional): directory where the states are saved as
+            ``.npy`` files, so that they are shared by different processes and
+            sessions. If ``None``, the states are held in memory.
+    """
+
+    def __init__(self, maxsize, max_bytes=None, directory=None):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise_error(
+                ValueError,
+                f"Result cache size must be a positive integer, not {maxsize}.",
+            )
+        if max_bytes is not None and max_bytes < 0:
+            raise_error(
+                ValueError,
+                f"Result cache bytes must be non-negative, not {max_bytes}.",
+            )
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._data = collections.OrderedDict()
+        self._nbytes = 0
+        # circuits may be executed concurrently, for example by submitted jobs
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _name(key):
+        return hashlib.sha256(repr(key).encode()).hexdigest() + ".npy"
+
+    def _files(self):
+        """Cached files in ``self.directory``, from the least recently used."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, entry.path, stat.st_size))
+        return sorted(files)
+
+    def get(self, key):
+        """Returns the state stored under ``key``, or ``None`` on a miss.
+
+        The returned array is read-only.
+        """
+        with self._lock:
+            if self.directory is None:
+                state = self._data.get(key)
+                if state is not None:
+                    self._data.move_to_end(key)
+            else:
+                path = os.path.join(self.directory, self._name(key))
+                try:
+                    state = np.load(path, allow_pickle=False)
+                    # the modification time orders the files for eviction
+                    os.utime(path)
+                except (FileNotFoundError, ValueError):
+                    # missing, or partially written by another process
+                    state = None
+                else:
+                    state.flags.writeable = False
+            if state is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return state
+
+    def put(self, key, state):
+        """Stores ``state`` under ``key``, evicting the least recently used states."""
+        state = np.array(state)
+        state.flags.writeable = False
+        if self.max_bytes is not None and state.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if self.directory is None:
+                if key in self._data:
+                    self._nbytes -= self._data.pop(key).nbytes
+                self._data[key] = state
+                self._nbytes += state.nbytes
+                while len(self._data) > self.maxsize or (
+                    self.max_bytes is not None and self._nbytes > self.max_bytes
+                ):
+                    self._nbytes -= self._data.popitem(last=False)[1].nbytes
+            else:
+                path = os.path.join(self.directory, self._name(key))
+                # write to a temporary file first, so that other processes
+                # never load a partial state
+                temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temporary, "wb") as file:
+                    np.save(file, state, allow_pickle=False)
+                os.replace(temporary, path)
+                files = self._files()
+                nbytes = sum(size for _, _, size in files)
+                while files and (
+                    len(files) > self.maxsize
+                    or (self.max_bytes is not None and nbytes > self.max_bytes)
+                ):
+                    _, oldest, size = files.pop(0)
+                    try:
+                        os.remove(oldest)
+                    except FileNotFoundError:  # pragma: no cover
+                        pass
+                    nbytes -= size
+
+    def clear(self):
+        """Removes all states from the cache and resets the statistics."""
+        with self._lock:
+            self._data.clear()
+            self._nbytes = 0
+            if self.directory is not None:
+                for _, path, _ in self._files():
+                    os.remove(path)
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """Returns the hit and miss statistics of the cache.
+
+        Returns:
+            ``ResultCacheInfo``: named tuple with the number of ``hits`` and
+            ``misses``, the ``maxsize``, the current number of cached states
+            ``currsize`` and their total size ``nbytes``.
+        """
+        with self._lock:
+            if self.directory is None:
+                currsize, nbytes = len(self._data), self._nbytes
+            else:
+                files = self._files()
+                currsize, nbytes = len(files), sum(size for _, _, size in files)
+        return ResultCacheInfo(self.hits, self.misses, self.maxsize, currsize, nbytes)
+
+    def __len__(self):
+        return self.info().currsize
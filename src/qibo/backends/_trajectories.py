@@ -0,0 +1,133 @@
+"""
+Batched trajectories used by :meth:`qibo.backends.numpy.NumpyBackend.execute_circuit_repeated`.
+
+Noisy state vector circuits are simulated by sampling one trajectory per shot.
+Instead of evolving the trajectories one after the other, the functions below
+evolve a batch of trajectories stored as a ``(batch, 2 ** nqubits)`` array.
+Deterministic gates are applied to all trajectories at once with the in-place
+kernels. The outcomes of each unitary channel are drawn for the whole batch
+with a single call to the random number generator and every gate of the
+channel is applied only to the trajectories that selected it.
+"""
+
+import os
+
+import numpy as np
+
+from qibo.backends import _numpy_kernels
+from qibo.backends._numpy_plan import ExecutionPlan
+
+# fraction of the available memory used by a batch of trajectories
+MEMORY_FRACTION = 0.25
+
+
+def batch_size(nqubits, nshots, dtype):
+    """Number of trajectories that fit in a fraction of the available memory."""
+    try:
+        available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):  # pragma: no cover
+        available = 2**30
+    size = 2**nqubits * np.dtype(dtype).itemsize
+    return int(max(1, min(nshots, MEMORY_FRACTION * available // size)))
+
+
+def _draw(rng, cdf):
+    """Draws one outcome for every row of the cumulative distributions ``cdf``."""
+    values = rng.random(len(cdf))
+    values *= cdf[:, -1]
+    outcomes = np.sum(cdf <= values[:, np.newaxis], axis=1)
+    # guards against ``values`` rounded up to the total probability
+    return np.minimum(outcomes, cdf.shape[1] - 1)
+
+
+def apply_channel(backend, channel, state, nqubits):
+    """Applies a unitary channel to a batch of trajectories in place.
+
+    Args:
+        backend (:class:`qibo.backends.numpy.NumpyBackend`): backend used to
+            build the gate matrices and draw the outcomes.
+        channel (:class:`qibo.gates.UnitaryChannel`): channel to apply.
+        state (ndarray): contiguous and writeable batch of state vectors.
+        nqubits (int): number of qubits of each state.
+
+    Returns:
+        ndarray: the updated ``state``.
+    """
+    probabilities = channel.coefficients + (1 - np.sum(channel.coefficients),)
+    cdf = np.cumsum(probabilities, dtype=np.float64)
+    outcomes = _draw(backend.rng, np.broadcast_to(cdf, (len(state), len(cdf))))
+    for index, gate in enumerate(channel.gates):
+        rows = np.flatnonzero(outcomes == index)
+        if not len(rows):
+            continue
+        matrix = np.asarray(backend.to_numpy(backend._gate_matrix(gate)))
+        targets, controls = backend._kernel_qubits(gate)
+        if len(rows) == len(state):
+            _numpy_kernels.apply_gate_matrix(
+                state, matrix, targets, nqubits, controls, backend._threads
+            )
+        else:
+            # fancy indexing copies the selected trajectories to a contiguous batch
+            selected = _numpy_kernels.apply_gate_matrix(
+                state[rows], matrix, targets, nqubits, controls, backend._threads
+            )
+            state[rows] = selected
+    return state
+
+
+def sample(backend, state, qubits, nqubits):
+    """Samples one measurement outcome from each trajectory.
+
+    Args:
+        backend (:class:`qibo.backends.numpy.NumpyBackend`): backend used to
+            draw the outcomes.
+        state (ndarray): batch of state vectors.
+        qubits (tuple): measured qubits, ordered as the bits of the outcomes.
+        nqubits (int): number of qubits of each state.
+
+    Returns:
+        ndarray: outcome of each trajectory in decimal form.
+    """
+    probabilities = np.abs(np.reshape(state, (len(state),) + nqubits * (2,))) ** 2
+    unmeasured = tuple(1 + q for q in range(nqubits) if q not in qubits)
+    probabilities = np.sum(probabilities, axis=unmeasured)
+    measured = sorted(qubits)
+    order = [0] + [1 + measured.index(q) for q in qubits]
+    probabilities = np.reshape(np.transpose(probabilities, order), (len(state), -1))
+    return _draw(backend.rng, np.cumsum(probabilities, axis=1, dtype=np.float64))
+
+
+def execute(backend, circuit, nshots, prefix_state, steps, batch):
+    """Evolves ``nshots`` trajectories in batches and samples their measurements.
+
+    Args:
+        backend (:class:`qibo.backends.numpy.NumpyBackend`): backend used for
+            the simulation.
+        circuit (:class:`qibo.models.circuit.Circuit`): circuit to execute.
+        nshots (int): number of trajectories.
+        prefix_state (ndarray): state after the deterministic prefix of the circuit.
+        steps (list): execution plans and unitary channels applied to every
+            trajectory after the prefix, as returned by
+            :meth:`qibo.backends.numpy.NumpyBackend._trajectory_steps`.
+        batch (int): maximum number of trajectories evolved at once.
+
+    Returns:
+        ndarray: measurement outcome of each trajectory in decimal form.
+    """
+    nqubits = circuit.nqubits
+    qubits = tuple(q for m in circuit.measurements for q in m.target_qubits)
+    samples = []
+    for start in range(0, nshots, batch):
+        size = min(batch, nshots - start)
+        state = np.array(
+            np.broadcast_to(prefix_state, (size, len(prefix_state))),
+            dtype=backend.dtype,
+            order="C",
+        )
+        for step in steps:
+            if isinstance(step, ExecutionPlan):
+                state = step.apply(state)
+            else:
+                state = apply_channel(backend, step, state, nqubits)
+        samples.append(sample(backend, state, qubits, nqubits))
+    return np.concatenate(samples)
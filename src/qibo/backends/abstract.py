@@ -18,6 +18,8 @@ class Backend(abc.ABC):
         self.nthreads = 1
         self.supports_multigpu = False
         self.oom_error = MemoryError
+        # executor of the jobs submitted with ``submit``
+        self._jobs = None
 
     def __reduce__(self):
         """Allow pickling backend objects that have references to modules."""
@@ -84,6 +86,138 @@ class Backend(abc.ABC):
         """
         raise_error(NotImplementedError)
 
+    def compile_circuit(self, circuit):
+        """Compiles a circuit to a function executing it.
+
+        Args:
+            circuit (:class:`qibo.models.circuit.Circuit`): circuit to compile.
+
+        Returns:
+            Callable: function of ``(initial_state, nshots)`` that returns the
+            final state of the circuit.
+        """
+        executor = lambda state, nshots: self.execute_circuit(
+            circuit, state, nshots
+        ).state()
+        return self.compile(executor)
+
+    def circuit_unitary(self, circuit, block_size=None, out=None, callback=None):
+        """Builds the unitary matrix of a circuit.
+
+        Used by :meth:`qibo.models.circuit.Circuit.unitary`, which documents
+        the arguments. The matrix is built with
+        :meth:`qibo.backends.abstract.Backend.matrix_fused` and then passed to
+        ``out`` and ``callback`` in blocks of columns.
+        """
+        from qibo import gates  # pylint: disable=C0415
+
+        fgate = gates.FusedGate(*range(circuit.nqubits))
+        for gate in circuit.queue:
+            if not isinstance(gate, (gates.SpecialGate, gates.M)):
+                fgate.append(gate)
+        matrix = fgate.matrix(self)
+        if out is None and callback is None:
+            return matrix
+        if callback is not None:
+            dim = 2**circuit.nqubits
+            block_size = dim if block_size is None else block_size
+            for start in range(0, dim, block_size):
+                callback(start, matrix[:, start : start + block_size])
+        if out is None:
+            return None
+        out[:] = self.to_numpy(matrix)
+        return out
+
+    def set_job_executor(self, workers=None, max_queue=None):
+        """Configures the worker threads that execute submitted jobs.
+
+        The jobs of the previous configuration are completed before it is
+        replaced.
+
+        Args:
+            workers (int, optional): number of worker threads. If ``None``,
+                the number of CPUs is used. Defaults to ``None``.
+            max_queue (int, optional): maximum number of jobs waiting for a
+                worker. When the queue is full, :meth:`submit` blocks until a
+                job finishes. If ``None``, four jobs per worker are allowed.
+                Defaults to ``None``.
+        """
+        from qibo.backends._jobs import JobExecutor  # pylint: disable=C0415
+
+        executor = JobExecutor(self, workers, max_queue)
+        if self._jobs is not None:
+            self._jobs.shutdown()
+        self._jobs = executor
+
+    def submit(self, circuit, initial_state=None, nshots=1000, timeout=None):
+        """Submits a circuit for asynchronous execution.
+
+        The circuit is executed with :meth:`execute_circuit` by a pool of
+        worker threads, configured by :meth:`set_job_executor`.
+
+        Example:
+            .. testcode::
+
+                from qibo import Circuit, gates
+                from qibo.backends import NumpyBackend
+
+                backend = NumpyBackend()
+                circuit = Circuit(2)
+                circuit.add(gates.H(0))
+                circuit.add(gates.CNOT(0, 1))
+                job = backend.submit(circuit)
+                # the caller is free while the circuit is executed
+                state = job.result().state()
+                # seconds that the job waited in the queue and was executed
+                job.timing.queued, job.timing.duration
+
+        Args:
+            circuit (:class:`qibo.models.circuit.Circuit`): circuit to execute.
+            initial_state (ndarray, optional): initial state of the execution.
+                If ``None``, the default initial state is used.
+            nshots (int, optional): number of shots. Defaults to ``1000``.
+            timeout (float, optional): seconds to wait for a place in the queue
+                of the workers. If ``None``, it waits until a place is free,
+                otherwise ``TimeoutError`` is raised if the queue is still full.
+                Defaults to ``None``.
+
+        Returns:
+            :class:`qibo.backends._jobs.Job`: a :class:`concurrent.futures.Future`
+            of the result, which can also be awaited in a coroutine. It can be
+            cancelled before its execution starts and its ``timing`` holds the
+            times when it was submitted, started and finished.
+        """
+        if self._jobs is None:
+            self.set_job_executor()
+        return self._jobs.submit(circuit, initial_state, nshots, timeout)
+
+    def submit_many(self, circuits, initial_states=None, nshots=1000, timeout=None):
+        """Submits many circuits for asynchronous execution.
+
+        Args:
+            circuits (list): circuits to execute.
+            initial_states (list or tuple, optional): initial state of each
+                circuit, or a single state used for all circuits. If ``None``,
+                the default initial state is used. Defaults to ``None``.
+            nshots (int, optional): number of shots. Defaults to ``1000``.
+            timeout (float, optional): seconds to wait for a place in the queue
+                for each circuit, as in :meth:`submit`. Defaults to ``None``.
+
+        Returns:
+            list: the :class:`qibo.backends._jobs.Job` of each circuit.
+        """
+        circuits = list(circuits)
+        if not isinstance(initial_states, (list, tuple)):
+            initial_states = len(circuits) * [initial_states]
+        elif len(initial_states) != len(circuits):
+            raise_error(
+                ValueError, "initial_states must have the same length as circuits."
+            )
+        return [
+            self.submit(circuit, state, nshots, timeout)
+            for circuit, state in zip(circuits, initial_states)
+        ]
+
     @abc.abstractmethod
     def zero_state(self, nqubits):  # pragma: no cover
         """Generate :math:`|000 \\cdots 0 \\rangle` state vector as an array."""
@@ -251,6 +385,14 @@ class Backend(abc.ABC):
         """Sample measurement shots according to a probability distribution."""
         raise_error(NotImplementedError)
 
+    def shot_sampler(self, probabilities):
+        """Returns a function that samples measurement shots from ``probabilities``.
+
+        Backends may prepare the distribution once, so that sampling several
+        times from it is cheaper than repeated calls of :meth:`sample_shots`.
+        """
+        return lambda nshots: self.sample_shots(probabilities, nshots)
+
     @abc.abstractmethod
     def aggregate_shots(self, shots):  # pragma: no cover
         """Collect shots to a single array."""
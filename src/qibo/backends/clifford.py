@@ -26,6 +26,7 @@ class CliffordBackend(NumpyBackend):
 
     def __init__(self, engine=None):
         super().__init__()
+        self.supports_multigpu = False
 
         if engine == "stim":
             import stim  # pylint: disable=C0415
@@ -2,11 +2,65 @@
 Gates use ``einsum`` to apply gates to state vectors. The einsum string that
 specifies the contraction indices is created using the following methods and
 used by :meth:`qibo.backends.numpy.NumpyEngine.apply_gate`.
+
+The strings only depend on the qubits that the gate acts on, therefore all
+methods are memoized with a bounded cache of ``EINSUM_CACHE_SIZE`` entries.
+The orders of the qubits are returned as new lists, so that callers cannot
+modify the cached values.
+Qubits that a gate does not act on can be merged to a single axis with
+:meth:`qibo.backends.einsum_utils.merge_axes`, so that the number of einsum
+characters depends on the number of target qubits instead of the total number
+of qubits.
 """
 
-from qibo.config import EINSUM_CHARS, raise_error
+from functools import lru_cache, wraps
+
+import numpy as np
+
+from qibo.config import EINSUM_CACHE_SIZE, EINSUM_CHARS, raise_error
+
+
+def _memoize(func):
+    """Memoizes ``func(qubits, nqubits)`` accepting any iterable of ``qubits``."""
+    cached = lru_cache(maxsize=EINSUM_CACHE_SIZE)(func)
+
+    @wraps(func)
+    def wrapper(qubits, nqubits):
+        return cached(tuple(qubits), nqubits)
+
+    wrapper.cache_info = cached.cache_info
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
 
 
+@_memoize
+def merge_axes(qubits, nqubits):
+    """Shape of a state with consecutive qubits outside ``qubits`` merged to one axis.
+
+    Args:
+        qubits (tuple): qubit ids that the gate acts on.
+        nqubits (int): total number of qubits in the state.
+
+    Returns:
+        (tuple, tuple, int): the shape of the state, the axis of each qubit in
+        ``qubits`` and the number of axes.
+    """
+    shape, axes, run = [], {}, 0
+    for qubit in range(nqubits):
+        if qubit in qubits:
+            if run:
+                shape.append(2**run)
+                run = 0
+            axes[qubit] = len(shape)
+            shape.append(2)
+        else:
+            run += 1
+    if run:
+        shape.append(2**run)
+    return tuple(shape), tuple(axes[q] for q in qubits), len(shape)
+
+
+@_memoize
 def prepare_strings(qubits, nqubits):
     if nqubits + len(qubits) > len(EINSUM_CHARS):  # pragma: no cover
         raise_error(NotImplementedError, "Not enough einsum characters.")
@@ -25,11 +79,13 @@ def prepare_strings(qubits, nqubits):
     return inp, out, trans, rest
 
 
+@_memoize
 def apply_gate_string(qubits, nqubits):
     inp, out, trans, _ = prepare_strings(qubits, nqubits)
     return f"{inp},{trans}->{out}"
 
 
+@_memoize
 def apply_gate_density_matrix_string(qubits, nqubits):
     inp, out, trans, rest = prepare_strings(qubits, nqubits)
     if nqubits > len(rest):  # pragma: no cover
@@ -41,6 +97,7 @@ def apply_gate_density_matrix_string(qubits, nqubits):
     return left, right
 
 
+@_memoize
 def apply_gate_density_matrix_controlled_string(qubits, nqubits):
     inp, out, trans, rest = prepare_strings(qubits, nqubits)
     if nqubits > len(rest):  # pragma: no cover
@@ -52,37 +109,111 @@ def apply_gate_density_matrix_controlled_string(qubits, nqubits):
     return left, right
 
 
-def control_order(gate, nqubits):
+@lru_cache(maxsize=EINSUM_CACHE_SIZE)
+def _control_order(control_qubits, target_qubits, nqubits):
     loop_start = 0
-    order = list(gate.control_qubits)
-    targets = list(gate.target_qubits)
-    for control in gate.control_qubits:
+    order = list(control_qubits)
+    targets = list(target_qubits)
+    for control in control_qubits:
         for i in range(loop_start, control):
             order.append(i)
         loop_start = control + 1
-        for i, t in enumerate(gate.target_qubits):
+        for i, t in enumerate(target_qubits):
             if t > control:
                 targets[i] -= 1
     for i in range(loop_start, nqubits):
         order.append(i)
-    return order, targets
+    return tuple(order), tuple(targets)
 
 
-def control_order_density_matrix(gate, nqubits):
-    ncontrol = len(gate.control_qubits)
-    order, targets = control_order(gate, nqubits)
-    additional_order = [x + len(order) for x in order]
+def control_order(gate, nqubits):
+    order, targets = _control_order(
+        tuple(gate.control_qubits), tuple(gate.target_qubits), nqubits
+    )
+    return list(order), list(targets)
+
+
+@lru_cache(maxsize=EINSUM_CACHE_SIZE)
+def _control_order_density_matrix(control_qubits, target_qubits, nqubits):
+    ncontrol = len(control_qubits)
+    order, targets = _control_order(control_qubits, target_qubits, nqubits)
+    additional_order = tuple(x + len(order) for x in order)
     order_dm = (
         order[:ncontrol]
-        + list(additional_order[:ncontrol])
+        + additional_order[:ncontrol]
         + order[ncontrol:]
-        + list(additional_order[ncontrol:])
+        + additional_order[ncontrol:]
     )
     return order_dm, targets
 
 
-def reverse_order(order):
+def control_order_density_matrix(gate, nqubits):
+    order_dm, targets = _control_order_density_matrix(
+        tuple(gate.control_qubits), tuple(gate.target_qubits), nqubits
+    )
+    return list(order_dm), list(targets)
+
+
+@lru_cache(maxsize=EINSUM_CACHE_SIZE)
+def fused_embedding(qubits, targets):
+    """Axes used to multiply the matrix of a gate into the matrix of a fused gate.
+
+    The fused matrix is handled as a tensor with one row and one column axis
+    per target qubit. The gate tensor is contracted with the row axes of the
+    gate qubits using ``np.tensordot``, which moves the new row axes first.
+
+    Args:
+        qubits (tuple): qubits of the gate, including its control qubits.
+        targets (tuple): target qubits of the fused gate.
+
+    Returns:
+        (tuple, tuple): the axes of the fused tensor that are contracted and
+        the permutation that restores the axes order of the fused tensor
+        after the contraction.
+    """
+    positions = tuple(targets.index(q) for q in qubits)
+    remaining = [axis for axis in range(2 * len(targets)) if axis not in positions]
+    order = tuple(
+        (
+            positions.index(axis)
+            if axis in positions
+            else len(qubits) + remaining.index(axis)
+        )
+        for axis in range(2 * len(targets))
+    )
+    return positions, order
+
+
+@lru_cache(maxsize=EINSUM_CACHE_SIZE)
+def _reverse_order(order):
     rorder = len(order) * [0]
     for i, r in enumerate(order):
         rorder[r] = i
-    return rorder
+    return tuple(rorder)
+
+
+def reverse_order(order):
+    return list(_reverse_order(tuple(order)))
+
+
+@lru_cache(maxsize=EINSUM_CACHE_SIZE)
+def einsum_path(subscripts, *shapes):
+    """Optimized contraction path of ``np.einsum`` for operands of given shapes.
+
+    Args:
+        subscripts (str or tuple): einsum string, or tuple with the integer
+            sublist of each operand followed by the output sublist.
+        shapes (tuple): shape of each operand.
+
+    Returns:
+        list: path that can be passed as the ``optimize`` argument of ``np.einsum``.
+    """
+    operands = [np.broadcast_to(np.zeros((), dtype=complex), s) for s in shapes]
+    if isinstance(subscripts, str):
+        args = [subscripts] + operands
+    else:
+        args = []
+        for operand, sublist in zip(operands, subscripts):
+            args.extend((operand, list(sublist)))
+        args.append(list(subscripts[-1]))
+    return np.einsum_path(*args, optimize="optimal")[0]
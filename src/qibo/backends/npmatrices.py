@@ -15,7 +15,19 @@ class NumpyMatrices:
         self.np = np
 
     def _cast(self, x, dtype):
-        return self.np.array(x, dtype=dtype)
+        try:
+            matrix = self.np.array(x, dtype=dtype)
+        except ValueError:
+            # parameters given as arrays of values, mixed with constant entries
+            shape = self.np.broadcast_shapes(
+                *(self.np.shape(value) for row in x for value in row)
+            )
+            x = [[self.np.broadcast_to(value, shape) for value in row] for row in x]
+            matrix = self.np.array(x, dtype=dtype)
+        if isinstance(x, list) and matrix.ndim > 2:
+            # a batch of matrices is returned with a leading batch axis
+            matrix = self.np.moveaxis(matrix, (0, 1), (-2, -1))
+        return matrix
 
     # This method is used to cast the parameters of the gates to the right type for other backends
     def _cast_parameter(self, x):
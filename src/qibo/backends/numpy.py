@@ -3,23 +3,52 @@ import math
 from typing import Union
 
 import numpy as np
-from scipy import sparse
 from scipy.linalg import block_diag, fractional_matrix_power
 
 from qibo import __version__
-from qibo.backends import einsum_utils
+from qibo.backends import (
+    _branching,
+    _distributed,
+    _numpy_kernels,
+    _trajectories,
+    einsum_utils,
+)
+from qibo.backends._matrix_cache import MatrixCache
+from qibo.backends._numpy_plan import ExecutionPlan
+from qibo.backends._out_of_core import OutOfCoreState
+from qibo.backends._result_cache import ResultCache
 from qibo.backends.abstract import Backend
 from qibo.backends.npmatrices import NumpyMatrices
 from qibo.config import log, raise_error
-from qibo.result import CircuitResult, MeasurementOutcomes, QuantumState
+from qibo.measurements import frequencies_to_binary
+from qibo.result import (
+    CircuitResult,
+    MeasurementOutcomes,
+    QuantumState,
+    QuantumStateBatch,
+)
 
 
 class NumpyBackend(Backend):
+    # maximum number of amplitudes in a block of columns of ``circuit_unitary``
+    UNITARY_BLOCK_ELEMENTS = 2**22
+
     def __init__(self):
         super().__init__()
         self.np = np
         self.name = "numpy"
         self.matrices = NumpyMatrices(self.dtype)
+        self.matrix_cache = MatrixCache()
+        self.result_cache = None
+        # threads of the in-place kernels
+        self._threads = _numpy_kernels.Threads()
+        self.out_of_core = None
+        self.trajectory_batch_size = None
+        self.branching = True
+        # distributed circuits are executed by worker processes
+        self.supports_multigpu = True
+        # generator of ``set_seed``, until then ``rng`` follows ``np.random``
+        self._rng = None
         self.tensor_types = np.ndarray
         self.versions = {"qibo": __version__, "numpy": self.np.__version__}
         self.numeric_types = (
@@ -46,6 +75,7 @@ class NumpyBackend(Backend):
                 raise_error(ValueError, f"Unknown precision {precision}.")
             if self.matrices:
                 self.matrices = self.matrices.__class__(self.dtype)
+            self.matrix_cache.clear()
 
     def set_device(self, device):
         if device != "/CPU:0":
@@ -54,8 +84,91 @@ class NumpyBackend(Backend):
             )
 
     def set_threads(self, nthreads):
-        if nthreads > 1:
-            raise_error(ValueError, "numpy does not support more than one thread.")
+        """Sets the number of threads that apply gates to the state.
+
+        With more than one thread, the in-place kernels split the state to
+        independent chunks, along the qubits that each gate does not act on,
+        and update them concurrently in a thread pool. The threads belong to
+        this backend and do not affect other backends.
+        """
+        if not self._uses_numpy_kernels():
+            if nthreads > 1:
+                raise_error(
+                    ValueError, f"{self.name} does not support more than one thread."
+                )
+            return
+        if not isinstance(nthreads, int) or nthreads < 1:
+            raise_error(
+                ValueError,
+                f"Number of threads must be a positive integer, not {nthreads}.",
+            )
+        self.nthreads = nthreads
+        if nthreads != self._threads.nthreads:
+            self._threads.shutdown()
+            self._threads = _numpy_kernels.Threads(nthreads)
+
+    def set_out_of_core(self, directory=None, nlocal=24):
+        """Enables out-of-core simulation of state vectors.
+
+        When enabled, state vector circuits with more than ``nlocal`` qubits
+        are executed on a state stored in a memory-mapped file in
+        ``directory``, loading blocks of ``2 ** nlocal`` amplitudes in memory
+        at a time. The final state is returned as a :class:`numpy.memmap`.
+
+        Args:
+            directory (str, optional): directory where the memory-mapped state
+                is created, preferably on a fast disk. If ``None``, out-of-core
+                simulation is disabled. Defaults to ``None``.
+            nlocal (int, optional): number of qubits of the blocks loaded in
+                memory. Defaults to ``24``.
+        """
+        if directory is None:
+            self.out_of_core = None
+            return
+        if not self._uses_numpy_kernels():
+            raise_error(
+                NotImplementedError,
+                f"Out-of-core simulation is not available for the {self.name} backend.",
+            )
+        if not isinstance(nlocal, int) or nlocal < 1:
+            raise_error(
+                ValueError, f"Number of local qubits must be positive, not {nlocal}."
+            )
+        self.out_of_core = (directory, nlocal)
+
+    def set_trajectory_batch_size(self, batch_size=None):
+        """Sets the number of noisy trajectories that are simulated at once.
+
+        State vector circuits with unitary channels are simulated by sampling
+        one trajectory per shot. When possible, these trajectories are evolved
+        in batches stored in a single ``(batch_size, 2 ** nqubits)`` array.
+
+        Args:
+            batch_size (int, optional): maximum number of trajectories in each
+                batch. If ``None``, it is chosen so that a batch fits in a
+                fraction of the available memory. Defaults to ``None``.
+        """
+        if batch_size is not None and (
+            not isinstance(batch_size, int) or batch_size < 1
+        ):
+            raise_error(
+                ValueError, f"Batch size must be a positive integer, not {batch_size}."
+            )
+        self.trajectory_batch_size = batch_size
+
+    def set_branching(self, enabled=True):
+        """Enables the splitting of shots among the outcomes of collapsing measurements.
+
+        When enabled, circuits with collapsing measurements are simulated once
+        for every distinct branch of measurement outcomes, instead of once for
+        every shot. When disabled, every shot is simulated separately, as in
+        the other backends.
+
+        Args:
+            enabled (bool, optional): whether the shots are split among the
+                branches. Defaults to ``True``.
+        """
+        self.branching = bool(enabled)
 
     def cast(self, x, dtype=None, copy=False):
         if dtype is None:
@@ -79,6 +192,68 @@ class NumpyBackend(Backend):
     def compile(self, func):
         return func
 
+    def compile_circuit(self, circuit):
+        """Compiles a circuit to an execution plan.
+
+        State vector circuits without collapsing measurements and channels are
+        compiled to an :class:`qibo.backends._numpy_plan.ExecutionPlan`, which
+        holds the kernels and the precomputed matrices of all gates that are
+        not parametrized, so that re-executing the circuit skips the per-gate
+        dispatch. Other circuits, and backends that do not use the numpy
+        kernels, fall back to :meth:`qibo.backends.abstract.Backend.compile_circuit`.
+        """
+        if (
+            self._uses_numpy_kernels()
+            and type(self).execute_circuit is NumpyBackend.execute_circuit
+            and not circuit.density_matrix
+            and not circuit.repeated_execution
+        ):
+            return ExecutionPlan(self, circuit)
+        return super().compile_circuit(circuit)
+
+    def circuit_unitary(self, circuit, block_size=None, out=None, callback=None):
+        """Builds the unitary matrix of a circuit one block of columns at a time.
+
+        The gates are compiled once to an
+        :class:`qibo.backends._numpy_plan.ExecutionPlan`, which is applied to
+        a batch of ``block_size`` computational basis states. The evolved
+        states are the columns of the unitary. If ``block_size`` is ``None``,
+        it is chosen so that a block holds at most
+        ``UNITARY_BLOCK_ELEMENTS`` amplitudes. Backends that do not use the
+        numpy kernels fall back to
+        :meth:`qibo.backends.abstract.Backend.circuit_unitary`.
+        """
+        if not self._uses_numpy_kernels():
+            return super().circuit_unitary(circuit, block_size, out, callback)
+
+        from qibo import gates  # pylint: disable=C0415
+
+        nqubits = circuit.nqubits
+        dim = 2**nqubits
+        queue = [
+            gate
+            for gate in circuit.queue
+            if not isinstance(gate, (gates.SpecialGate, gates.M))
+        ]
+        plan = ExecutionPlan(self, circuit, queue)
+        if block_size is None:
+            block_size = max(1, self.UNITARY_BLOCK_ELEMENTS // dim)
+        block_size = min(block_size, dim)
+        if out is None and callback is None:
+            out = np.empty((dim, dim), dtype=self.dtype)
+        columns = np.arange(block_size)
+        for start in range(0, dim, block_size):
+            size = min(block_size, dim - start)
+            state = np.zeros((size, dim), dtype=self.dtype)
+            state[columns[:size], start + columns[:size]] = 1
+            # row ``i`` of the evolved batch is column ``start + i`` of the unitary
+            block = plan.apply(state).T
+            if callback is not None:
+                callback(start, block)
+            if out is not None:
+                out[:, start : start + size] = block
+        return out
+
     def zero_state(self, nqubits):
         state = self.np.zeros(2**nqubits, dtype=self.dtype)
         state[0] = 1
@@ -105,38 +280,270 @@ class NumpyBackend(Backend):
         state /= 2**nqubits
         return state
 
+    def set_matrix_cache(self, maxsize=None, policy=None):
+        """Configures the cache of gate matrices.
+
+        Matrices of :meth:`qibo.backends.numpy.NumpyBackend.matrix` and
+        :meth:`qibo.backends.numpy.NumpyBackend.matrix_parametrized` are cached
+        by gate class, parameter values, number of target and control qubits
+        and dtype. The cached matrices are read-only and used by the kernels,
+        while the public methods return writeable copies. The cache is cleared
+        when the precision changes and its statistics are available through
+        ``backend.matrix_cache.info()``.
+
+        Args:
+            maxsize (int, optional): maximum number of cached matrices. If
+                ``0``, the cache is disabled. If ``None``, the size is not
+                changed. Defaults to ``None``.
+            policy (str, optional): eviction policy, either ``"lru"`` (least
+                recently used) or ``"fifo"`` (first in, first out). If ``None``,
+                the policy is not changed. Defaults to ``None``.
+        """
+        self.matrix_cache.configure(maxsize, policy)
+
+    def set_result_cache(self, maxsize=None, max_bytes=None, directory=None):
+        """Enables the cache of the final states of executed circuits.
+
+        Circuits are identified by :meth:`qibo.models.circuit.Circuit.content_hash`,
+        together with the hash of the initial state and the backend name,
+        platform and precision, so that identical circuits reuse the state of
+        the first execution even if they are built again. Only deterministic
+        executions are cached, namely circuits without callbacks and, for
+        state vectors, without collapsing measurements and noise. The seed is
+        therefore not part of the key: circuits with measurements sample new
+        shots from the cached state using the random number generator of the
+        backend. The statistics are available through
+        ``backend.result_cache.info()``.
+
+        Args:
+            maxsize (int, optional): maximum number of cached states. If
+                ``None`` or ``0``, the cache is disabled. Defaults to ``None``.
+            max_bytes (int, optional): maximum total size of the cached states
+                in bytes. If ``None``, only the number of states is bounded.
+                Defaults to ``None``.
+            directory (str, optional): directory where the states are saved,
+                so that they are reused by different processes and sessions.
+                If ``None``, the states are held in memory. Defaults to ``None``.
+        """
+        if not maxsize:
+            self.result_cache = None
+        else:
+            self.result_cache = ResultCache(maxsize, max_bytes, directory)
+
+    def _result_key(self, circuit, initial_state):
+        """Key of the final state of ``circuit`` in ``self.result_cache``.
+
+        Returns ``None`` if the final state should not be cached.
+        """
+        # pylint: disable=import-outside-toplevel
+        from qibo import gates
+        from qibo.models._hashing import array_hash
+
+        if (
+            self.result_cache is None
+            # tensors of other backends may require gradients
+            or self.np is not np
+            or circuit.repeated_execution
+            or circuit.accelerators
+            or any(isinstance(gate, gates.CallbackGate) for gate in circuit.queue)
+        ):
+            return None
+        if (
+            not circuit.density_matrix
+            and self.out_of_core is not None
+            and circuit.nqubits > self.out_of_core[1]
+        ):
+            return None
+        if initial_state is not None:
+            initial_state = array_hash(self.to_numpy(initial_state))
+        return (
+            circuit.content_hash(),
+            initial_state,
+            self.name,
+            self.platform,
+            self.precision,
+        )
+
+    def _cached_result(self, circuit, state, nshots):
+        """Result of ``circuit`` from the ``state`` found in the result cache."""
+        state = self.cast(state, copy=True)
+        if circuit.measurements:
+            circuit._final_state = CircuitResult(
+                state, circuit.measurements, backend=self, nshots=nshots
+            )
+        else:
+            circuit._final_state = QuantumState(state, backend=self)
+        return circuit._final_state
+
+    def _matrix_key(self, gate, parameters=()):
+        """Key of the matrix of ``gate`` in ``self.matrix_cache``.
+
+        Returns ``None`` if the matrix should not be cached, for example when
+        the parameters are arrays or tensors that may require gradients.
+        """
+        if self.np is not np:
+            return None
+        if not all(
+            isinstance(x, self.numeric_types) and not isinstance(x, np.ndarray)
+            for x in parameters
+        ):
+            return None
+        return (
+            gate.__class__,
+            tuple(parameters),
+            len(gate.target_qubits),
+            len(gate.control_qubits),
+            str(self.dtype),
+        )
+
+    def _cached_matrix(self, key, build):
+        """Returns the matrix built by ``build`` using ``self.matrix_cache``.
+
+        Cached matrices are read-only, so that they cannot be modified in
+        place by the kernels that share them.
+        """
+        if key is None:
+            return build()
+
+        def build_readonly():
+            matrix = np.array(build())
+            matrix.flags.writeable = False
+            return matrix
+
+        return self.matrix_cache.get(key, build_readonly)
+
+    @staticmethod
+    def _writeable(matrix):
+        """Copy of a read-only cached ``matrix`` returned by the public methods."""
+        if isinstance(matrix, np.ndarray) and not matrix.flags.writeable:
+            return np.array(matrix)
+        return matrix
+
+    def _gate_matrix(self, gate):
+        """Matrix of ``gate`` used internally, without copying cached matrices.
+
+        Falls back to ``gate.matrix`` when the gate or a subclass of this
+        backend defines its own matrix.
+        """
+        from qibo import gates  # pylint: disable=C0415
+
+        for method, name in (
+            (gates.FusedGate.matrix, "matrix_fused"),
+            (gates.ParametrizedGate.matrix, "matrix_parametrized"),
+            (gates.Gate.matrix, "matrix"),
+        ):
+            if type(gate).matrix is method:
+                if getattr(type(self), name) is getattr(NumpyBackend, name):
+                    return getattr(self, f"_{name}")(gate)
+                break
+        return gate.matrix(self)
+
     def matrix(self, gate):
         """Convert a gate to its matrix representation in the computational basis."""
-        name = gate.__class__.__name__
-        _matrix = getattr(self.matrices, name)
-        if callable(_matrix):
-            _matrix = _matrix(2 ** len(gate.target_qubits))
-        return self.cast(_matrix, dtype=_matrix.dtype)
+        return self._writeable(self._matrix(gate))
+
+    def _matrix(self, gate):
+        def build():
+            name = gate.__class__.__name__
+            _matrix = getattr(self.matrices, name)
+            if callable(_matrix):
+                _matrix = _matrix(2 ** len(gate.target_qubits))
+            return self.cast(_matrix, dtype=_matrix.dtype)
+
+        return self._cached_matrix(self._matrix_key(gate), build)
 
     def matrix_parametrized(self, gate):
         """Convert a parametrized gate to its matrix representation in the computational basis."""
+        return self._writeable(self._matrix_parametrized(gate))
+
+    def _matrix_parametrized(self, gate):
         name = gate.__class__.__name__
-        _matrix = getattr(self.matrices, name)
         if name == "GeneralizedRBS":
-            _matrix = _matrix(
-                qubits_in=gate.init_args[0],
-                qubits_out=gate.init_args[1],
-                theta=gate.init_kwargs["theta"],
-                phi=gate.init_kwargs["phi"],
+            parameters = (
+                len(gate.init_args[0]),
+                gate.init_kwargs["theta"],
+                gate.init_kwargs["phi"],
             )
         else:
-            _matrix = _matrix(*gate.parameters)
-        return self.cast(_matrix, dtype=_matrix.dtype)
+            parameters = gate.parameters
+
+        def build():
+            _matrix = getattr(self.matrices, name)
+            if name == "GeneralizedRBS":
+                _matrix = _matrix(
+                    qubits_in=gate.init_args[0],
+                    qubits_out=gate.init_args[1],
+                    theta=gate.init_kwargs["theta"],
+                    phi=gate.init_kwargs["phi"],
+                )
+            else:
+                _matrix = _matrix(*gate.parameters)
+            return self.cast(_matrix, dtype=_matrix.dtype)
 
-    def matrix_fused(self, fgate):
-        rank = len(fgate.target_qubits)
-        matrix = sparse.eye(2**rank)
+        return self._cached_matrix(self._matrix_key(gate, parameters), build)
+
+    def _fused_keys(self, fgate):
+        """Keys that identify the gates of a :class:`qibo.gates.FusedGate`.
 
+        The key of a gate changes when its parameters change. Returns ``None``
+        if the matrix of ``fgate`` should not be cached, for example when some
+        parameters are arrays or tensors that may require gradients.
+        """
+        from qibo import gates  # pylint: disable=C0415
+
+        if self.np is not np:
+            return None
+        keys = []
         for gate in fgate.gates:
+            parameters = ()
+            if isinstance(gate, gates.ParametrizedGate):
+                parameters = gate.parameters
+                if not all(
+                    isinstance(x, self.numeric_types) and not isinstance(x, np.ndarray)
+                    for x in parameters
+                ):
+                    return None
+            # gates are referenced by ``fgate``, so their ids are not reused
+            keys.append((id(gate), parameters))
+        return keys
+
+    def matrix_fused(self, fgate):
+        """Matrix of a :class:`qibo.gates.FusedGate`.
+
+        The matrix of every gate is contracted with the rank-``k`` tensor of
+        the fused matrix, where ``k`` is the number of target qubits of
+        ``fgate``. The products of the first gates are cached on ``fgate``,
+        so that when the parameters of a gate change only the gates from
+        that one onwards are contracted again.
+        """
+        return self._writeable(self._matrix_fused(fgate))
+
+    def _matrix_fused(self, fgate):
+        targets = tuple(fgate.target_qubits)
+        rank = len(targets)
+        keys = self._fused_keys(fgate)
+        layout, cached_keys, products = getattr(fgate, "_matrix", (None, (), None))
+        start = 0
+        if keys is not None and layout == (str(self.dtype), targets):
+            while (
+                start < min(len(keys), len(cached_keys))
+                and keys[start] == cached_keys[start]
+            ):
+                start += 1
+            if start == len(keys) == len(cached_keys):
+                return products[-1]
+        if start == 0:
+            identity = np.eye(2**rank, dtype=complex)
+            products = [np.reshape(identity, 2 * rank * (2,))]
+        else:
+            products = products[: start + 1]
+
+        matrix = np.reshape(products[-1], 2 * rank * (2,))
+        for gate in fgate.gates[start:]:
             # transfer gate matrix to numpy as it is more efficient for
             # small tensor calculations
             # explicit to_numpy see https://github.com/qiboteam/qibo/issues/928
-            gmatrix = self.to_numpy(gate.matrix(self))
+            gmatrix = self.to_numpy(self._gate_matrix(gate))
             # add controls if controls were instantiated using
             # the ``Gate.controlled_by`` method
             num_controls = len(gate.control_qubits)
@@ -144,30 +551,120 @@ class NumpyBackend(Backend):
                 gmatrix = block_diag(
                     np.eye(2 ** len(gate.qubits) - len(gmatrix)), gmatrix
                 )
-            # Kronecker product with identity is needed to make the
-            # original matrix have shape (2**rank x 2**rank)
-            eye = np.eye(2 ** (rank - len(gate.qubits)))
-            gmatrix = np.kron(gmatrix, eye)
-            # Transpose the new matrix indices so that it targets the
-            # target qubits of the original gate
-            original_shape = gmatrix.shape
-            gmatrix = np.reshape(gmatrix, 2 * rank * (2,))
-            qubits = list(gate.qubits)
-            indices = qubits + [q for q in fgate.target_qubits if q not in qubits]
-            indices = np.argsort(indices)
-            transpose_indices = list(indices)
-            transpose_indices.extend(indices + rank)
-            gmatrix = np.transpose(gmatrix, transpose_indices)
-            gmatrix = np.reshape(gmatrix, original_shape)
-            # fuse the individual gate matrix to the total ``FusedGate`` matrix
-            # we are using sparse matrices to improve perfomances
-            matrix = sparse.csr_matrix(gmatrix).dot(matrix)
-
-        return self.cast(matrix.toarray())
+            nqubits = len(gate.qubits)
+            gmatrix = np.reshape(gmatrix, 2 * nqubits * (2,))
+            axes, order = einsum_utils.fused_embedding(tuple(gate.qubits), targets)
+            matrix = np.tensordot(
+                gmatrix, matrix, axes=(range(nqubits, 2 * nqubits), axes)
+            )
+            matrix = np.transpose(matrix, order)
+            if keys is not None:
+                products.append(matrix)
+
+        matrix = self.cast(np.reshape(matrix, 2 * (2**rank,)))
+        if keys is not None:
+            matrix.flags.writeable = False
+            products[-1] = matrix
+            fgate._matrix = ((str(self.dtype), targets), keys, products)
+        return matrix
+
+    def _uses_numpy_kernels(self):
+        """Whether gates are applied using :mod:`qibo.backends._numpy_kernels`."""
+        return self.np is np and type(self).apply_gate is NumpyBackend.apply_gate
+
+    def _writeable_state(self, state):
+        """Casts ``state`` to a contiguous array that can be updated in place."""
+        state = np.ascontiguousarray(self.cast(state))
+        if not state.flags.writeable:
+            state = state.copy()
+        return state
+
+    def _diagonal(self, gate):
+        """Diagonal of the matrix of a unitary gate and the qubits it acts on.
+
+        For gates created with :meth:`qibo.gates.Gate.controlled_by` the
+        diagonal includes the control qubits. Returns ``None`` if the gate
+        matrix is not diagonal.
+        """
+        if not gate.unitary or len(gate.qubits) > _numpy_kernels.MAX_DIAGONAL_QUBITS:
+            return None
+        phases = _numpy_kernels.diagonal(self.to_numpy(self._gate_matrix(gate)))
+        if phases is None:
+            return None
+        if gate.is_controlled_by:
+            ones = np.ones(2 ** len(gate.qubits) - len(phases), dtype=phases.dtype)
+            phases = np.concatenate([ones, phases])
+        return phases, gate.qubits
+
+    def _apply_gates(self, queue, state, nqubits):
+        """Applies a sequence of gates to a state vector.
+
+        Consecutive diagonal gates are merged to a single phase tensor acting
+        on at most ``_numpy_kernels.MAX_DIAGONAL_QUBITS`` qubits, which is then
+        multiplied to the state in place.
+        """
+        if not self._uses_numpy_kernels():
+            for gate in queue:
+                state = gate.apply(self, state, nqubits)
+            return state
+
+        phases, targets = None, ()
+        for gate in queue:
+            diagonal = self._diagonal(gate)
+            if diagonal is not None and phases is not None:
+                qubits = set(targets) | set(diagonal[1])
+                if len(qubits) <= _numpy_kernels.MAX_DIAGONAL_QUBITS:
+                    phases, targets = _numpy_kernels.merge_diagonals(
+                        phases, targets, *diagonal
+                    )
+                    continue
+            if phases is not None:
+                state = _numpy_kernels.apply_diagonal(
+                    self._writeable_state(state),
+                    phases,
+                    targets,
+                    nqubits,
+                    threads=self._threads,
+                )
+                phases = None
+            if diagonal is not None:
+                phases, targets = diagonal
+            else:
+                state = gate.apply(self, state, nqubits)
+        if phases is not None:
+            state = _numpy_kernels.apply_diagonal(
+                self._writeable_state(state),
+                phases,
+                targets,
+                nqubits,
+                threads=self._threads,
+            )
+        return state
+
+    def _kernel_qubits(self, gate):
+        """Target and control qubits passed to :mod:`qibo.backends._numpy_kernels`.
+
+        Gates such as :class:`qibo.gates.CNOT` define their matrix on all of
+        their qubits, while gates created with :meth:`qibo.gates.Gate.controlled_by`
+        define it only on their target qubits.
+        """
+        if gate.is_controlled_by:
+            return gate.target_qubits, gate.control_qubits
+        return gate.qubits, ()
 
     def apply_gate(self, gate, state, nqubits):
+        matrix = self._gate_matrix(gate)
+        if self.np is np:
+            targets, controls = self._kernel_qubits(gate)
+            return _numpy_kernels.apply_gate_matrix(
+                self._writeable_state(state),
+                self.to_numpy(matrix),
+                targets,
+                nqubits,
+                controls,
+                self._threads,
+            )
         state = self.np.reshape(state, nqubits * (2,))
-        matrix = gate.matrix(self)
         if gate.is_controlled_by:
             matrix = self.np.reshape(matrix, 2 * len(gate.target_qubits) * (2,))
             ncontrol = len(gate.control_qubits)
@@ -187,14 +684,35 @@ class NumpyBackend(Backend):
             state = self.np.transpose(state, einsum_utils.reverse_order(order))
         else:
             matrix = self.np.reshape(matrix, 2 * len(gate.qubits) * (2,))
-            opstring = einsum_utils.apply_gate_string(gate.qubits, nqubits)
-            state = self.np.einsum(opstring, state, matrix)
+            shape, targets, naxes = einsum_utils.merge_axes(gate.qubits, nqubits)
+            opstring = einsum_utils.apply_gate_string(targets, naxes)
+            state = self.np.einsum(opstring, self.np.reshape(state, shape), matrix)
         return self.np.reshape(state, (2**nqubits,))
 
     def apply_gate_density_matrix(self, gate, state, nqubits):
         state = self.cast(state)
+        if self.np is np:
+            # the density matrix is updated in place as a state vector of
+            # ``2 * nqubits`` qubits: ``matrix`` acts on the row indices and
+            # its conjugate on the column indices
+            shape = state.shape
+            matrix = self.to_numpy(self._gate_matrix(gate))
+            targets, controls = self._kernel_qubits(gate)
+            state = self._writeable_state(state).ravel()
+            state = _numpy_kernels.apply_gate_matrix(
+                state, matrix, targets, 2 * nqubits, controls, self._threads
+            )
+            state = _numpy_kernels.apply_gate_matrix(
+                state,
+                np.conj(matrix),
+                tuple(q + nqubits for q in targets),
+                2 * nqubits,
+                tuple(q + nqubits for q in controls),
+                self._threads,
+            )
+            return np.reshape(state, shape)
         state = self.np.reshape(state, 2 * nqubits * (2,))
-        matrix = gate.matrix(self)
+        matrix = self._gate_matrix(gate)
         if gate.is_controlled_by:
             matrix = self.np.reshape(matrix, 2 * len(gate.target_qubits) * (2,))
             matrixc = self.np.conj(matrix)
@@ -231,17 +749,20 @@ class NumpyBackend(Backend):
         else:
             matrix = self.np.reshape(matrix, 2 * len(gate.qubits) * (2,))
             matrixc = self.np.conj(matrix)
-            left, right = einsum_utils.apply_gate_density_matrix_string(
-                gate.qubits, nqubits
-            )
+            # rows and columns are treated as the qubits of a state vector
+            ntargets = len(gate.qubits)
+            qubits = gate.qubits + tuple(q + nqubits for q in gate.qubits)
+            shape, targets, naxes = einsum_utils.merge_axes(qubits, 2 * nqubits)
+            left = einsum_utils.apply_gate_string(targets[:ntargets], naxes)
+            right = einsum_utils.apply_gate_string(targets[ntargets:], naxes)
+            state = self.np.reshape(state, shape)
             state = self.np.einsum(right, state, matrixc)
             state = self.np.einsum(left, state, matrix)
         return self.np.reshape(state, 2 * (2**nqubits,))
 
     def apply_gate_half_density_matrix(self, gate, state, nqubits):
         state = self.cast(state)
-        state = self.np.reshape(state, 2 * nqubits * (2,))
-        matrix = gate.matrix(self)
+        matrix = self._gate_matrix(gate)
         if gate.is_controlled_by:  # pragma: no cover
             raise_error(
                 NotImplementedError,
@@ -251,10 +772,15 @@ class NumpyBackend(Backend):
             )
         else:
             matrix = self.np.reshape(matrix, 2 * len(gate.qubits) * (2,))
-            left, _ = einsum_utils.apply_gate_density_matrix_string(
-                gate.qubits, nqubits
-            )
-            state = self.np.einsum(left, state, matrix)
+            # the gate acts only on the row indices
+            shape, targets, naxes = einsum_utils.merge_axes(gate.qubits, 2 * nqubits)
+            left = einsum_utils.apply_gate_string(targets, naxes)
+            state = self.np.reshape(state, shape)
+            if self.np is np:
+                path = einsum_utils.einsum_path(left, state.shape, matrix.shape)
+                state = np.einsum(left, state, matrix, optimize=path)
+            else:
+                state = self.np.einsum(left, state, matrix)
         return self.np.reshape(state, 2 * (2**nqubits,))
 
     def apply_channel(self, channel, state, nqubits):
@@ -269,7 +795,9 @@ class NumpyBackend(Backend):
         state = self.cast(state)
         new_state = (1 - channel.coefficient_sum) * state
         for coeff, gate in zip(channel.coefficients, channel.gates):
-            new_state += coeff * self.apply_gate_density_matrix(gate, state, nqubits)
+            new_state += coeff * self.apply_gate_density_matrix(
+                gate, self.cast(state, copy=True), nqubits
+            )
         return new_state
 
     def _append_zeros(self, state, qubits, results):
@@ -399,6 +927,8 @@ class NumpyBackend(Backend):
                 return self.execute_circuit(initial_state + circuit, None, nshots)
         elif initial_state is not None:
             initial_state = self.cast(initial_state)
+            if not circuit.density_matrix and len(initial_state.shape) == 2:
+                return self._execute_circuit_batched(circuit, initial_state)
             valid_shape = (
                 2 * (2**circuit.nqubits,)
                 if circuit.density_matrix
@@ -411,6 +941,12 @@ class NumpyBackend(Backend):
                     f"the expected {valid_shape}.",
                 )
 
+        key = self._result_key(circuit, initial_state)
+        if key is not None:
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                return self._cached_result(circuit, cached, nshots)
+
         if circuit.repeated_execution:
             if circuit.measurements or circuit.has_collapse:
                 return self.execute_circuit_repeated(circuit, nshots, initial_state)
@@ -429,21 +965,30 @@ class NumpyBackend(Backend):
                 if initial_state is None:
                     state = self.zero_density_matrix(nqubits)
                 else:
-                    # cast to proper complex type
-                    state = self.cast(initial_state)
+                    # cast to proper complex type and copy, as gates may be
+                    # applied in place
+                    state = self.cast(initial_state, copy=True)
 
                 for gate in circuit.queue:
                     state = gate.apply_density_matrix(self, state, nqubits)
 
+            elif self.out_of_core is not None and nqubits > self.out_of_core[1]:
+                directory, nlocal = self.out_of_core
+                state = OutOfCoreState(self, nqubits, nlocal, directory)
+                state = state.set(initial_state).execute(circuit.queue)
+
             else:
                 if initial_state is None:
                     state = self.zero_state(nqubits)
                 else:
-                    # cast to proper complex type
-                    state = self.cast(initial_state)
+                    # cast to proper complex type and copy, because gates
+                    # may be applied in place
+                    state = self.cast(initial_state, copy=True)
 
-                for gate in circuit.queue:
-                    state = gate.apply(self, state, nqubits)
+                state = self._apply_gates(circuit.queue, state, nqubits)
+
+            if key is not None:
+                self.result_cache.put(key, self.to_numpy(state))
 
             if circuit.has_unitary_channel:
                 # here we necessarily have `density_matrix=True`, otherwise
@@ -475,6 +1020,164 @@ class NumpyBackend(Backend):
                 "different one using ``qibo.set_device``.",
             )
 
+    def _check_batched_execution(self, circuit):
+        """Checks that ``circuit`` can be executed on a batch of state vectors."""
+        from qibo import gates  # pylint: disable=C0415
+
+        if not self._uses_numpy_kernels():
+            raise_error(
+                NotImplementedError,
+                f"Batched execution is not available for the {self.name} backend.",
+            )
+        if (
+            circuit.density_matrix
+            or circuit.measurements
+            or circuit.repeated_execution
+            or circuit.accelerators
+            or any(
+                isinstance(gate, (gates.CallbackGate, gates.Channel))
+                for gate in circuit.queue
+            )
+        ):
+            raise_error(
+                NotImplementedError,
+                "Batched execution is only available for state vector circuits "
+                "without measurements, channels and callbacks.",
+            )
+
+    def _execute_circuit_batched(self, circuit, initial_state):
+        """Executes a circuit on a batch of state vectors.
+
+        The states are stacked along the first axis of ``initial_state`` and
+        every gate is applied to the whole batch at once.
+
+        Returns:
+            :class:`qibo.result.QuantumStateBatch`: the final states.
+        """
+        nqubits = circuit.nqubits
+        if initial_state.shape[1] != 2**nqubits:
+            raise_error(
+                ValueError,
+                f"Given batch of initial states has shape {initial_state.shape} "
+                f"instead of the expected (batch, {2**nqubits}).",
+            )
+        self._check_batched_execution(circuit)
+        # copy, because gates are applied in place
+        state = self.cast(initial_state, copy=True)
+        state = self._apply_gates(circuit.queue, state, nqubits)
+        circuit._final_state = QuantumStateBatch(state, backend=self)
+        return circuit._final_state
+
+    def _batched_matrix(self, gate, parameters):
+        """Matrices of a parametrized gate for a batch of parameter values.
+
+        Args:
+            gate (:class:`qibo.gates.abstract.ParametrizedGate`): the gate.
+            parameters (ndarray): values of the gate parameters, with shape
+                ``(gate.nparams, batch)``.
+
+        Returns:
+            ndarray: matrices with shape ``(batch, 2 ** k, 2 ** k)``.
+        """
+        name = gate.__class__.__name__
+        if name in ("Unitary", "GeneralizedfSim"):
+            raise_error(
+                NotImplementedError,
+                f"Vectorized parameters are not available for {name} gates.",
+            )
+        _matrix = getattr(self.matrices, name)
+        if name == "GeneralizedRBS":
+            _matrix = _matrix(
+                qubits_in=gate.init_args[0],
+                qubits_out=gate.init_args[1],
+                theta=parameters[0],
+                phi=parameters[1],
+            )
+        else:
+            _matrix = _matrix(*parameters)
+        batch = parameters.shape[1]
+        return np.broadcast_to(_matrix, (batch,) + _matrix.shape[-2:])
+
+    def execute_parametrized(self, circuit, parameters, initial_state=None):
+        """Executes a parametrized circuit for many sets of parameters at once.
+
+        The states of all parameter sets are evolved together as a batch.
+        The matrices of the trainable gates are built with a leading batch
+        axis, so that each gate is applied once for all parameter sets. The
+        parameters of ``circuit`` are not modified.
+
+        Args:
+            circuit (:class:`qibo.models.circuit.Circuit`): circuit to execute.
+            parameters (ndarray): array of shape ``(M, nparams)``, where each
+                row is a flat list of parameters, in the same order as
+                :meth:`qibo.models.circuit.Circuit.set_parameters`.
+            initial_state (ndarray, optional): state vector used for all
+                parameter sets, or batch of ``M`` state vectors. If ``None``,
+                the zero state is used. Defaults to ``None``.
+
+        Returns:
+            :class:`qibo.result.QuantumStateBatch`: final state for each set of
+            parameters.
+        """
+        nqubits = circuit.nqubits
+        parameters = np.asarray(self.to_numpy(parameters))
+        nparams = circuit.trainable_gates.nparams
+        if parameters.ndim != 2 or parameters.shape[1] != nparams:
+            raise_error(
+                ValueError,
+                f"Given parameters have shape {parameters.shape} instead of "
+                f"the expected (M, {nparams}).",
+            )
+
+        batch = len(parameters)
+        if initial_state is None:
+            initial_state = self.zero_state(nqubits)
+        initial_state = self.cast(initial_state)
+        if len(initial_state.shape) == 1:
+            initial_state = initial_state[None]
+        if initial_state.shape[-1] != 2 ** nqubits or len(initial_state) not in (
+            1,
+            batch,
+        ):
+            raise_error(
+                ValueError,
+                f"Given initial state has shape {initial_state.shape} instead of "
+                f"the expected ({2**nqubits},) or ({batch}, {2**nqubits}).",
+            )
+        self._check_batched_execution(circuit)
+        # copy, because gates are applied in place
+        state = np.array(
+            np.broadcast_to(initial_state, (batch, 2**nqubits)),
+            dtype=self.dtype,
+            order="C",
+        )
+
+        batched, k = {}, 0
+        for gate in circuit.trainable_gates:
+            batched[gate] = parameters[:, k : k + gate.nparams].T
+            k += gate.nparams
+        if not set(batched).issubset(circuit.queue):
+            raise_error(
+                NotImplementedError,
+                "Vectorized parameters are not available for trainable gates "
+                "that are not in the circuit queue, for example fused gates.",
+            )
+
+        queue = []
+        for gate in circuit.queue:
+            if gate in batched:
+                state = self._apply_gates(queue, state, nqubits)
+                targets, controls = self._kernel_qubits(gate)
+                matrices = self._batched_matrix(gate, batched.get(gate))
+                state = _numpy_kernels.apply_batched(
+                    state, matrices, targets, nqubits, controls, self._threads
+                )
+                queue = []
+            else:
+                queue.append(gate)
+        state = self._apply_gates(queue, state, nqubits)
+        return QuantumStateBatch(state, backend=self)
+
     def execute_circuits(
         self, circuits, initial_states=None, nshots=1000, processes=None
     ):
@@ -511,14 +1214,84 @@ class NumpyBackend(Backend):
             ]
             target_qubits = sum(target_qubits, tuple())
 
-        for _ in range(nshots):
+        # the deterministic prefix of the circuit is simulated only once
+        prefix, steps = self._trajectory_steps(circuit)
+        if circuit.density_matrix:
+            if initial_state is None:
+                prefix_state = self.zero_density_matrix(nqubits)
+            else:
+                prefix_state = self.cast(initial_state, copy=True)
+            for gate in prefix:
+                prefix_state = gate.apply_density_matrix(self, prefix_state, nqubits)
+        elif not circuit.accelerators:
+            if initial_state is None:
+                prefix_state = self.zero_state(nqubits)
+            else:
+                prefix_state = self.cast(initial_state, copy=True)
+            prefix_state = self._apply_gates(prefix, prefix_state, nqubits)
+
+        if self._batched_trajectories(circuit, steps):
+            batch = self.trajectory_batch_size
+            if batch is None:
+                batch = _trajectories.batch_size(nqubits, nshots, self.dtype)
+            decimal_samples = _trajectories.execute(
+                self, circuit, nshots, prefix_state, steps, batch
+            )
+            final_result = MeasurementOutcomes(
+                circuit.measurements, backend=self, nshots=nshots
+            )
+            # applies the bitflip noise of the measurements
+            samples = final_result._binary_samples(decimal_samples)
+            final_result = MeasurementOutcomes(
+                circuit.measurements, backend=self, samples=samples, nshots=nshots
+            )
+            final_result._repeated_execution_frequencies = frequencies_to_binary(
+                self.calculate_frequencies(
+                    self.samples_to_decimal(samples, len(target_qubits))
+                ),
+                len(target_qubits),
+            )
+            circuit._final_state = final_result
+            return final_result
+
+        if self._branching_execution(circuit, nshots, steps):
+            decimal_samples, final_state = _branching.execute(
+                self, circuit, nshots, prefix_state, steps
+            )
+            if decimal_samples is None:
+                final_result = QuantumState(final_state, backend=self)
+                circuit._final_state = final_result
+                return final_result
+            final_result = MeasurementOutcomes(
+                circuit.measurements, backend=self, nshots=nshots
+            )
+            # applies the bitflip noise of the measurements
+            samples = final_result._binary_samples(decimal_samples)
             if circuit.density_matrix:
-                if initial_state is None:
-                    state = self.zero_density_matrix(nqubits)
-                else:
-                    state = self.cast(initial_state, copy=True)
+                final_result = CircuitResult(
+                    final_state,
+                    circuit.measurements,
+                    backend=self,
+                    samples=samples,
+                    nshots=nshots,
+                )
+            else:
+                final_result = MeasurementOutcomes(
+                    circuit.measurements, backend=self, samples=samples, nshots=nshots
+                )
+                final_result._repeated_execution_frequencies = frequencies_to_binary(
+                    self.calculate_frequencies(
+                        self.samples_to_decimal(samples, len(target_qubits))
+                    ),
+                    len(target_qubits),
+                )
+            circuit._final_state = final_result
+            return final_result
 
-                for gate in circuit.queue:
+        for _ in range(nshots):
+            if circuit.density_matrix:
+                state = self.cast(prefix_state, copy=True)
+                for gate in steps:
                     if gate.symbolic_parameters:
                         gate.substitute_symbols()
                     state = gate.apply_density_matrix(self, state, nqubits)
@@ -527,15 +1300,14 @@ class NumpyBackend(Backend):
                     # pylint: disable=E1111
                     state = self.execute_distributed_circuit(circuit, initial_state)
                 else:
-                    if initial_state is None:
-                        state = self.zero_state(nqubits)
-                    else:
-                        state = self.cast(initial_state, copy=True)
-
-                    for gate in circuit.queue:
-                        if gate.symbolic_parameters:
-                            gate.substitute_symbols()
-                        state = gate.apply(self, state, nqubits)
+                    state = self.cast(prefix_state, copy=True)
+                    for step in steps:
+                        if isinstance(step, ExecutionPlan):
+                            state = step.apply(self._writeable_state(state))
+                            continue
+                        if step.symbolic_parameters:
+                            step.substitute_symbols()
+                        state = step.apply(self, state, nqubits)
 
             if circuit.density_matrix:
                 final_states.append(state)
@@ -578,10 +1350,134 @@ class NumpyBackend(Backend):
             circuit._final_state = final_result
             return final_result
 
-    def execute_distributed_circuit(self, circuit, initial_state=None, nshots=None):
-        raise_error(
-            NotImplementedError, f"{self} does not support distributed execution."
+    def _batched_trajectories(self, circuit, steps):
+        """Whether the trajectories of ``circuit`` can be evolved in batches.
+
+        This is possible for state vector circuits executed with the in-place
+        kernels, whose only gates that act differently on each trajectory are
+        unitary channels.
+        """
+        from qibo import gates  # pylint: disable=C0415
+
+        return (
+            not circuit.density_matrix
+            and not circuit.accelerators
+            and bool(circuit.measurements)
+            and self._uses_numpy_kernels()
+            and all(
+                isinstance(step, (ExecutionPlan, gates.UnitaryChannel))
+                for step in steps
+            )
+        )
+
+    def _branching_execution(self, circuit, nshots, steps):
+        """Whether the shots of ``circuit`` can be split among the branches of
+        its collapsing measurements with :mod:`qibo.backends._branching`.
+
+        This is possible for circuits executed with the in-place kernels that
+        contain collapsing measurements and no callbacks. State vector circuits
+        may only contain unitary channels. Branching is disabled with
+        :meth:`qibo.backends.numpy.NumpyBackend.set_branching`.
+        """
+        from qibo import gates  # pylint: disable=C0415
+
+        def supported(step):
+            if isinstance(step, gates.CallbackGate):
+                return False
+            if isinstance(step, gates.Channel) and not circuit.density_matrix:
+                return isinstance(step, gates.UnitaryChannel)
+            return True
+
+        return (
+            nshots > 1
+            and self.branching
+            and not circuit.accelerators
+            and self._uses_numpy_kernels()
+            and any(isinstance(step, gates.M) and step.collapse for step in steps)
+            and all(supported(step) for step in steps)
+        )
+
+    def _trajectory_steps(self, circuit):
+        """Splits the queue of a circuit executed by :meth:`execute_circuit_repeated`.
+
+        Gates that may act differently on every trajectory are channels,
+        collapsing measurements, callbacks and gates whose parameters depend
+        on measurement outcomes. All gates before the first of them are the
+        deterministic prefix of the circuit. For state vector circuits executed
+        with the in-place kernels, every later sequence of deterministic gates
+        is compiled once to an :class:`qibo.backends._numpy_plan.ExecutionPlan`.
+
+        Returns:
+            (list, list): the gates of the prefix and the steps that are
+            applied to every trajectory, either gates or execution plans.
+        """
+        from qibo import gates  # pylint: disable=C0415
+
+        def stochastic(gate):
+            if isinstance(gate, gates.M):
+                return gate.collapse
+            if isinstance(gate, gates.Channel) and not circuit.density_matrix:
+                return True
+            return isinstance(gate, gates.CallbackGate) or bool(
+                gate.symbolic_parameters
+            )
+
+        queue = list(circuit.queue)
+        start = next((i for i, g in enumerate(queue) if stochastic(g)), len(queue))
+        prefix, steps = queue[:start], []
+        compile_segments = (
+            not circuit.density_matrix
+            and not circuit.accelerators
+            and self._uses_numpy_kernels()
         )
+        segment = []
+        for gate in queue[start:] + [None]:
+            if gate is not None and compile_segments and not stochastic(gate):
+                segment.append(gate)
+                continue
+            if segment:
+                steps.append(ExecutionPlan(self, circuit, segment))
+                segment = []
+            if gate is not None:
+                steps.append(gate)
+        return prefix, steps
+
+    def execute_distributed_circuit(self, circuit, initial_state=None, nshots=None):
+        """Executes a distributed circuit with one worker process per device.
+
+        The state vector is split to the pieces of the logical devices given
+        in ``circuit.accelerators`` and the pieces are kept in shared memory.
+        Each piece is updated by a worker process, so the devices run in
+        parallel on the CPU cores. The names of the devices are ignored.
+        """
+        if not self._uses_numpy_kernels():
+            raise_error(
+                NotImplementedError, f"{self} does not support distributed execution."
+            )
+        if initial_state is not None:
+            initial_state = self.cast(initial_state)
+            if tuple(initial_state.shape) != (2**circuit.nqubits,):
+                raise_error(
+                    ValueError,
+                    f"Given initial state has shape {initial_state.shape} instead of "
+                    f"the expected {(2**circuit.nqubits,)}.",
+                )
+        if nshots is None:
+            nshots = 1000
+        try:
+            state = _distributed.execute(self, circuit, initial_state)
+        except self.oom_error:
+            raise_error(
+                RuntimeError,
+                f"State does not fit in the memory of {self.device}.",
+            )
+        if circuit.measurements:
+            circuit._final_state = CircuitResult(
+                state, circuit.measurements, backend=self, nshots=nshots
+            )
+        else:
+            circuit._final_state = QuantumState(state, backend=self)
+        return circuit._final_state
 
     def calculate_symbolic(
         self, state, nqubits, decimals=5, cutoff=1e-10, max_terms=20
@@ -643,13 +1539,77 @@ class NumpyBackend(Backend):
         probs = self.np.reshape(probs, len(qubits) * (2,))
         return self._order_probabilities(probs, qubits, nqubits).ravel()
 
+    @property
+    def rng(self):
+        """:class:`numpy.random.Generator` used to sample measurements.
+
+        Until :meth:`set_seed` is called, every access returns a new generator
+        seeded from numpy's global random state, so that samples are still
+        reproducible with ``np.random.seed``.
+        """
+        if self._rng is None:
+            return np.random.default_rng(
+                np.random.randint(2**32, size=4, dtype=np.uint64)
+            )
+        return self._rng
+
     def set_seed(self, seed):
+        """Seeds numpy's global random state and the generator of the backend.
+
+        After this call measurements are sampled only from the generator of
+        the backend, therefore they no longer depend on ``np.random.seed``.
+        """
         self.np.random.seed(seed)
+        self._rng = np.random.default_rng(seed)
+
+    def _multinomial(self, probabilities, nshots):
+        """Number of times that each outcome appears in ``nshots`` shots."""
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        return self.rng.multinomial(nshots, probabilities / np.sum(probabilities))
+
+    def shot_sampler(self, probabilities):
+        """Returns a function that samples shots from ``probabilities``.
+
+        The cumulative distribution is computed at the first call of the
+        returned function and reused by the next calls, therefore
+        ``probabilities`` must not be modified while the function is used.
+        Falls back to :meth:`sample_shots` when a subclass of this backend
+        defines its own sampling.
+        """
+        if type(self).sample_shots is not NumpyBackend.sample_shots:
+            return super().shot_sampler(probabilities)
+        cdf = None
+
+        def sample(nshots):
+            nonlocal cdf
+            if nshots >= len(probabilities):
+                # shuffled outcomes of a single multinomial draw, so that with
+                # the same seed the samples agree with ``sample_frequencies``
+                frequencies = self._multinomial(probabilities, nshots)
+                samples = np.repeat(np.arange(len(frequencies)), frequencies)
+            else:
+                if cdf is None:
+                    cdf = np.cumsum(probabilities, dtype=np.float64)
+                values = self.rng.random(nshots)
+                values *= cdf[-1]
+                # searching sorted values is much faster for large distributions
+                values.sort()
+                samples = np.searchsorted(cdf, values, side="right")
+                # guards against ``values`` rounded up to the total probability
+                np.minimum(samples, len(cdf) - 1, out=samples)
+            self.rng.shuffle(samples)
+            return samples
+
+        return sample
 
     def sample_shots(self, probabilities, nshots):
-        return self.np.random.choice(
-            range(len(probabilities)), size=nshots, p=probabilities
-        )
+        """Samples ``nshots`` shots from ``probabilities``.
+
+        Shots are drawn from :attr:`rng`. To sample several times from the
+        same distribution, :meth:`shot_sampler` computes the cumulative
+        distribution only once.
+        """
+        return self.shot_sampler(probabilities)(nshots)
 
     def aggregate_shots(self, shots):
         return self.cast(shots, dtype=shots[0].dtype)
@@ -681,6 +1641,14 @@ class NumpyBackend(Backend):
     def sample_frequencies(self, probabilities, nshots):
         from qibo.config import SHOT_BATCH_SIZE
 
+        if self.np is np:
+            # a single multinomial draw, without sampling the individual shots
+            frequencies = self._multinomial(probabilities, nshots)
+            outcomes = np.flatnonzero(frequencies)
+            return collections.Counter(
+                dict(zip(outcomes.tolist(), frequencies[outcomes].tolist()))
+            )
+
         nprobs = probabilities / self.np.sum(probabilities)
         frequencies = self.np.zeros(len(nprobs), dtype=self.np.int64)
         for _ in range(nshots // SHOT_BATCH_SIZE):
@@ -808,12 +1776,12 @@ class NumpyBackend(Backend):
                 [0, 0, 0, 0, 2, 0, 0, 0, 0, 0],
             ]
         elif name == "test_probabilistic_measurement":
-            return {0: 249, 1: 231, 2: 253, 3: 267}
+            return {0: 284, 1: 263, 2: 235, 3: 218}
         elif name == "test_unbalanced_probabilistic_measurement":
-            return {0: 171, 1: 148, 2: 161, 3: 520}
+            return {0: 195, 1: 132, 2: 177, 3: 496}
         elif name == "test_post_measurement_bitflips_on_circuit":
             return [
                 {5: 30},
-                {5: 18, 4: 5, 7: 4, 1: 2, 6: 1},
-                {4: 8, 2: 6, 5: 5, 1: 3, 3: 3, 6: 2, 7: 2, 0: 1},
+                {5: 17, 4: 5, 7: 4, 1: 2, 6: 2},
+                {4: 9, 2: 5, 5: 5, 3: 4, 6: 4, 0: 1, 1: 1, 7: 1},
             ]
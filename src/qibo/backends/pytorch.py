@@ -44,6 +44,7 @@ class PyTorchBackend(NumpyBackend):
         self.gradients = True
 
         self.np = torch
+        self.supports_multigpu = False
 
         self.name = "pytorch"
         self.versions = {
@@ -40,6 +40,7 @@ class QulacsBackend(NumpyBackend):
         self.name = "qulacs"
         self.versions = {"qibo": __version__, "qulacs": qulacs.__version__}
         self.device = "CPU"
+        self.supports_multigpu = False
 
     def execute_circuit(
         self,
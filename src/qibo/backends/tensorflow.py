@@ -43,6 +43,7 @@ class TensorflowBackend(NumpyBackend):
         tnp.experimental_enable_numpy_behavior()
         self.tf = tf
         self.np = tnp
+        self.supports_multigpu = False
         self.np.flatnonzero = np.flatnonzero
         self.np.copy = np.copy
 
@@ -18,6 +18,9 @@ if "TF_LOG_LEVEL" in os.environ:  # pragma: no cover
 # characters used in einsum strings
 EINSUM_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
 
+# Maximum number of memoized results of each einsum string builder
+EINSUM_CACHE_SIZE = 1024
+
 # Entanglement entropy eigenvalue cut-off
 # Eigenvalues smaller than this cut-off are ignored in entropy calculation
 EIGVAL_CUTOFF = 1e-14
@@ -0,0 +1,114 @@
+"""
+Light-cone expectation values used by
+:meth:`qibo.hamiltonians.SymbolicHamiltonian.expectation`.
+
+The expectation value of a local term on the final state of a circuit that
+starts from :math:`|0 \\dots 0 \\rangle` depends only on the gates in the
+backward light cone of the term's qubits. The terms of the Hamiltonian are
+split in groups with nested support, as for Trotterization, and every group
+is evaluated on the state of the circuit returned by
+:meth:`qibo.models.circuit.Circuit.light_cone`, which acts only on the qubits
+in the light cone. Groups whose reduced circuits are identical, for example
+in translationally invariant circuits, share a single simulation.
+"""
+
+import numpy as np
+
+from qibo import gates
+from qibo.config import raise_error
+
+_SIMPLE_TYPES = (bool, int, float, complex, str, type(None))
+
+
+def circuit_key(circuit, backend):
+    """Key that identifies circuits simulated to the same final state.
+
+    Returns:
+        tuple: the key, or ``None`` if the circuit contains gates that cannot
+        be compared, such as channels, measurements or special gates.
+    """
+    key = [circuit.nqubits, circuit.density_matrix]
+    for gate in circuit.queue:
+        if isinstance(gate, (gates.SpecialGate, gates.Channel, gates.M)):
+            return None
+        parameters = []
+        for parameter in gate.parameters:
+            parameter = np.asarray(backend.to_numpy(parameter))
+            parameters.append((parameter.shape, parameter.tobytes()))
+        kwargs = tuple(
+            (name, value)
+            for name, value in sorted(gate.init_kwargs.items())
+            if isinstance(value, _SIMPLE_TYPES)
+        )
+        key.append(
+            (
+                gate.__class__,
+                gate.target_qubits,
+                gate.control_qubits,
+                tuple(parameters),
+                kwargs,
+            )
+        )
+    return tuple(key)
+
+
+def expectation(hamiltonian, circuit, normalize=False):
+    """Expectation value of a symbolic Hamiltonian on the final state of a circuit.
+
+    Args:
+        hamiltonian (:class:`qibo.hamiltonians.SymbolicHamiltonian`): the
+            observable.
+        circuit (:class:`qibo.models.circuit.Circuit`): circuit executed from
+            the zero state.
+        normalize (bool, optional): If ``True``, the expectation value of
+            each group of terms is normalized by the norm of its reduced
+            state. Defaults to ``False``.
+
+    Returns:
+        float: the expectation value.
+    """
+    # pylint: disable=import-outside-toplevel
+    from qibo.hamiltonians.hamiltonians import SymbolicHamiltonian
+    from qibo.hamiltonians.terms import HamiltonianTerm, TermGroup
+
+    backend = hamiltonian.backend
+    if circuit.nqubits < hamiltonian.nqubits:
+        raise_error(
+            ValueError,
+            f"Cannot calculate expectation of Hamiltonian on {hamiltonian.nqubits} "
+            + f"qubits on circuit of {circuit.nqubits} qubits.",
+        )
+    if circuit.accelerators:  # pragma: no cover
+        raise_error(
+            NotImplementedError,
+            "Light cone expectation is not implemented for distributed circuits.",
+        )
+    if circuit.has_collapse or any(
+        isinstance(gate, gates.Channel) for gate in circuit.queue
+    ):
+        raise_error(
+            NotImplementedError,
+            "Light cone expectation is not implemented for circuits with "
+            + "collapsing measurements or channels.",
+        )
+
+    groups = TermGroup.from_terms(hamiltonian.terms)
+    states = {}
+    # the constant is known after the terms are calculated
+    total = hamiltonian.constant.real
+    for group in groups:
+        term = group.term
+        reduced, qubit_map = circuit.light_cone(*term.target_qubits)
+        key = circuit_key(reduced, backend)
+        state = states.get(key) if key is not None else None
+        if state is None:
+            state = backend.execute_circuit(reduced).state()
+            if key is not None:
+                states[key] = state
+        local = SymbolicHamiltonian(backend=backend)
+        local.terms = [
+            HamiltonianTerm(term.matrix, *(qubit_map[q] for q in term.target_qubits))
+        ]
+        local.nqubits = reduced.nqubits
+        total += local.expectation(state, normalize)
+    return total
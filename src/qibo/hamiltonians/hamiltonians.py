@@ -6,8 +6,9 @@ from typing import Optional
 import numpy as np
 import sympy
 
-from qibo.backends import PyTorchBackend, _check_backend
-from qibo.config import EINSUM_CHARS, log, raise_error
+from qibo.backends import PyTorchBackend, _check_backend, einsum_utils
+from qibo.config import log, raise_error
+from qibo.hamiltonians import _light_cone
 from qibo.hamiltonians.abstract import AbstractHamiltonian
 from qibo.symbols import Z
 
@@ -524,22 +525,28 @@ class SymbolicHamiltonian(AbstractHamiltonian):
 
     def _calculate_dense_from_terms(self) -> Hamiltonian:
         """Calculates equivalent Hamiltonian using the term representation."""
-        if 2 * self.nqubits > len(EINSUM_CHARS):  # pragma: no cover
-            # case not tested because it only happens in large examples
-            raise_error(NotImplementedError, "Not enough einsum characters.")
-
         matrix = 0
-        chars = EINSUM_CHARS[: 2 * self.nqubits]
         for term in self.terms:
             ntargets = len(term.target_qubits)
             tmat = np.reshape(term.matrix, 2 * ntargets * (2,))
-            n = self.nqubits - ntargets
-            emat = np.reshape(np.eye(2**n, dtype=tmat.dtype), 2 * n * (2,))
-            gen = lambda x: (chars[i + x] for i in term.target_qubits)
-            tc = "".join(chain(gen(0), gen(self.nqubits)))
-            ec = "".join(c for c in chars if c not in tc)
-            matrix += np.einsum(f"{tc},{ec}->{chars}", tmat, emat)
-        matrix = np.reshape(matrix, 2 * (2**self.nqubits,))
+            # qubits that the term does not act on are merged to identities
+            # acting on a single axis, so that the number of einsum indices
+            # does not depend on ``self.nqubits``
+            shape, targets, naxes = einsum_utils.merge_axes(
+                term.target_qubits, self.nqubits
+            )
+            rows, columns = list(range(naxes)), list(range(naxes, 2 * naxes))
+            operands = [
+                tmat,
+                [rows[i] for i in targets] + [columns[i] for i in targets],
+            ]
+            for axis, dim in enumerate(shape):
+                if axis not in targets:
+                    operands.extend(
+                        (np.eye(dim, dtype=tmat.dtype), [rows[axis], columns[axis]])
+                    )
+            tmat = np.einsum(*operands, rows + columns)
+            matrix += np.reshape(tmat, 2 * (2**self.nqubits,))
         return Hamiltonian(self.nqubits, matrix, backend=self.backend) + self.constant
 
     def calculate_dense(self):
@@ -550,6 +557,33 @@ class SymbolicHamiltonian(AbstractHamiltonian):
         return self._calculate_dense_from_terms()
 
     def expectation(self, state, normalize=False):
+        """Computes the real expectation value for a given state.
+
+        If ``state`` is a :class:`qibo.models.circuit.Circuit`, the expectation
+        value on its final state is calculated without simulating the full
+        circuit. Terms with nested support are grouped and each group is
+        evaluated on the reduced circuit returned by
+        :meth:`qibo.models.circuit.Circuit.light_cone`, which contains only the
+        gates that affect the group. Identical reduced circuits are simulated
+        once. This allows evaluating local Hamiltonians on shallow circuits
+        with many more qubits than can be simulated.
+
+        Args:
+            state (ndarray or :class:`qibo.models.circuit.Circuit`): state in
+                which to calculate the expectation value, or circuit that
+                prepares it from the zero state.
+            normalize (bool, optional): If ``True``, the expectation value
+                :math:`\\ell_{2}`-normalized. Defaults to ``False``.
+
+        Returns:
+            float: real number corresponding to the expectation value.
+        """
+        from qibo.models.circuit import (  # pylint: disable=import-outside-toplevel
+            Circuit,
+        )
+
+        if isinstance(state, Circuit):
+            return _light_cone.expectation(self, state, normalize)
         return Hamiltonian.expectation(self, state, normalize)
 
     def expectation_from_samples(self, freq, qubit_map=None):
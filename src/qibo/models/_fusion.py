@@ -0,0 +1,199 @@
+"""
+Cost-model gate fusion used by :meth:`qibo.models.circuit.Circuit.fuse`.
+
+Simulating a gate on a state vector requires a full pass over the state, so
+for large states the simulation time is dominated by the number of passes
+rather than by the number of arithmetic operations. The planner groups gates
+to blocks of at most ``max_qubits`` qubits and each block is applied as a
+single :class:`qibo.gates.FusedGate`, with one pass over the state.
+
+The cost of applying a block is estimated in units of one pass over the
+state. A dense block on ``k`` qubits costs ``1 + 2 ** k * FLOP_WEIGHT``,
+since small blocks are limited by memory traffic and larger blocks by the
+``2 ** k`` multiplications per amplitude. Blocks that contain only diagonal
+gates cost ``DIAGONAL_COST``. Gates are processed in order and each gate is
+merged to the block that reduces the total cost the most. A gate can be moved
+back to an earlier block if it commutes with all gates after that block,
+either because they act on different qubits, because they are both diagonal
+or according to :meth:`qibo.gates.abstract.Gate.commutes`.
+"""
+
+from dataclasses import dataclass
+
+from qibo import gates
+
+# cost of the arithmetic of a dense block relative to one pass over the state
+FLOP_WEIGHT = 1 / 24
+# cost of a block of diagonal gates relative to one pass over the state
+DIAGONAL_COST = 0.125
+# maximum number of qubits of a fused block
+MAX_QUBITS = 5
+# maximum number of blocks that a gate can be moved back
+MAX_LOOKBACK = 32
+
+DIAGONAL_GATES = (
+    gates.I,
+    gates.Z,
+    gates.S,
+    gates.SDG,
+    gates.T,
+    gates.TDG,
+    gates.RZ,
+    gates.U1,
+    gates.CZ,
+    gates.CRZ,
+    gates.CU1,
+    gates.RZZ,
+    gates.CCZ,
+)
+
+
+@dataclass
+class FusionReport:
+    """Summary of the fusion performed by :meth:`qibo.models.circuit.Circuit.fuse`.
+
+    Args:
+        gates (int): number of gates applied to the state before fusion.
+        blocks (int): number of gates applied to the state after fusion.
+        cost (float): estimated cost of the original circuit, in state passes.
+        fused_cost (float): estimated cost of the fused circuit, in state passes.
+    """
+
+    gates: int
+    blocks: int
+    cost: float
+    fused_cost: float
+
+    @property
+    def passes_saved(self):
+        """Number of passes over the state saved by the fusion."""
+        return self.gates - self.blocks
+
+    def __str__(self):
+        return (
+            f"Fused {self.gates} gates to {self.blocks} blocks, saving "
+            f"{self.passes_saved} passes over the state (estimated cost "
+            f"{self.cost:.2f} -> {self.fused_cost:.2f} passes)."
+        )
+
+
+def _fusable(gate):
+    if isinstance(gate, gates.FusedGate):
+        return True
+    return not isinstance(gate, (gates.SpecialGate, gates.M, gates.Channel))
+
+
+def _diagonal(gate):
+    if isinstance(gate, gates.FusedGate):
+        return all(isinstance(g, DIAGONAL_GATES) for g in gate.gates)
+    return isinstance(gate, DIAGONAL_GATES)
+
+
+def _commute(gate, other):
+    """Whether two gates certainly commute.
+
+    Special gates, such as callbacks, measurements and channels do not
+    commute with any gate. Gates with parameters are only moved past gates on
+    different qubits or past diagonal gates, because
+    :meth:`qibo.gates.abstract.Gate.commutes` does not compare parameters.
+    """
+    if not (_fusable(gate) and _fusable(other)):
+        return False
+    if not set(gate.qubits) & set(other.qubits):
+        return True
+    if _diagonal(gate) and _diagonal(other):
+        return True
+    if isinstance(gate, (gates.ParametrizedGate, gates.FusedGate)) or isinstance(
+        other, (gates.ParametrizedGate, gates.FusedGate)
+    ):
+        return False
+    return gate.commutes(other)
+
+
+def cost(nqubits, diagonal):
+    """Estimated cost of applying a block, in units of one pass over the state."""
+    if diagonal:
+        return DIAGONAL_COST
+    return 1 + 2**nqubits * FLOP_WEIGHT
+
+
+class _Block:
+    """Gates that are applied as a single fused gate."""
+
+    def __init__(self, gate):
+        self.gates = [gate]
+        self.qubits = set(gate.qubits)
+        self.fusable = _fusable(gate)
+        self.diagonal = _diagonal(gate)
+
+    @property
+    def cost(self):
+        return cost(len(self.qubits), self.diagonal)
+
+    def merged_cost(self, gate):
+        qubits = self.qubits | set(gate.qubits)
+        return cost(len(qubits), self.diagonal and _diagonal(gate))
+
+    def commutes(self, gate):
+        return all(_commute(gate, other) for other in self.gates)
+
+    def append(self, gate):
+        self.gates.append(gate)
+        self.qubits |= set(gate.qubits)
+        self.diagonal = self.diagonal and _diagonal(gate)
+
+
+def plan(queue, max_qubits):
+    """Groups the gates of ``queue`` to blocks of at most ``max_qubits`` qubits.
+
+    Returns:
+        (list, :class:`qibo.models._fusion.FusionReport`): the new queue, where
+        blocks of more than one gate are replaced by
+        :class:`qibo.gates.FusedGate`, and the fusion report.
+    """
+    blocks = []
+    for gate in queue:
+        best, gain = None, 0.0
+        if _fusable(gate):
+            gate_cost = _Block(gate).cost
+            for block in reversed(blocks[-MAX_LOOKBACK:]):
+                if block.fusable and len(block.qubits | set(gate.qubits)) <= max_qubits:
+                    block_gain = block.cost + gate_cost - block.merged_cost(gate)
+                    if best is None or block_gain > gain:
+                        best, gain = block, block_gain
+                # the gate can be moved before this block only if they commute
+                if not block.commutes(gate):
+                    break
+        if best is not None and gain > 0:
+            best.append(gate)
+        else:
+            blocks.append(_Block(gate))
+
+    new_queue = []
+    for block in blocks:
+        if len(block.gates) == 1:
+            new_queue.append(block.gates[0])
+        else:
+            fgate = gates.FusedGate(*sorted(block.qubits))
+            for gate in block.gates:
+                fgate.append(gate)
+            new_queue.append(fgate)
+
+    return new_queue, report(queue, new_queue)
+
+
+def report(queue, fused_queue):
+    """Creates the :class:`qibo.models._fusion.FusionReport` of a fusion.
+
+    Args:
+        queue (list): gates of the original circuit.
+        fused_queue (list): gates of the fused circuit.
+    """
+    applied = [gate for gate in queue if _fusable(gate)]
+    fused = [gate for gate in fused_queue if _fusable(gate)]
+    return FusionReport(
+        gates=len(applied),
+        blocks=len(fused),
+        cost=sum(_Block(gate).cost for gate in applied),
+        fused_cost=sum(_Block(gate).cost for gate in fused),
+    )
@@ -0,0 +1,94 @@
+"""
+Structural hashes used by :meth:`qibo.models.circuit.Circuit.content_hash`.
+
+Two circuits have the same hash if they have the same number of qubits, the
+same simulation mode and the same gates, in the same order, with the same
+qubits, parameters, measurement settings and noise. The hash does not depend
+on the identity of the gate objects or on the backend, so it identifies a
+circuit between different processes and sessions.
+"""
+
+import hashlib
+
+import numpy as np
+
+from qibo import gates
+from qibo.config import raise_error
+
+_SCALARS = (bool, str, type(None))
+
+
+def _update(hasher, value):
+    """Adds ``value`` to ``hasher`` together with a tag of its type."""
+    if isinstance(value, np.generic) or (
+        isinstance(value, np.ndarray) and not value.shape
+    ):
+        value = value.item()
+    if isinstance(value, gates.Gate):
+        _update_gate(hasher, value)
+    elif isinstance(value, (int, float, complex)) and not isinstance(value, bool):
+        # the same number has the same hash for all numeric types
+        hasher.update(f"number:{complex(value)!r};".encode())
+    elif isinstance(value, _SCALARS):
+        hasher.update(f"{type(value).__name__}:{value!r};".encode())
+    elif isinstance(value, type):
+        hasher.update(f"type:{value.__module__}.{value.__qualname__};".encode())
+    elif isinstance(value, (list, tuple)):
+        hasher.update(f"seq:{len(value)}(".encode())
+        for item in value:
+            _update(hasher, item)
+        hasher.update(b")")
+    elif isinstance(value, dict):
+        hasher.update(f"dict:{len(value)}(".encode())
+        for key in sorted(value, key=repr):
+            _update(hasher, key)
+            _update(hasher, value[key])
+        hasher.update(b")")
+    elif hasattr(value, "__array__") or hasattr(value, "detach"):
+        if hasattr(value, "detach"):
+            # tensors that may require gradients
+            value = value.detach().cpu()
+        hasher.update(array_hash(np.asarray(value)).encode())
+    else:
+        raise_error(
+            TypeError, f"Cannot calculate the hash of {type(value).__name__} objects."
+        )
+
+
+def _update_gate(hasher, gate):
+    hasher.update(f"gate:{type(gate).__qualname__}(".encode())
+    _update(hasher, gate.target_qubits)
+    _update(hasher, gate.control_qubits)
+    init_args, init_kwargs = gate.init_args, gate.init_kwargs
+    if isinstance(gate, gates.ParametrizedGate):
+        # the initial parameters are stale after ``set_parameters``, so only
+        # the current ``gate.parameters`` are hashed
+        names = gate.parameter_names
+        names = {names} if isinstance(names, str) else set(names)
+        init_kwargs = {k: v for k, v in init_kwargs.items() if k not in names}
+        if isinstance(gate, gates.Unitary):
+            init_args = init_args[1:]
+    _update(hasher, init_args)
+    _update(hasher, init_kwargs)
+    _update(hasher, gate.parameters)
+    if isinstance(gate, (gates.FusedGate, gates.Channel)):
+        _update(hasher, gate.gates)
+    hasher.update(b")")
+
+
+def array_hash(array):
+    """Hash of the dtype, shape and values of a numpy array."""
+    array = np.ascontiguousarray(array)
+    hasher = hashlib.sha256(f"array:{array.dtype.str}{array.shape};".encode())
+    hasher.update(array.data)
+    return hasher.hexdigest()
+
+
+def circuit_hash(circuit):
+    """Structural hash of ``circuit`` as a hexadecimal string."""
+    hasher = hashlib.sha256()
+    _update(hasher, circuit.nqubits)
+    _update(hasher, circuit.density_matrix)
+    _update(hasher, circuit.accelerators)
+    _update(hasher, list(circuit.queue))
+    return hasher.hexdigest()
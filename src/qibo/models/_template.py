@@ -0,0 +1,150 @@
+"""
+Circuit templates returned by :meth:`qibo.models.circuit.Circuit.template`.
+
+A template freezes the structure of a parametrized circuit: the gates are
+compiled once to an :class:`qibo.backends._numpy_plan.ExecutionPlan` whose
+trainable gates are bound to a flat array of parameters given to every
+execution. Binding new parameters neither copies nor modifies the gates, so
+the same template can be executed for many parameters, also concurrently from
+several threads.
+"""
+
+import numpy as np
+
+from qibo import gates
+from qibo.config import raise_error
+
+
+def unsupported(circuit, backend):
+    """Reason why ``circuit`` cannot be frozen to a template on ``backend``.
+
+    Returns:
+        str: the reason, or ``None`` if the template is supported.
+    """
+    # pylint: disable=import-outside-toplevel
+    from qibo.backends.numpy import NumpyBackend
+
+    if not isinstance(backend, NumpyBackend) or not backend._uses_numpy_kernels():
+        return f"Circuit templates are not available for the {backend.name} backend."
+    if (
+        circuit.density_matrix
+        or circuit.repeated_execution
+        or circuit.accelerators
+        or any(
+            isinstance(gate, (gates.CallbackGate, gates.Channel))
+            for gate in circuit.queue
+        )
+    ):
+        return (
+            "Circuit templates are only available for state vector circuits "
+            + "without collapsing measurements, channels and callbacks."
+        )
+    if not set(circuit.trainable_gates).issubset(circuit.queue):
+        return (
+            "Circuit templates are not available for trainable gates that are "
+            + "not in the circuit queue, for example fused gates."
+        )
+    for gate in circuit.trainable_gates:
+        if isinstance(gate, gates.GeneralizedfSim):
+            return "Circuit templates are not available for GeneralizedfSim gates."
+    return None
+
+
+class CircuitTemplate:
+    """Read-only parametrized circuit executed for parameters given at execution.
+
+    Args:
+        circuit (:class:`qibo.models.circuit.Circuit`): circuit to freeze.
+            Later changes of ``circuit`` and of its gates do not affect the
+            template, except for the values of the trainable parameters which
+            are always given to :meth:`execute`.
+        backend (:class:`qibo.backends.numpy.NumpyBackend`): backend used for
+            the execution.
+    """
+
+    def __init__(self, circuit, backend):
+        reason = unsupported(circuit, backend)
+        if reason is not None:
+            raise_error(NotImplementedError, reason)
+        from qibo.backends._numpy_plan import (  # pylint: disable=C0415
+            ExecutionPlan,
+        )
+
+        self.backend = backend
+        self.nqubits = circuit.nqubits
+        self.measurements = tuple(circuit.measurements)
+        self.nparams = circuit.trainable_gates.nparams
+        queue = [gate for gate in circuit.queue if not isinstance(gate, gates.M)]
+        self._plan = ExecutionPlan(backend, circuit, queue, bind=True)
+
+    def _parameters(self, parameters):
+        parameters = np.asarray(self.backend.to_numpy(parameters))
+        if parameters.ndim not in (1, 2) or parameters.shape[-1] != self.nparams:
+            raise_error(
+                ValueError,
+                f"Given parameters have shape {parameters.shape} instead of "
+                + f"the expected ({self.nparams},) or (M, {self.nparams}).",
+            )
+        return parameters
+
+    def execute(self, parameters, initial_state=None, nshots=1000):
+        """Executes the template for the given parameters.
+
+        Args:
+            parameters (ndarray): flat array with the parameters of the
+                trainable gates, in the order of
+                :meth:`qibo.models.circuit.Circuit.set_parameters`, or array of
+                shape ``(M, nparams)`` to execute ``M`` sets of parameters at once.
+            initial_state (ndarray, optional): initial state vector, or a batch
+                of ``M`` state vectors. If ``None``, the zero state is used.
+            nshots (int, optional): number of shots of circuits with
+                measurements. Defaults to ``1000``.
+
+        Returns:
+            :class:`qibo.result.QuantumState` or :class:`qibo.result.CircuitResult`,
+            or :class:`qibo.result.QuantumStateBatch` if a batch of parameters
+            is given.
+        """
+        # pylint: disable=import-outside-toplevel
+        from qibo.result import CircuitResult, QuantumState, QuantumStateBatch
+
+        backend = self.backend
+        parameters = self._parameters(parameters)
+        batch = parameters.shape[:-1]
+        if batch and self.measurements:
+            raise_error(
+                NotImplementedError,
+                "Batches of parameters are not available for circuits with measurements.",
+            )
+        shape = batch + (2**self.nqubits,)
+        if initial_state is None:
+            state = np.zeros(shape, dtype=backend.dtype)
+            state[..., 0] = 1
+        else:
+            initial_state = backend.cast(initial_state)
+            if tuple(initial_state.shape) not in (shape, shape[-1:]):
+                raise_error(
+                    ValueError,
+                    f"Given initial state has shape {initial_state.shape} instead "
+                    + f"of the expected {shape}.",
+                )
+            # copy, because gates are applied in place
+            state = np.array(
+                np.broadcast_to(initial_state, shape), dtype=backend.dtype, order="C"
+            )
+        state = self._plan.apply(state, parameters)
+
+        if batch:
+            return QuantumStateBatch(state, backend=backend)
+        if self.measurements:
+            # every result samples its own measurements
+            measurements = [
+                gate.__class__(*gate.init_args, **gate.init_kwargs)
+                for gate in self.measurements
+            ]
+            return CircuitResult(state, measurements, backend=backend, nshots=nshots)
+        return QuantumState(state, backend=backend)
+
+    def __call__(self, parameters, initial_state=None, nshots=1000):
+        """Equivalent to :meth:`execute`."""
+        return self.execute(parameters, initial_state, nshots)
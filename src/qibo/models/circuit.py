@@ -9,6 +9,7 @@ import qibo
 from qibo import gates
 from qibo.config import raise_error
 from qibo.gates.abstract import Gate
+from qibo.models import _fusion, _hashing, _template
 from qibo.models._openqasm import QASMParser
 
 NoiseMapType = Union[Tuple[int, int, int], Dict[int, Tuple[int, int, int]]]
@@ -185,6 +186,8 @@ class Circuit:
 
         self._final_state = None
         self.compiled = None
+        # summary of the fusion that created this circuit
+        self.fusion_report = None
 
         self.has_collapse = False
         self.has_unitary_channel = False
@@ -959,17 +962,25 @@ class Circuit:
         logs.extend(f"{g}: {n}" for g, n in common_gates)
         return "\n".join(logs)
 
-    def fuse(self, max_qubits=2):
+    def fuse(self, max_qubits=2, planner="greedy"):
         """Creates an equivalent circuit by fusing gates for increased
         simulation performance.
 
         Args:
             max_qubits (int): Maximum number of qubits in the fused gates.
+            planner (str): Fusion algorithm. ``"greedy"`` fuses neighboring
+                gates in the order they were added. ``"cost"`` estimates the
+                cost of applying each candidate block, reorders commuting
+                gates to enlarge the blocks and returns the greedy fusion
+                only if it is estimated to be cheaper. The ``"cost"`` planner
+                supports ``max_qubits`` up to 5. Defaults to ``"greedy"``.
 
         Returns:
             A :class:`qibo.core.circuit.Circuit` object containing
             :class:`qibo.gates.FusedGate` gates, each of which
             corresponds to a group of some original gates.
+            The ``fusion_report`` attribute of the returned circuit reports
+            the number of passes over the state saved by the fusion.
             For more details on the fusion algorithm we refer to the
             :ref:`Circuit fusion <circuit-fusion>` section.
 
@@ -991,6 +1002,17 @@ class Circuit:
                 NotImplementedError,
                 "Fusion is not implemented for distributed circuits.",
             )
+        if planner not in ("greedy", "cost"):
+            raise_error(ValueError, f"Unknown fusion planner {planner}.")
+
+        if planner == "cost" and (
+            not isinstance(max_qubits, int) or not 1 <= max_qubits <= _fusion.MAX_QUBITS
+        ):
+            raise_error(
+                ValueError,
+                "Cost fusion supports ``max_qubits`` between 1 and "
+                + f"{_fusion.MAX_QUBITS}, but is {max_qubits}.",
+            )
 
         queue = self.queue.to_fused()
         for gate in queue:
@@ -1004,32 +1026,77 @@ class Circuit:
                     neighbor = gate.left_neighbors.get(q)
                     if gate.can_fuse(neighbor, max_qubits):
                         neighbor.fuse(gate)
+        queue = queue.from_fused()
+        report = _fusion.report(self.queue, queue)
+
+        if planner == "cost":
+            fused, cost_report = _fusion.plan(self.queue, max_qubits)
+            # the greedy fusion is kept when it is estimated to be cheaper
+            if cost_report.fused_cost < report.fused_cost:
+                queue = _Queue(self.nqubits)
+                queue.extend(fused)
+                report = cost_report
         # create a circuit and assign the new queue
         circuit = self._shallow_copy()
-        circuit.queue = queue.from_fused()
+        circuit.queue = queue
+        circuit.fusion_report = report
         return circuit
 
-    def unitary(self, backend=None):
+    def unitary(self, backend=None, block_size=None, out=None, callback=None):
         """Creates the unitary matrix corresponding to all circuit gates.
 
         This is a :math:`2^{n} \\times 2^{n}`` matrix obtained by
         multiplying all circuit gates, where :math:`n` is ``nqubits``.
+
+        The numpy backend builds the matrix by applying the gates to blocks of
+        basis states, one block of columns at a time, so that large unitaries
+        can be streamed to ``out`` or ``callback`` without holding
+        intermediate matrices in memory.
+
+        Args:
+            backend (:class:`qibo.backends.abstract.Backend`, optional): backend
+                used to build the matrix. If ``None``, the current backend is
+                used. Defaults to ``None``.
+            block_size (int, optional): number of columns computed at once.
+                If ``None``, it is chosen by the backend. Defaults to ``None``.
+            out (ndarray, optional): array of shape :math:`(2^{n}, 2^{n})`, for
+                example a :class:`numpy.memmap`, where the matrix is written.
+                Defaults to ``None``.
+            callback (Callable, optional): function called as
+                ``callback(start, block)`` for every block of columns, where
+                ``block`` holds the columns from ``start`` to
+                ``start + block.shape[1]``. The block may be overwritten after
+                the callback returns. Defaults to ``None``.
+
+        Returns:
+            ndarray: the unitary matrix, written to ``out`` if it is given.
+            If only ``callback`` is given the matrix is not assembled and
+            ``None`` is returned.
         """
 
         from qibo.backends import _check_backend
 
         backend = _check_backend(backend)
 
-        fgate = gates.FusedGate(*range(self.nqubits))
         for gate in self.queue:
             if isinstance(gate, gates.Channel):
                 raise_error(
                     NotImplementedError,
                     "`unitary` method not implemented for circuits that contain noise channels.",
                 )
-            elif not isinstance(gate, (gates.SpecialGate, gates.M)):
-                fgate.append(gate)
-        return fgate.matrix(backend)
+        if block_size is not None and (
+            not isinstance(block_size, int) or block_size < 1
+        ):
+            raise_error(
+                ValueError, f"Block size must be a positive integer, not {block_size}."
+            )
+        shape = 2 * (2**self.nqubits,)
+        if out is not None and tuple(out.shape) != shape:
+            raise_error(
+                ValueError,
+                f"Output array has shape {tuple(out.shape)} instead of {shape}.",
+            )
+        return backend.circuit_unitary(self, block_size, out, callback)
 
     @property
     def final_state(self):
@@ -1066,19 +1133,86 @@ class Circuit:
 
         backend = _check_backend(backend)
 
-        from qibo.result import CircuitResult, QuantumState
+        from qibo.result import CircuitResult, QuantumState, QuantumStateBatch
+
+        def result(state, nshots):
+            if self.measurements:
+                return CircuitResult(state, self.measurements, backend, nshots=nshots)
+            if not self.density_matrix and len(state.shape) == 2:
+                # final states of a batch of initial states
+                return QuantumStateBatch(state, backend)
+            return QuantumState(state, backend)
 
-        executor = lambda state, nshots: backend.execute_circuit(
-            self, state, nshots
-        ).state()
         self.compiled = type("CompiledExecutor", (), {})()
-        self.compiled.executor = backend.compile(executor)
-        if self.measurements:
-            self.compiled.result = lambda state, nshots: CircuitResult(
-                state, self.measurements, backend, nshots=nshots
-            )
-        else:
-            self.compiled.result = lambda state, nshots: QuantumState(state, backend)
+        self.compiled.executor = backend.compile_circuit(self)
+        self.compiled.result = result
+
+    def template(self, backend=None):
+        """Freezes the circuit to a template executed for given parameters.
+
+        The gates are compiled once and the trainable gates are bound to a
+        flat array of parameters passed to every execution, in the order of
+        :meth:`qibo.models.circuit.Circuit.set_parameters`. Executing the
+        template neither copies nor modifies the gates, so it can be used for
+        many parameters, also concurrently from different threads. Templates
+        are available for state vector circuits without collapsing
+        measurements, channels and callbacks on the numpy backend.
+
+        Example:
+            .. testcode::
+
+                import numpy as np
+                from qibo import Circuit, gates
+                from qibo.backends import NumpyBackend
+
+                circuit = Circuit(2)
+                circuit.add(gates.RY(0, theta=0))
+                circuit.add(gates.CNOT(0, 1))
+                circuit.add(gates.RX(1, theta=0))
+                template = circuit.template(NumpyBackend())
+                # single set of parameters
+                result = template([0.1, 0.2])
+                # three sets of parameters executed as a batch
+                results = template(np.random.random((3, 2)))
+
+        Args:
+            backend (:class:`qibo.backends.numpy.NumpyBackend`, optional):
+                backend used for the execution. If ``None``, the global backend
+                is used. Defaults to ``None``.
+
+        Returns:
+            :class:`qibo.models._template.CircuitTemplate`: the template.
+        """
+        from qibo.backends import _check_backend
+
+        return _template.CircuitTemplate(self, _check_backend(backend))
+
+    def content_hash(self):
+        """Structural hash of the circuit.
+
+        Two circuits have the same hash if they have the same number of
+        qubits, simulation mode and gates, in the same order, with the same
+        qubits, parameters, measurement settings and noise. Unlike the default
+        ``hash`` of Python objects, it does not depend on the identity of the
+        gates, so it identifies the circuit also between different sessions.
+        It is used as the key of the result cache enabled with
+        :meth:`qibo.backends.numpy.NumpyBackend.set_result_cache`.
+
+        Example:
+            .. testcode::
+
+                from qibo import Circuit, gates
+
+                circuit1 = Circuit(2)
+                circuit1.add(gates.RX(0, theta=0.1))
+                circuit2 = Circuit(2)
+                circuit2.add(gates.RX(0, theta=0.1))
+                assert circuit1.content_hash() == circuit2.content_hash()
+
+        Returns:
+            str: the hexadecimal SHA-256 hash.
+        """
+        return _hashing.circuit_hash(self)
 
     def execute(self, initial_state=None, nshots=1000):
         """Executes the circuit. Exact implementation depends on the backend.
@@ -1087,12 +1221,15 @@ class Circuit:
             initial_state (`np.ndarray` or :class:`qibo.models.circuit.Circuit`):
                 Initial configuration. It can be specified by the setting the state
                 vector using an array or a circuit. If ``None``, the initial state
-                is ``|000..00>``.
+                is ``|000..00>``. For circuits with ``density_matrix=False``, an
+                array of shape ``(batch, 2 ** nqubits)`` executes the circuit on
+                every state of the batch at once.
             nshots (int): Number of shots.
 
         Returns:
             either a ``qibo.result.QuantumState``, ``qibo.result.MeasurementOutcomes``
-            or ``qibo.result.CircuitResult`` depending on the circuit's configuration.
+            or ``qibo.result.CircuitResult`` depending on the circuit's configuration,
+            or a ``qibo.result.QuantumStateBatch`` for a batch of initial states.
         """
         if self.compiled:
             # pylint: disable=E1101
@@ -4,13 +4,22 @@ Resources for parallel circuit evaluation.
 
 from typing import Iterable
 
+import numpy as np
 from joblib import Parallel, delayed
 
-from qibo.backends import _check_backend
+from qibo.backends import _check_backend, _process_pool
 from qibo.config import raise_error
+from qibo.models import _template
 
+MODES = ("threads", "processes")
 
-def parallel_execution(circuit, states, processes=None, backend=None):
+
+def _check_mode(mode):
+    if mode not in MODES:
+        raise_error(ValueError, f"Unknown mode {mode}, use one of {MODES}.")
+
+
+def parallel_execution(circuit, states, processes=None, backend=None, mode="threads"):
     """Execute circuit for multiple states.
 
     Example:
@@ -35,15 +44,27 @@ def parallel_execution(circuit, states, processes=None, backend=None):
         circuit (qibo.models.Circuit): the input circuit.
         states (list): list of states for the circuit evaluation.
         processes (int): number of processes for parallel evaluation.
+        mode (str): ``"threads"`` to execute the circuits in threads of the
+            current process or ``"processes"`` to execute them in a pool of
+            persistent worker processes, which hold their own backend and
+            exchange the states through shared memory. The process pool scales
+            better for small and medium circuits, but it does not support
+            callbacks, collapsing measurements, noise in state vector
+            simulation and distributed circuits. Default is ``"threads"``.
 
     Returns:
         Circuit evaluation for input states.
     """
     backend = _check_backend(backend)
+    _check_mode(mode)
 
     if states is None or not isinstance(states, list):  # pragma: no cover
         raise_error(TypeError, "states must be a list.")
 
+    if mode == "processes":
+        jobs = [(circuit, None, state) for state in states]
+        return _process_pool.execute(backend, jobs, processes=processes)
+
     def operation(state, circuit):
         backend.set_threads(backend.nthreads)
         return backend.execute_circuit(circuit, state)
@@ -56,7 +77,7 @@ def parallel_execution(circuit, states, processes=None, backend=None):
 
 
 def parallel_circuits_execution(
-    circuits, states=None, nshots=1000, processes=None, backend=None
+    circuits, states=None, nshots=1000, processes=None, backend=None, mode="threads"
 ):
     """Execute multiple circuits
 
@@ -83,11 +104,19 @@ def parallel_circuits_execution(
             If not given the default initial state on all circuits.
         nshots (int): Number of shots when performing measurements, same for all circuits.
         processes (int): number of processes for parallel evaluation.
+        mode (str): ``"threads"`` to execute the circuits in threads of the
+            current process or ``"processes"`` to execute them in a pool of
+            persistent worker processes, which hold their own backend and
+            exchange the states through shared memory. The process pool scales
+            better for small and medium circuits, but it does not support
+            callbacks, collapsing measurements, noise in state vector
+            simulation and distributed circuits. Default is ``"threads"``.
 
     Returns:
         Circuit evaluation for input states.
     """
     backend = _check_backend(backend)
+    _check_mode(mode)
 
     if not isinstance(circuits, Iterable):  # pragma: no cover
         raise_error(TypeError, "circuits must be iterable.")
@@ -101,6 +130,17 @@ def parallel_circuits_execution(
     elif states is not None and not isinstance(states, Iterable):
         raise_error(TypeError, "states must be iterable.")
 
+    if mode == "processes":
+        circuits = list(circuits)
+        if states is None or isinstance(states, backend.tensor_types):
+            jobs = [(circuit, None, states) for circuit in circuits]
+        else:
+            jobs = [(circuit, None, state) for circuit, state in zip(circuits, states)]
+        results = _process_pool.execute(backend, jobs, nshots, processes)
+        for circuit, result in zip(circuits, results):
+            circuit._final_state = result
+        return results
+
     def operation(circuit, state):
         backend.set_threads(backend.nthreads)
         return backend.execute_circuit(circuit, state, nshots)
@@ -119,7 +159,12 @@ def parallel_circuits_execution(
 
 
 def parallel_parametrized_execution(
-    circuit, parameters, initial_state=None, processes=None, backend=None
+    circuit,
+    parameters,
+    initial_state=None,
+    processes=None,
+    backend=None,
+    mode="threads",
 ):
     """Execute circuit for multiple parameters and fixed initial_state.
 
@@ -159,15 +204,40 @@ def parallel_parametrized_execution(
             for each circuit evaluation. If more threads are used for each circuit
             evaluation then some tuning may be required to obtain optimal performance.
             Default is ``None`` which corresponds to a single thread.
+        mode (str): ``"threads"`` to execute the circuits in threads of the
+            current process or ``"processes"`` to execute them in a pool of
+            persistent worker processes, which hold their own backend and
+            exchange the states through shared memory. The process pool scales
+            better for small and medium circuits, but it does not support
+            callbacks, collapsing measurements, noise in state vector
+            simulation and distributed circuits. Default is ``"threads"``.
 
     Returns:
         Circuit evaluation for input parameters.
     """
     backend = _check_backend(backend)
+    _check_mode(mode)
 
     if not isinstance(parameters, list):  # pragma: no cover
         raise_error(TypeError, "parameters must be a list.")
 
+    if mode == "processes":
+        # the workers bind the parameters to their own copy of the circuit
+        jobs = [(circuit, params, initial_state) for params in parameters]
+        return _process_pool.execute(backend, jobs, processes=processes)
+
+    template = _flat_template(circuit, parameters, backend)
+    if template is not None:
+        # the parameters are bound at execution, without copying the circuit
+
+        def bound_operation(params, state):
+            backend.set_threads(backend.nthreads)
+            return template.execute(params, state)
+
+        return Parallel(n_jobs=processes, prefer="threads")(
+            delayed(bound_operation)(param, initial_state) for param in parameters
+        )
+
     def operation(params, circuit, state):
         backend.set_threads(backend.nthreads)
         if state is not None:
@@ -181,3 +251,21 @@ def parallel_parametrized_execution(
     )
 
     return results
+
+
+def _flat_template(circuit, parameters, backend):
+    """Template of ``circuit`` if it is supported and all ``parameters`` are
+    flat arrays, otherwise ``None``."""
+    if _template.unsupported(circuit, backend) is not None:
+        return None
+    shape = (circuit.trainable_gates.nparams,)
+    for params in parameters:
+        if isinstance(params, dict):
+            return None
+        try:
+            if np.shape(backend.to_numpy(params)) != shape:
+                return None
+        except ValueError:
+            # parameters of different gates with different lengths
+            return None
+    return circuit.template(backend)
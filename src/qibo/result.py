@@ -1,24 +1,146 @@
 import collections
+import json
+import struct
+import time
 import warnings
+import zipfile
 from typing import Optional, Union
 
 import numpy as np
 
 from qibo import __version__, backends, gates
-from qibo.config import raise_error
+from qibo.config import get_batch_size, raise_error
 from qibo.measurements import apply_bitflips, frequencies_to_binary
 
+# version of the format of the files written by ``dump``
+RESULT_FORMAT = "qibo-result"
+RESULT_VERSION = 1
+# arrays larger than this number of bytes are memory-mapped when loaded
+MMAP_BYTES = 2**20
+_ARRAYS = ("state", "probabilities", "samples")
+# identifier of the extra field that pads the local headers of the members
+_PADDING_ID = 0xD935
+
+
+def _open_aligned(archive, name: str):
+    """Opens the member ``name`` for writing, padding its local header so that
+    the member, and hence the data of the ``.npy`` array after its aligned
+    header, starts on a multiple of ``np.lib.format.ARRAY_ALIGN`` bytes."""
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    # fixed local header, file name, ZIP64 sizes and header of the padding
+    offset = archive.start_dir + 30 + len(name.encode()) + 20 + 4
+    padding = -offset % np.lib.format.ARRAY_ALIGN
+    info.extra = struct.pack("<HH", _PADDING_ID, padding) + bytes(padding)
+    return archive.open(info, "w", force_zip64=True)
+
+
+def _dump(filename: str, payload: dict):
+    """Writes a payload of ``to_dict`` to an uncompressed ``.npz`` container.
+
+    The arrays are stored as ``.npy`` members and the other entries in a
+    ``manifest.json`` member, so that no object is pickled.
+    """
+    manifest = {"format": RESULT_FORMAT, "version": RESULT_VERSION}
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_STORED, allowZip64=True) as f:
+        for key, value in payload.items():
+            if key not in _ARRAYS:
+                manifest[key] = value
+            elif value is not None:
+                with _open_aligned(f, f"{key}.npy") as member:
+                    np.lib.format.write_array(
+                        member, np.asarray(value), allow_pickle=False
+                    )
+        f.writestr("manifest.json", json.dumps(manifest))
+
+
+def _load_array(filename: str, archive, name: str):
+    """Loads the ``.npy`` member ``name`` of an uncompressed container.
 
-def load_result(filename: str):
+    Large arrays are memory-mapped directly from the container, so that they
+    are read from disk only when they are accessed.
+    """
+    info = archive.getinfo(name)
+    read_header = None
+    if info.compress_type == zipfile.ZIP_STORED and info.file_size > MMAP_BYTES:
+        with open(filename, "rb") as f:
+            # the data follows the local header, whose extra field may differ
+            # from the one of the central directory
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(f)
+            read_header = {
+                (1, 0): np.lib.format.read_array_header_1_0,
+                (2, 0): np.lib.format.read_array_header_2_0,
+            }.get(version)
+            if read_header is not None:
+                shape, fortran_order, dtype = read_header(f)
+                offset = f.tell()
+                # containers of older versions may have unaligned members,
+                # which are not safe to use with BLAS routines
+                if offset % dtype.alignment:
+                    read_header = None
+    if read_header is None:
+        with archive.open(info) as member:
+            return np.lib.format.read_array(member, allow_pickle=False)
+    return np.memmap(
+        filename,
+        dtype=dtype,
+        mode="r",
+        offset=offset,
+        shape=shape,
+        order="F" if fortran_order else "C",
+    )
+
+
+def _load(filename: str, allow_pickle: bool = False):
+    """Reads the payload of a result saved to disk by ``dump``."""
+    if not zipfile.is_zipfile(filename):
+        # files written by qibo versions before the container format
+        if not allow_pickle:
+            raise_error(
+                ValueError,
+                f"{filename} is a pickled result of an older qibo version, "
+                + "load it with ``allow_pickle=True`` only if it is trusted.",
+            )
+        return np.load(filename, allow_pickle=True).item()
+    with zipfile.ZipFile(filename) as archive:
+        payload = json.loads(archive.read("manifest.json"))
+        version = payload.pop("version", None)
+        if (
+            payload.pop("format", None) != RESULT_FORMAT
+            or not isinstance(version, int)
+            or version > RESULT_VERSION
+        ):
+            raise_error(ValueError, f"{filename} is not a result of this qibo version.")
+        names = set(archive.namelist())
+        for key in _ARRAYS:
+            name = f"{key}.npy"
+            payload[key] = (
+                _load_array(filename, archive, name) if name in names else None
+            )
+    if payload["state"] is None:
+        payload.pop("state")
+    return payload
+
+
+def load_result(filename: str, allow_pickle: bool = False):
     """Loads the results of a circuit execution saved to disk.
 
+    Arrays larger than ``MMAP_BYTES`` are memory-mapped in read-only mode, so
+    that large states are loaded instantly and read from disk when accessed.
+
     Args:
         filename (str): Path to the file containing the results.
+        allow_pickle (bool, optional): If ``True``, files pickled by older
+            qibo versions are also loaded. Unpickling can execute arbitrary
+            code, therefore only trusted files should be loaded in this way.
+            Defaults to ``False``.
 
     Returns:
         :class:`qibo.result.QuantumState` or :class:`qibo.result.MeasurementOutcomes` or :class:`qibo.result.CircuitResult`: result of circuit execution saved to disk, depending on saved filed.
     """
-    payload = np.load(filename, allow_pickle=True).item()
+    payload = _load(filename, allow_pickle)
     return globals()[payload.pop("dtype")].from_dict(payload)
 
 
@@ -118,11 +240,18 @@ class QuantumState:
     def dump(self, filename: str):
         """Writes to file the ``QuantumState`` for future reloading.
 
+        The state is written as a ``.npy`` array in an uncompressed ``.npz``
+        container, together with a JSON manifest, without pickling.
+
         Args:
             filename (str): Path to the file to write to.
         """
-        with open(filename, "wb") as f:
-            np.save(f, self.to_dict())
+        payload = {
+            "state": self.backend.to_numpy(self._state),
+            "dtype": self.__class__.__name__,
+            "qibo": __version__,
+        }
+        _dump(filename, payload)
 
     @classmethod
     def from_dict(cls, payload: dict):
@@ -139,17 +268,90 @@ class QuantumState:
         return cls(payload.get("state"), backend=backend)
 
     @classmethod
-    def load(cls, filename: str):
+    def load(cls, filename: str, allow_pickle: bool = False):
         """Builds the ``QuantumState`` object stored in a file.
 
         Args:
             filename (str): Path to the file containing the ``QuantumState``.
+            allow_pickle (bool, optional): If ``True``, files pickled by older
+                qibo versions are also loaded. Defaults to ``False``.
 
         Returns:
             :class:`qibo.result.QuantumState`: Quantum state object.
         """
-        payload = np.load(filename, allow_pickle=True).item()
-        return cls.from_dict(payload)
+        return cls.from_dict(_load(filename, allow_pickle))
+
+
+class QuantumStateBatch(QuantumState):
+    """Data structure to represent the final states of a batched circuit execution.
+
+    Returned when a circuit is executed on a batch of initial state vectors,
+    given as an array of shape ``(batch, 2 ** nqubits)``. Indexing the batch
+    returns the :class:`qibo.result.QuantumState` of the corresponding state.
+
+    Args:
+        state (np.ndarray): Stacked state vectors of shape ``(batch, 2 ** nqubits)``.
+        backend (qibo.backends.AbstractBackend): Backend used for the calculations. If not provided the :class:`qibo.backends.GlobalBackend` is going to be used.
+    """
+
+    def __init__(self, state, backend=None):
+        from qibo.backends import _check_backend
+
+        self.backend = _check_backend(backend)
+        self.density_matrix = False
+        self.nqubits = int(np.log2(state.shape[1]))
+        self._state = state
+
+    def __len__(self):
+        return int(self._state.shape[0])
+
+    def __getitem__(self, index: int):
+        return QuantumState(self._state[index], backend=self.backend)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def symbolic(self, decimals: int = 5, cutoff: float = 1e-10, max_terms: int = 20):
+        """Dirac notation representation of each state of the batch, one per line.
+
+        Args:
+            decimals (int, optional): Number of decimals for the amplitudes.
+                Defaults to :math:`5`.
+            cutoff (float, optional): Amplitudes with absolute value smaller than the
+                cutoff are ignored from the representation. Defaults to  ``1e-10``.
+            max_terms (int, optional): Maximum number of terms to print. If a state
+                contains more terms they will be ignored. Defaults to :math:`20`.
+
+        Returns:
+            (str): A string representing the states in the computational basis.
+        """
+        return "\n".join(state.symbolic(decimals, cutoff, max_terms) for state in self)
+
+    def probabilities(self, qubits: Optional[Union[list, set]] = None):
+        """Calculates measurement probabilities of every state in the batch.
+
+        Args:
+            qubits (list or set, optional): Set of qubits that are measured.
+                If ``None``, ``qubits`` equates the total number of qubits.
+                Defauts to ``None``.
+        Returns:
+            (np.ndarray): Probabilities over the input qubits with shape
+            ``(batch, 2 ** len(qubits))``.
+        """
+        if qubits is None:
+            qubits = tuple(range(self.nqubits))
+
+        backend = self.backend
+        rtype = backend.np.real(self._state).dtype
+        probs = backend.np.abs(self._state) ** 2
+        probs = backend.np.reshape(probs, (len(self),) + self.nqubits * (2,))
+        unmeasured = tuple(1 + i for i in range(self.nqubits) if i not in qubits)
+        probs = backend.np.sum(backend.cast(probs, dtype=rtype), axis=unmeasured)
+        measured = sorted(qubits)
+        order = [0] + [1 + measured.index(q) for q in qubits]
+        probs = backend.np.transpose(probs, order)
+        return backend.np.reshape(probs, (len(self), 2 ** len(qubits)))
 
 
 class MeasurementOutcomes:
@@ -178,6 +380,8 @@ class MeasurementOutcomes:
 
         self._measurement_gate = None
         self._probs = probabilities
+        # function sampling shots from ``_probs``, see ``Backend.shot_sampler``
+        self._sampler = None
         self._samples = samples
         self._frequencies = None
         self._repeated_execution_frequencies = None
@@ -187,6 +391,10 @@ class MeasurementOutcomes:
                 indices = [self.measurement_gate.qubits.index(q) for q in m.qubits]
                 m.result.register_samples(samples[:, indices])
 
+    def __getstate__(self):
+        # the sampler is prepared again after unpickling
+        return dict(self.__dict__, _sampler=None)
+
     def frequencies(self, binary: bool = True, registers: bool = False):
         """Returns the frequencies of measured samples.
 
@@ -290,6 +498,7 @@ class MeasurementOutcomes:
             probs[state] = freq / self.nshots
         probs = self.backend.cast(probs)
         self._probs = probs
+        self._sampler = None
         return self.backend.calculate_probabilities(
             self.backend.np.sqrt(probs), qubits, nqubits
         )
@@ -340,17 +549,8 @@ class MeasurementOutcomes:
                     np.random.shuffle(samples)
                 else:
                     # generate new samples
-                    samples = self.backend.sample_shots(self._probs, self.nshots)
-                samples = self.backend.samples_to_binary(samples, len(qubits))
-                if self.measurement_gate.has_bitflip_noise():
-                    p0, p1 = self.measurement_gate.bitflip_map
-                    bitflip_probabilities = [
-                        [p0.get(q) for q in qubits],
-                        [p1.get(q) for q in qubits],
-                    ]
-                    samples = self.backend.apply_bitflips(
-                        samples, bitflip_probabilities
-                    )
+                    samples = self._sample_shots(self.nshots)
+                samples = self._binary_samples(samples)
                 # register samples to individual gate ``MeasurementResult``
                 qubit_map = {
                     q: i for i, q in enumerate(self.measurement_gate.target_qubits)
@@ -371,6 +571,133 @@ class MeasurementOutcomes:
 
         return self.backend.samples_to_decimal(self._samples, len(qubits))
 
+    def _sample_shots(self, nshots):
+        """Samples new shots from the stored probabilities.
+
+        The sampler of the backend is kept, so that the distribution is
+        prepared once for all the shots sampled from these outcomes.
+        """
+        if self._sampler is None:
+            self._sampler = self.backend.shot_sampler(self._probs)
+        return self._sampler(nshots)
+
+    def _binary_samples(self, samples):
+        """Converts decimal samples to binary form, applying the bitflip noise
+        of the measurements."""
+        qubits = self.measurement_gate.target_qubits
+        samples = self.backend.samples_to_binary(samples, len(qubits))
+        if self.measurement_gate.has_bitflip_noise():
+            p0, p1 = self.measurement_gate.bitflip_map
+            bitflip_probabilities = [
+                [p0.get(q) for q in qubits],
+                [p1.get(q) for q in qubits],
+            ]
+            samples = self.backend.apply_bitflips(samples, bitflip_probabilities)
+        return samples
+
+    def iter_samples(self, chunk_size: Optional[int] = None, binary: bool = True):
+        """Yields measurement samples in chunks, without holding all shots in memory.
+
+        If samples are not already available, each chunk is drawn lazily from
+        the stored probabilities, therefore the shots are not stored and
+        every iteration yields new shots.
+
+        Args:
+            chunk_size (int, optional): maximum number of shots in each chunk.
+                If ``None``, the shot batch size of :func:`qibo.get_batch_size`
+                is used. Defaults to ``None``.
+            binary (bool, optional): Return samples in binary or decimal form.
+                Defaults to ``True``.
+
+        Yields:
+            Samples of at most ``chunk_size`` shots, in the form returned by
+            :meth:`qibo.result.MeasurementOutcomes.samples`.
+        """
+        if chunk_size is None:
+            chunk_size = get_batch_size()
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise_error(
+                ValueError, f"Chunk size must be a positive integer, not {chunk_size}."
+            )
+
+        if self.has_samples() or self._probs is None:
+            samples = self.samples(binary)
+            for start in range(0, len(samples), chunk_size):
+                yield samples[start : start + chunk_size]
+            return
+
+        nqubits = len(self.measurement_gate.target_qubits)
+        for start in range(0, self.nshots, chunk_size):
+            nshots = min(chunk_size, self.nshots - start)
+            samples = self._sample_shots(nshots)
+            if binary or self.measurement_gate.has_bitflip_noise():
+                samples = self._binary_samples(samples)
+                if not binary:
+                    samples = self.backend.samples_to_decimal(samples, nqubits)
+            yield samples
+
+    def stream_frequencies(self, chunk_size: Optional[int] = None, binary: bool = True):
+        """Frequencies of shots drawn with :meth:`qibo.result.MeasurementOutcomes.iter_samples`.
+
+        Only the frequencies of the outcomes that appear are stored, so that
+        the memory does not scale with the number of shots or the number of
+        possible outcomes.
+
+        Args:
+            chunk_size (int, optional): maximum number of shots sampled at once.
+            binary (bool, optional): If ``True``, returns frequency keys in binary
+                form, otherwise in decimal form. Defaults to ``True``.
+
+        Returns:
+            :class:`collections.Counter`: frequencies of the observed outcomes.
+        """
+        frequencies = collections.Counter()
+        for samples in self.iter_samples(chunk_size, binary=False):
+            frequencies.update(self.backend.calculate_frequencies(samples))
+        if binary:
+            return frequencies_to_binary(frequencies, len(self.measurement_gate.qubits))
+        return frequencies
+
+    def stream_marginals(self, chunk_size: Optional[int] = None):
+        """Probability of each measured qubit to be found in :math:`1`, estimated
+        from shots drawn with :meth:`qibo.result.MeasurementOutcomes.iter_samples`.
+
+        Args:
+            chunk_size (int, optional): maximum number of shots sampled at once.
+
+        Returns:
+            (ndarray): the estimated probability of each measured qubit.
+        """
+        ones, nshots = 0, 0
+        for samples in self.iter_samples(chunk_size):
+            ones = ones + self.backend.np.sum(samples, axis=0)
+            nshots += len(samples)
+        return ones / nshots
+
+    def stream_expectation(self, observable, chunk_size: Optional[int] = None):
+        """Expectation value of a diagonal observable from shots drawn with
+        :meth:`qibo.result.MeasurementOutcomes.iter_samples`.
+
+        Args:
+            observable (Hamiltonian/SymbolicHamiltonian): diagonal observable in the
+                computational basis.
+            chunk_size (int, optional): maximum number of shots sampled at once.
+
+        Returns:
+            (float): expectation value from samples.
+        """
+        qubit_map = self.measurement_gate.qubits
+        expval, nshots = 0, 0
+        for samples in self.iter_samples(chunk_size, binary=False):
+            freq = frequencies_to_binary(
+                self.backend.calculate_frequencies(samples), len(qubit_map)
+            )
+            expval += observable.expectation_from_samples(freq, qubit_map) * len(
+                samples
+            )
+            nshots += len(samples)
+        return expval / nshots
+
     @property
     def measurement_gate(self):
         """Single measurement gate containing all measured qubits.
@@ -426,11 +753,30 @@ class MeasurementOutcomes:
     def dump(self, filename: str):
         """Writes to file the :class:`qibo.result.MeasurementOutcomes` for future reloading.
 
+        The state, probabilities and samples are written as ``.npy`` arrays
+        in an uncompressed ``.npz`` container, together with a JSON manifest
+        of the measurements, without pickling.
+
         Args:
             filename (str): Path to the file to write to.
         """
-        with open(filename, "wb") as f:
-            np.save(f, self.to_dict())
+        payload = MeasurementOutcomes.to_dict(self)
+        payload["dtype"] = self.__class__.__name__
+        measurements = []
+        for gate in payload["measurements"]:
+            # the samples of the gates are rebuilt from the stored samples
+            gate = json.loads(gate)
+            gate["measurement_result"] = {"samples": None}
+            measurements.append(json.dumps(gate))
+        payload["measurements"] = measurements
+        for key in _ARRAYS:
+            if payload.get(key) is not None:
+                payload[key] = self.backend.to_numpy(payload[key])
+        if payload["samples"] is None and self.has_samples():
+            payload["samples"] = self.backend.to_numpy(self.samples())
+        if isinstance(self, QuantumState):
+            payload["state"] = self.backend.to_numpy(self._state)
+        _dump(filename, payload)
 
     @classmethod
     def from_dict(cls, payload: dict):
@@ -460,17 +806,18 @@ class MeasurementOutcomes:
         )
 
     @classmethod
-    def load(cls, filename: str):
+    def load(cls, filename: str, allow_pickle: bool = False):
         """Builds the :class:`qibo.result.MeasurementOutcomes` object stored in a file.
 
         Args:
             filename (str): Path to the file containing the :class:`qibo.result.MeasurementOutcomes`.
+            allow_pickle (bool, optional): If ``True``, files pickled by older
+                qibo versions are also loaded. Defaults to ``False``.
 
         Returns:
             A :class:`qibo.result.MeasurementOutcomes` object.
         """
-        payload = np.load(filename, allow_pickle=True).item()
-        return cls.from_dict(payload)
+        return cls.from_dict(_load(filename, allow_pickle))
 
 
 class CircuitResult(QuantumState, MeasurementOutcomes):
@@ -509,6 +856,14 @@ class CircuitResult(QuantumState, MeasurementOutcomes):
             return MeasurementOutcomes.probabilities(self, qubits)
         return QuantumState.probabilities(self, qubits)
 
+    def dump(self, filename: str):
+        """Writes to file the ``CircuitResult`` for future reloading.
+
+        Args:
+            filename (str): Path to the file to write to.
+        """
+        MeasurementOutcomes.dump(self, filename)
+
     def to_dict(self):
         """Returns a dictonary containinig all the information needed to rebuild the ``CircuitResult``."""
         args = MeasurementOutcomes.to_dict(self)
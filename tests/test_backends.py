@@ -1,11 +1,16 @@
+import asyncio
+import collections
+import concurrent.futures
 import platform
 import sys
+import threading
 
 import numpy as np
 import pytest
 
-from qibo import construct_backend, gates, list_available_backends, set_backend
-from qibo.backends import MetaBackend
+from qibo import Circuit, construct_backend, gates, list_available_backends, set_backend
+from qibo.backends import MetaBackend, NumpyBackend, _numpy_kernels, einsum_utils
+from qibo.quantum_info import random_density_matrix, random_statevector, random_unitary
 
 ####################### Test `matrix` #######################
 GATES = [
@@ -96,6 +101,374 @@ def test_plus_density_matrix(backend):
     backend.assert_allclose(matrix, target_matrix)
 
 
+@pytest.mark.parametrize("chunk_size", [4, 2**18])
+@pytest.mark.parametrize(
+    "gate",
+    [
+        gates.H(2),
+        gates.RY(4, theta=0.123),
+        gates.CNOT(3, 1),
+        gates.CZ(0, 1),
+        gates.SWAP(0, 4),
+        gates.fSim(4, 1, theta=0.1, phi=0.2),
+    ],
+)
+def test_apply_gate_inplace(backend, gate, chunk_size, monkeypatch):
+    monkeypatch.setattr(_numpy_kernels, "CHUNK_SIZE", chunk_size)
+    nqubits = 5
+    circuit = Circuit(nqubits)
+    circuit.add(gate)
+    state = random_statevector(2**nqubits, seed=10, backend=backend)
+    target_state = circuit.unitary(backend) @ state
+    final_state = backend.apply_gate(gate, backend.np.copy(state), nqubits)
+    backend.assert_allclose(final_state, target_state)
+
+
+@pytest.mark.parametrize("max_qubits", [2, 10])
+def test_execute_circuit_diagonal_gates(backend, max_qubits, monkeypatch):
+    monkeypatch.setattr(_numpy_kernels, "MAX_DIAGONAL_QUBITS", max_qubits)
+    nqubits = 4
+    circuit = Circuit(nqubits)
+    circuit.add(gates.H(q) for q in range(nqubits))
+    circuit.add([gates.Z(0), gates.S(1), gates.T(2), gates.RZ(3, theta=0.1)])
+    circuit.add([gates.U1(0, theta=0.2), gates.CZ(3, 1), gates.CU1(2, 0, theta=0.3)])
+    circuit.add([gates.CRZ(1, 3, theta=0.4), gates.RZZ(2, 1, theta=0.5)])
+    circuit.add(gates.CCZ(0, 1, 3))
+    circuit.add(gates.RX(q, theta=0.6) for q in range(nqubits))
+    circuit.add(gates.RZZ(q, (q + 1) % nqubits, theta=0.7) for q in range(nqubits))
+    initial_state = random_statevector(2**nqubits, seed=10, backend=backend)
+    target_state = circuit.unitary(backend) @ initial_state
+    final_state = backend.execute_circuit(circuit, backend.np.copy(initial_state))
+    backend.assert_allclose(final_state, target_state, atol=1e-10)
+
+
+@pytest.mark.parametrize("density_matrix", [False, True])
+@pytest.mark.parametrize("chunk_size", [4, 2**18])
+def test_apply_controlled_by_gates(backend, density_matrix, chunk_size, monkeypatch):
+    monkeypatch.setattr(_numpy_kernels, "CHUNK_SIZE", chunk_size)
+    nqubits = 5
+    circuit = Circuit(nqubits, density_matrix=density_matrix)
+    circuit.add(gates.H(q) for q in range(nqubits))
+    circuit.add(gates.RX(3, theta=0.1).controlled_by(0, 4))
+    circuit.add(gates.Z(1).controlled_by(2))
+    circuit.add(gates.U1(0, theta=0.2).controlled_by(3, 1, 2))
+    circuit.add(gates.SWAP(4, 1).controlled_by(0))
+    circuit.add(gates.fSim(2, 0, theta=0.3, phi=0.4).controlled_by(3))
+    matrix = random_unitary(2**3, seed=10, backend=backend)
+    circuit.add(gates.Unitary(matrix, 0, 2, 1).controlled_by(4))
+    circuit.add(gates.RY(q, theta=0.5) for q in range(nqubits))
+    if density_matrix:
+        initial_state = random_density_matrix(2**nqubits, seed=10, backend=backend)
+    else:
+        initial_state = random_statevector(2**nqubits, seed=10, backend=backend)
+    unitary = circuit.unitary(backend)
+    target_state = unitary @ initial_state
+    if density_matrix:
+        target_state = target_state @ backend.np.conj(unitary).T
+    final_state = backend.execute_circuit(circuit, initial_state)
+    backend.assert_allclose(final_state, target_state, atol=1e-10)
+
+
+@pytest.mark.parametrize("nthreads", [2, 3])
+def test_execute_circuit_threads(backend, nthreads, monkeypatch):
+    monkeypatch.setattr(_numpy_kernels, "MIN_THREAD_CHUNK_SIZE", 2)
+    nqubits = 6
+    circuit = Circuit(nqubits)
+    circuit.add(gates.H(q) for q in range(nqubits))
+    circuit.add([gates.CNOT(0, 5), gates.RX(4, theta=0.1), gates.CZ(5, 2)])
+    circuit.add([gates.SWAP(1, 3).controlled_by(0), gates.T(3), gates.CCZ(0, 4, 5)])
+    circuit.add(gates.Unitary(random_unitary(8, seed=10, backend=backend), 5, 2, 4))
+    initial_state = random_statevector(2**nqubits, seed=10, backend=backend)
+    target_state = circuit.unitary(backend) @ initial_state
+    if backend.name != "numpy":
+        with pytest.raises(ValueError):
+            backend.set_threads(nthreads)
+        return
+    backend.set_threads(nthreads)
+    try:
+        final_state = backend.execute_circuit(circuit, backend.np.copy(initial_state))
+        assert backend.nthreads == nthreads
+        # the threads of a backend do not affect other backends
+        other = NumpyBackend()
+        assert other._threads.nthreads == 1
+        backend.assert_allclose(
+            other.execute_circuit(circuit, np.copy(initial_state)).state(),
+            target_state,
+            atol=1e-10,
+        )
+    finally:
+        backend.set_threads(1)
+    backend.assert_allclose(final_state, target_state, atol=1e-10)
+    with pytest.raises(ValueError):
+        backend.set_threads(0)
+
+
+@pytest.mark.parametrize("nshots", [10, 10000])
+def test_sample_shots_generator(nshots):
+    backend = NumpyBackend()
+    probabilities = np.zeros(64)
+    probabilities[[3, 10, 63]] = [0.2, 0.5, 0.3]
+    backend.set_seed(123)
+    samples = backend.sample_shots(probabilities, nshots)
+    assert samples.shape == (nshots,)
+    assert set(samples.tolist()) <= {3, 10, 63}
+    backend.set_seed(123)
+    frequencies = backend.sample_frequencies(probabilities, nshots)
+    assert sum(frequencies.values()) == nshots
+    assert set(frequencies) <= {3, 10, 63}
+    if nshots >= len(probabilities):
+        assert frequencies == collections.Counter(samples.tolist())
+        np.testing.assert_allclose(
+            [frequencies[i] / nshots for i in (3, 10, 63)], [0.2, 0.5, 0.3], atol=0.02
+        )
+    # probabilities changed in place are sampled again
+    probabilities[:] = 0
+    probabilities[5] = 1
+    assert set(backend.sample_shots(probabilities, 10).tolist()) == {5}
+
+
+def test_shot_sampler(monkeypatch):
+    backend = NumpyBackend()
+    probabilities = np.random.random(64)
+    cumsum = np.cumsum
+    calls = []
+    monkeypatch.setattr(
+        np, "cumsum", lambda *a, **k: calls.append(1) or cumsum(*a, **k)
+    )
+    backend.set_seed(42)
+    sampler = backend.shot_sampler(probabilities)
+    samples = [sampler(10) for _ in range(3)]
+    # the cumulative distribution is computed once for all the calls
+    assert len(calls) == 1
+    backend.set_seed(42)
+    for target in samples:
+        np.testing.assert_array_equal(backend.sample_shots(probabilities, 10), target)
+
+    # without ``set_seed`` the samples follow numpy's global random state
+    backend = NumpyBackend()
+    np.random.seed(7)
+    target = backend.sample_shots(probabilities, 10)
+    np.random.seed(7)
+    np.testing.assert_array_equal(backend.sample_shots(probabilities, 10), target)
+
+
+def test_matrix_cache():
+    backend = NumpyBackend()
+    backend.matrix_cache.clear()
+    matrix = gates.RX(0, theta=0.1).matrix(backend)
+    backend.assert_allclose(gates.RX(1, theta=0.1).matrix(backend), matrix)
+    # public matrices are writeable copies of the read-only cached ones
+    assert not backend._gate_matrix(gates.RX(0, theta=0.1)).flags.writeable
+    matrix[0, 0] = 0
+    backend.assert_allclose(
+        gates.RX(0, theta=0.1).matrix(backend), backend.matrices.RX(0.1)
+    )
+    gates.RX(0, theta=0.2).matrix(backend)
+    gates.RX(0, theta=0.1).controlled_by(1).matrix(backend)
+    gates.H(0).matrix(backend)
+    gates.H(0).matrix(backend)
+    info = backend.matrix_cache.info()
+    assert (info.hits, info.misses, info.currsize) == (4, 4, 4)
+    # parameters that are arrays are not cached
+    gates.RX(0, theta=np.array(0.1)).matrix(backend)
+    assert backend.matrix_cache.info().misses == 4
+
+    backend.set_precision("single")
+    assert len(backend.matrix_cache) == 0
+    assert gates.RX(0, theta=0.1).matrix(backend).dtype == np.complex64
+    backend.set_precision("double")
+
+
+@pytest.mark.parametrize("policy", ["lru", "fifo"])
+def test_matrix_cache_eviction(policy):
+    backend = NumpyBackend()
+    backend.set_matrix_cache(maxsize=2, policy=policy)
+    for theta in [0.1, 0.2, 0.1, 0.3, 0.1]:
+        gates.RY(0, theta=theta).matrix(backend)
+    info = backend.matrix_cache.info()
+    assert info.currsize == 2
+    assert info.hits == (2 if policy == "lru" else 1)
+    backend.set_matrix_cache(maxsize=0)
+    gates.RY(0, theta=0.1).matrix(backend)
+    assert len(backend.matrix_cache) == 0
+    with pytest.raises(ValueError):
+        backend.set_matrix_cache(maxsize=-1)
+    with pytest.raises(ValueError):
+        backend.set_matrix_cache(policy="random")
+
+
+def _cache_circuit(theta=0.1, measurements=False):
+    circuit = Circuit(3)
+    circuit.add(gates.H(0))
+    circuit.add(gates.CNOT(0, 1))
+    circuit.add(gates.RY(2, theta=theta))
+    if measurements:
+        circuit.add(gates.M(0, 1, 2))
+    return circuit
+
+
+@pytest.mark.parametrize("directory", [False, True])
+def test_result_cache(directory, tmp_path):
+    backend = NumpyBackend()
+    backend.set_result_cache(maxsize=2, directory=str(tmp_path) if directory else None)
+    target = backend.execute_circuit(_cache_circuit()).state()
+    # identical circuits built again reuse the cached state
+    state = backend.execute_circuit(_cache_circuit()).state()
+    backend.assert_allclose(state, target)
+    state[0] = 0
+    backend.assert_allclose(backend.execute_circuit(_cache_circuit()).state(), target)
+    info = backend.result_cache.info()
+    assert (info.hits, info.misses, info.currsize) == (2, 1, 1)
+    # different initial states have different keys
+    initial_state = random_statevector(8, backend=backend)
+    result = backend.execute_circuit(_cache_circuit(), initial_state)
+    target = _cache_circuit().unitary(backend) @ initial_state
+    backend.assert_allclose(result.state(), target)
+    assert backend.result_cache.info().misses == 2
+    # the least recently used state is evicted
+    backend.execute_circuit(_cache_circuit(theta=0.2))
+    backend.execute_circuit(_cache_circuit(), initial_state)
+    assert backend.result_cache.info().hits == 3
+    backend.execute_circuit(_cache_circuit())
+    info = backend.result_cache.info()
+    assert (info.hits, info.misses, info.currsize) == (3, 4, 2)
+    if directory:
+        assert len(list(tmp_path.glob("*.npy"))) == 2
+        # other backends share the states saved in the directory
+        other = NumpyBackend()
+        other.set_result_cache(maxsize=2, directory=str(tmp_path))
+        other.execute_circuit(_cache_circuit())
+        assert other.result_cache.info().hits == 1
+    backend.result_cache.clear()
+    assert len(backend.result_cache) == 0
+
+
+def test_result_cache_measurements():
+    backend = NumpyBackend()
+    backend.set_result_cache(maxsize=4)
+    backend.set_seed(123)
+    target = backend.execute_circuit(_cache_circuit(measurements=True), nshots=100)
+    result = backend.execute_circuit(_cache_circuit(measurements=True), nshots=200)
+    assert backend.result_cache.info().hits == 1
+    backend.assert_allclose(result.state(), target.state())
+    # shots are sampled again from the cached state
+    assert sum(result.frequencies().values()) == 200
+    assert set(result.frequencies()) <= {"000", "001", "110", "111"}
+    # noisy state vector circuits are not cached
+    circuit = _cache_circuit()
+    circuit.add(gates.PauliNoiseChannel(0, [("X", 0.1)]))
+    circuit.add(gates.M(0))
+    backend.execute_circuit(circuit, nshots=10)
+    assert len(backend.result_cache) == 1
+    backend.set_result_cache(maxsize=0)
+    assert backend.result_cache is None
+
+
+def test_result_cache_bytes():
+    backend = NumpyBackend()
+    backend.set_result_cache(maxsize=10, max_bytes=300)
+    for theta in [0.1, 0.2, 0.3]:
+        backend.execute_circuit(_cache_circuit(theta=theta))
+    # each state vector of three qubits takes 128 bytes
+    info = backend.result_cache.info()
+    assert (info.currsize, info.nbytes) == (2, 256)
+    backend.execute_circuit(Circuit(5))
+    assert len(backend.result_cache) == 2
+    with pytest.raises(ValueError):
+        backend.set_result_cache(maxsize=-1)
+    with pytest.raises(ValueError):
+        backend.set_result_cache(maxsize=1, max_bytes=-1)
+
+
+def test_submit(backend):
+    circuits = [Circuit(n) for n in range(1, 5)]
+    for circuit in circuits:
+        circuit.add(gates.H(q) for q in range(circuit.nqubits))
+        circuit.add(gates.RX(0, theta=0.1))
+    initial_state = random_statevector(2, seed=10, backend=backend)
+    backend.set_job_executor(workers=2, max_queue=1)
+    job = backend.submit(circuits[0], backend.np.copy(initial_state))
+    target = backend.execute_circuit(circuits[0], backend.np.copy(initial_state))
+    backend.assert_allclose(job.result().state(), target.state(), atol=1e-10)
+    assert job.circuit is circuits[0]
+    assert job.timing.submitted <= job.timing.started <= job.timing.finished
+    assert job.timing.queued >= 0 and job.timing.duration >= 0
+
+    jobs = backend.submit_many(circuits)
+    for circuit, job in zip(circuits, jobs):
+        target = backend.execute_circuit(circuit).state()
+        backend.assert_allclose(job.result().state(), target, atol=1e-10)
+    with pytest.raises(ValueError):
+        backend.submit_many(circuits, [initial_state])
+
+    async def gather():
+        return await asyncio.gather(*backend.submit_many(circuits[:2]))
+
+    results = asyncio.run(gather())
+    backend.assert_allclose(results[1].state(), jobs[1].result().state())
+
+
+def test_submit_queue_and_cancel(monkeypatch):
+    backend = NumpyBackend()
+    backend.set_job_executor(workers=1, max_queue=1)
+    release = threading.Event()
+    execute_circuit = backend.execute_circuit
+
+    def blocked_execute_circuit(circuit, initial_state=None, nshots=1000):
+        release.wait()
+        return execute_circuit(circuit, initial_state, nshots)
+
+    monkeypatch.setattr(backend, "execute_circuit", blocked_execute_circuit)
+    circuit = Circuit(1)
+    circuit.add(gates.X(0))
+    running = backend.submit(circuit)
+    queued = backend.submit(circuit)
+    # the worker and the queue are busy
+    with pytest.raises(TimeoutError):
+        backend.submit(circuit, timeout=0)
+    assert queued.cancel()
+    assert queued.timing.started is None
+    last = backend.submit(circuit, timeout=0)
+    release.set()
+    backend.assert_allclose(running.result().state(), [0, 1])
+    backend.assert_allclose(last.result().state(), [0, 1])
+    with pytest.raises(concurrent.futures.CancelledError):
+        queued.result()
+
+    backend.set_job_executor(workers=1, max_queue=0)
+    circuit = Circuit(1)
+    circuit.add(gates.M(0, collapse=True))
+    job = backend.submit(circuit)
+    with pytest.raises(RuntimeError):
+        job.result()
+    assert job.timing.duration >= 0
+    with pytest.raises(ValueError):
+        backend.set_job_executor(workers=0)
+
+
+def test_einsum_merge_axes():
+    einsum_utils.merge_axes.cache_clear()
+    assert einsum_utils.merge_axes([3, 1], 6) == ((2, 2, 2, 2, 4), (3, 1), 5)
+    assert einsum_utils.merge_axes((3, 1), 6) == ((2, 2, 2, 2, 4), (3, 1), 5)
+    assert einsum_utils.merge_axes((0,), 30) == ((2, 2**29), (0,), 2)
+    assert einsum_utils.merge_axes.cache_info().hits == 1
+    # the gate string does not depend on the total number of qubits
+    _, targets, naxes = einsum_utils.merge_axes((40, 2), 60)
+    assert einsum_utils.apply_gate_string(targets, naxes) == "abcde,fgdb->agcfe"
+
+
+def test_einsum_control_order_lists():
+    gate = gates.X(2).controlled_by(0)
+    order, targets = einsum_utils.control_order(gate, 3)
+    assert (order, targets) == ([0, 1, 2], [1])
+    # the cached orders are returned as new lists
+    order.append(3)
+    assert einsum_utils.control_order(gate, 3)[0] == [0, 1, 2]
+    order, targets = einsum_utils.control_order_density_matrix(gate, 3)
+    assert (order, targets) == ([0, 3, 1, 2, 4, 5], [1])
+    assert einsum_utils.reverse_order([2, 0, 1]) == [1, 2, 0]
+
+
 def test_set_backend_error():
     with pytest.raises(ValueError):
         set_backend("non-existing-backend")
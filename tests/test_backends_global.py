@@ -45,8 +45,10 @@ def test_set_threads():
 
     qibo.set_backend("numpy")
     assert qibo.get_threads() == 1
-    with pytest.raises(ValueError):
-        qibo.set_threads(10)
+    qibo.set_threads(10)
+    assert qibo.get_threads() == 10
+    qibo.set_threads(1)
+    assert qibo.get_threads() == 1
 
 
 def test_set_shot_batch_size():
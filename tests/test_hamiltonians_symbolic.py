@@ -309,6 +309,61 @@ def test_symbolic_hamiltonian_state_expectation_different_nqubits(
             local_ev = local_ham.expectation(state)
 
 
+@pytest.mark.parametrize("density_matrix", [False, True])
+@pytest.mark.parametrize("normalize", [False, True])
+def test_symbolic_hamiltonian_circuit_expectation(backend, density_matrix, normalize):
+    nqubits = 6
+    circuit = Circuit(nqubits, density_matrix=density_matrix)
+    for layer in range(3):
+        circuit.add(gates.RY(q, theta=0.1 * (q + layer)) for q in range(nqubits))
+        circuit.add(gates.CZ(q, q + 1) for q in range(layer % 2, nqubits - 1, 2))
+    circuit.add(gates.RX(4, theta=0.3).controlled_by(5))
+    circuit.add(gates.M(2))
+    form = symbolic_tfim(nqubits, h=0.5) + 0.3 * Y(1) * Z(4) + 2
+    ham = hamiltonians.SymbolicHamiltonian(form, backend=backend)
+
+    target_ev = ham.expectation(backend.execute_circuit(circuit).state(), normalize)
+    backend.assert_allclose(ham.expectation(circuit, normalize), target_ev)
+
+
+def test_symbolic_hamiltonian_circuit_expectation_cache(backend, monkeypatch):
+    nqubits = 8
+    circuit = Circuit(nqubits)
+    circuit.add(gates.RY(q, theta=0.1) for q in range(nqubits))
+    circuit.add(gates.CZ(q, q + 1) for q in range(0, nqubits - 1, 2))
+    circuit.add(gates.RY(q, theta=0.2) for q in range(nqubits))
+    ham = hamiltonians.SymbolicHamiltonian(
+        sum(Z(2 * i) * Z(2 * i + 1) for i in range(nqubits // 2)), backend=backend
+    )
+    target_ev = ham.expectation(backend.execute_circuit(circuit).state())
+
+    executed = []
+    execute_circuit = backend.execute_circuit
+
+    def counted(circuit, *args, **kwargs):
+        executed.append(circuit.nqubits)
+        return execute_circuit(circuit, *args, **kwargs)
+
+    monkeypatch.setattr(backend, "execute_circuit", counted)
+    backend.assert_allclose(ham.expectation(circuit), target_ev)
+    # all terms have identical two-qubit light cones
+    assert executed == [2]
+
+
+def test_symbolic_hamiltonian_circuit_expectation_errors(backend):
+    ham = hamiltonians.SymbolicHamiltonian(symbolic_tfim(3), backend=backend)
+    with pytest.raises(ValueError):
+        ham.expectation(Circuit(2))
+    circuit = Circuit(3, density_matrix=True)
+    circuit.add(gates.DepolarizingChannel((0,), 0.1))
+    with pytest.raises(NotImplementedError):
+        ham.expectation(circuit)
+    circuit = Circuit(3)
+    circuit.add(gates.M(0, collapse=True))
+    with pytest.raises(NotImplementedError):
+        ham.expectation(circuit)
+
+
 def test_hamiltonian_expectation_from_samples(backend):
     """Test Hamiltonian expectation value calculation."""
     backend.set_seed(0)
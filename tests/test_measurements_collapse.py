@@ -118,6 +118,8 @@ def test_measurement_result_parameters_random(backend):
 
 @pytest.mark.parametrize("use_loop", [True, False])
 def test_measurement_result_parameters_repeated_execution(backend, use_loop):
+    # compares with the sequence of shots simulated one after the other
+    backend.set_branching(False)
     initial_state = random_density_matrix(2**4, backend=backend)
     backend.set_seed(123)
     c = models.Circuit(4, density_matrix=True)
@@ -155,6 +157,7 @@ def test_measurement_result_parameters_repeated_execution(backend, use_loop):
 
 
 def test_measurement_result_parameters_repeated_execution_final_measurements(backend):
+    backend.set_branching(False)
     initial_state = random_density_matrix(2**4, backend=backend)
     backend.set_seed(123)
     c = models.Circuit(4, density_matrix=True)
@@ -185,6 +188,49 @@ def test_measurement_result_parameters_repeated_execution_final_measurements(bac
     backend.assert_allclose(final_samples, target_samples)
 
 
+@pytest.mark.parametrize("branching", [False, True])
+@pytest.mark.parametrize("density_matrix", [False, True])
+def test_measurement_result_parameters_branching(backend, density_matrix, branching):
+    nshots = 1000
+    backend.set_seed(42)
+    backend.set_branching(branching)
+    c = models.Circuit(3, density_matrix=density_matrix)
+    c.add([gates.H(0), gates.RY(1, theta=0.7), gates.CNOT(0, 2)])
+    r = c.add(gates.M(0, collapse=True))
+    c.add(gates.RX(2, theta=np.pi * r.symbols[0] / 3))
+    c.add(gates.RY(0, theta=np.pi * r.symbols[0]))
+    c.add(gates.M(0, 1, 2))
+    result = backend.execute_circuit(c, nshots=nshots)
+
+    # every shot continues from the outcome of its collapsing measurement
+    outcomes = backend.to_numpy(backend.cast(r.samples()))[:, 0]
+    samples = backend.to_numpy(result.samples())
+    assert len(outcomes) == nshots
+    np.testing.assert_allclose(np.mean(outcomes), 0.5, atol=0.05)
+    np.testing.assert_allclose(samples[:, 0], 0)
+    np.testing.assert_allclose(samples[outcomes == 0, 2], 0)
+
+    c = models.Circuit(3, density_matrix=True)
+    c.add([gates.H(0), gates.RY(1, theta=0.7), gates.CNOT(0, 2)])
+    state = backend.execute_circuit(c).state()
+    target_state = 0
+    for outcome in range(2):
+        collapsed = backend.collapse_density_matrix(state, [0], np.array([outcome]), 3)
+        c = models.Circuit(3, density_matrix=True)
+        c.add(gates.RX(2, theta=np.pi * outcome / 3))
+        c.add(gates.RY(0, theta=np.pi * outcome))
+        target_state = (
+            target_state
+            + backend.to_numpy(backend.execute_circuit(c, collapsed).state()) / 2
+        )
+    target_probabilities = np.real(np.diag(target_state))
+    frequencies = result.frequencies(binary=False)
+    probabilities = [frequencies.get(i, 0) / nshots for i in range(8)]
+    np.testing.assert_allclose(probabilities, target_probabilities, atol=0.05)
+    if density_matrix and branching:
+        backend.assert_allclose(result.state(), target_state, atol=0.05)
+
+
 def test_measurement_result_parameters_multiple_qubits(backend):
     initial_state = random_density_matrix(2**4, backend=backend)
     backend.set_seed(123)
@@ -74,6 +74,8 @@ def test_unbalanced_probabilistic_measurement(backend, use_samples):
 
 def test_measurements_with_probabilistic_noise(backend):
     """Check measurements when simulating noise with repeated execution."""
+    # simulate one trajectory at a time, to draw the same random numbers
+    backend.set_trajectory_batch_size(1)
     thetas = np.random.random(5)
     c = models.Circuit(5)
     c.add((gates.RX(i, t) for i, t in enumerate(thetas)))
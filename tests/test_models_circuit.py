@@ -2,9 +2,10 @@
 
 from collections import Counter
 
+import numpy as np
 import pytest
 
-from qibo import Circuit, gates
+from qibo import Circuit, callbacks, gates
 from qibo.models.utils import initialize
 
 
@@ -421,6 +422,37 @@ def test_circuit_copy_with_measurements(deep):
     assert c2.measurement_tuples == {"a": (0, 1), "b": (3,)}
 
 
+def test_circuit_content_hash():
+    def build(theta=0.1, density_matrix=False, register_name=None):
+        circuit = Circuit(3, density_matrix=density_matrix)
+        circuit.add(gates.H(0))
+        circuit.add(gates.RX(1, theta=theta))
+        circuit.add(gates.CNOT(0, 2))
+        circuit.add(gates.PauliNoiseChannel(1, [("X", 0.1)]))
+        circuit.add(gates.M(0, 1, register_name=register_name))
+        return circuit
+
+    circuit = build()
+    assert circuit.content_hash() == build().content_hash()
+    assert circuit.content_hash() == circuit.copy(deep=True).content_hash()
+    assert circuit.content_hash() != build(theta=0.2).content_hash()
+    assert circuit.content_hash() != build(density_matrix=True).content_hash()
+    assert circuit.content_hash() != build(register_name="a").content_hash()
+    # hashes depend on the current parameters, not on the initial ones
+    circuit.set_parameters([0.2])
+    assert circuit.content_hash() == build(theta=0.2).content_hash()
+    circuit1, circuit2 = Circuit(1), Circuit(1)
+    circuit1.add(gates.Unitary(np.array([[0, 1], [1, 0]]), 0))
+    circuit2.add(gates.Unitary(np.eye(2), 0))
+    circuit1.set_parameters([np.eye(2)])
+    assert circuit1.content_hash() == circuit2.content_hash()
+
+    circuit = Circuit(1)
+    circuit.add(gates.CallbackGate(callbacks.Norm()))
+    with pytest.raises(TypeError):
+        circuit.content_hash()
+
+
 @pytest.mark.parametrize("measurements", [False, True])
 def test_circuit_invert(measurements):
     c = Circuit(3)
@@ -2,7 +2,8 @@ import numpy as np
 import pytest
 
 from qibo import Circuit, gates
-from qibo.quantum_info import random_density_matrix
+from qibo.quantum_info import random_density_matrix, random_statevector, random_unitary
+from qibo.result import QuantumStateBatch
 
 
 def test_eager_execute(backend, accelerators):
@@ -37,6 +38,48 @@ def test_compiled_execute(backend):
     np.testing.assert_allclose(backend.to_numpy(r1), backend.to_numpy(r2))
 
 
+@pytest.mark.parametrize("fuse", [False, True])
+def test_compiled_execute_parametrized(backend, fuse):
+    nqubits = 4
+    c = Circuit(nqubits)
+    c.add(gates.H(q) for q in range(nqubits))
+    c.add([gates.Z(0), gates.CZ(1, 2), gates.T(3), gates.CCZ(0, 1, 3)])
+    c.add(gates.RX(q, theta=0) for q in range(nqubits))
+    c.add(gates.CNOT(0, 1))
+    c.add(gates.RZZ(1, 2, theta=0))
+    c.add(gates.SWAP(2, 3).controlled_by(0))
+    c.add(gates.U1(3, theta=0).controlled_by(1, 2))
+    matrix = random_unitary(8, seed=10, backend=backend)
+    c.add(gates.Unitary(matrix, 0, 2, 3, trainable=False))
+    c.add(gates.M(*range(nqubits)))
+    if fuse:
+        c = c.fuse()
+    c.compile(backend)
+    initial_state = random_statevector(2**nqubits, seed=10, backend=backend)
+    for seed in range(2):
+        parameters = np.random.default_rng(seed).uniform(0, 2 * np.pi, 6)
+        c.set_parameters(parameters)
+        final_state = c(backend.np.copy(initial_state)).state()
+        target_state = backend.execute_circuit(c, initial_state).state()
+        backend.assert_allclose(final_state, target_state, atol=1e-10)
+    backend.assert_allclose(c().state(), backend.execute_circuit(c).state())
+
+
+def test_compiled_execute_batch(backend):
+    if backend.name != "numpy":
+        pytest.skip("Batched execution is only available for the numpy backend.")
+    c = Circuit(2)
+    c.add(gates.H(0))
+    c.add(gates.CNOT(0, 1))
+    c.compile(backend)
+    initial_states = backend.cast(np.eye(4, dtype=complex))
+    result = c(initial_states)
+    assert isinstance(result, QuantumStateBatch)
+    assert len(result) == 4
+    target = backend.execute_circuit(c, initial_states)
+    backend.assert_allclose(result.state(), target.state())
+
+
 def test_compiling_twice_exception(backend):
     """Check that compiling a circuit a second time raises error."""
     c = Circuit(2)
@@ -154,3 +197,77 @@ def test_initial_state_shape_error(backend, density_matrix):
     initial_state = random_density_matrix(2, backend=backend)
     with pytest.raises(ValueError):
         backend.execute_circuit(c, initial_state=initial_state)
+
+
+def test_batched_execute(backend):
+    nqubits, batch = 3, 5
+    c = Circuit(nqubits)
+    c.add(gates.H(0))
+    c.add(gates.RY(1, theta=0.1).controlled_by(0))
+    c.add(gates.CZ(1, 2))
+    c.add(gates.RZZ(0, 2, theta=0.2))
+    c.add(gates.Unitary(random_unitary(8, seed=10, backend=backend), 2, 0, 1))
+    initial_states = backend.cast(
+        [random_statevector(2**nqubits, seed=i, backend=backend) for i in range(batch)]
+    )
+    if backend.name != "numpy":
+        with pytest.raises(NotImplementedError):
+            backend.execute_circuit(c, initial_states)
+        return
+
+    result = backend.execute_circuit(c, backend.np.copy(initial_states))
+    assert isinstance(result, QuantumStateBatch)
+    assert len(result) == batch
+    for i, state in enumerate(result):
+        target = backend.execute_circuit(c, initial_states[i])
+        backend.assert_allclose(state.state(), target.state(), atol=1e-10)
+        backend.assert_allclose(
+            result.probabilities([2, 0])[i], target.probabilities([2, 0]), atol=1e-10
+        )
+
+
+def test_batched_execute_errors(backend):
+    c = Circuit(2)
+    c.add(gates.H(0))
+    c.add(gates.M(0))
+    initial_states = backend.cast(np.ones((3, 4)) / 2)
+    with pytest.raises(NotImplementedError):
+        backend.execute_circuit(c, initial_states)
+    with pytest.raises(ValueError):
+        backend.execute_circuit(c, backend.cast(np.ones((3, 8))))
+
+
+@pytest.mark.parametrize("nlocal", [3, 4])
+def test_out_of_core_execute(backend, nlocal, tmp_path):
+    nqubits = 6
+    c = Circuit(nqubits)
+    c.add(gates.H(q) for q in range(nqubits))
+    c.add([gates.CNOT(0, 4), gates.CNOT(5, 1), gates.RX(0, theta=0.3)])
+    c.add([gates.CZ(1, 2), gates.SWAP(0, 5), gates.fSim(0, 1, theta=0.1, phi=0.2)])
+    c.add(gates.U1(3, theta=0.2).controlled_by(0, 1))
+    c.add(gates.Unitary(random_unitary(8, seed=10, backend=backend), 2, 0, 4))
+    c.add(gates.RY(1, theta=0.5).controlled_by(3))
+    c.add(gates.TOFFOLI(0, 1, 5))
+    c.add(gates.M(0, 3))
+    if backend.name != "numpy":
+        with pytest.raises(NotImplementedError):
+            backend.set_out_of_core(tmp_path, nlocal)
+        return
+
+    initial_state = random_statevector(2**nqubits, seed=10, backend=backend)
+    target_state = backend.execute_circuit(c, initial_state).state()
+    backend.set_out_of_core(tmp_path, nlocal)
+    try:
+        result = backend.execute_circuit(c, initial_state)
+        assert isinstance(result.state(), np.memmap)
+        backend.assert_allclose(result.state(), target_state, atol=1e-10)
+        assert sum(result.frequencies().values()) == 1000
+        with pytest.raises(NotImplementedError):
+            backend.execute_circuit(c.fuse())
+        backend.set_out_of_core(tmp_path, 2)
+        with pytest.raises(ValueError):
+            backend.execute_circuit(c)
+    finally:
+        backend.set_out_of_core(None)
+    with pytest.raises(ValueError):
+        backend.set_out_of_core(tmp_path, 0)
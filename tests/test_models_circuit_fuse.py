@@ -70,6 +70,44 @@ def test_fusedgate_matrix_calculation(backend):
     backend.assert_allclose(fused_matrix, target_matrix)
 
 
+def test_fusedgate_matrix_parameter_update(backend):
+    queue = [
+        gates.H(0),
+        gates.RX(1, theta=0.1),
+        gates.CNOT(2, 0),
+        gates.RY(0, theta=0.2).controlled_by(2),
+        gates.fSim(1, 2, theta=0.3, phi=0.4),
+    ]
+    fgate = gates.FusedGate(0, 1, 2)
+    for gate in queue:
+        fgate.append(gate)
+
+    def target_matrix():
+        circuit = Circuit(3)
+        circuit.add(queue)
+        return backend.to_numpy(circuit.unitary(backend))
+
+    matrix = fgate.matrix(backend)
+    backend.assert_allclose(matrix, target_matrix(), atol=1e-10)
+    if backend.name == "numpy":
+        # the matrix is reused until the parameters of a gate change
+        cached = backend._gate_matrix(fgate)
+        assert backend._gate_matrix(fgate) is cached
+        assert fgate.matrix(backend) is not cached
+    queue[3].parameters = 0.5
+    backend.assert_allclose(fgate.matrix(backend), target_matrix(), atol=1e-10)
+    queue[1].parameters = 0.6
+    backend.assert_allclose(fgate.matrix(backend), target_matrix(), atol=1e-10)
+    queue.append(gates.CZ(1, 0))
+    fgate.append(queue[-1])
+    backend.assert_allclose(fgate.matrix(backend), target_matrix(), atol=1e-10)
+    queue.append(gates.H(3))
+    fgate.append(queue[-1])
+    circuit = Circuit(4)
+    circuit.add(queue)
+    backend.assert_allclose(fgate.matrix(backend), circuit.unitary(backend), atol=1e-10)
+
+
 def test_fuse_circuit_two_qubit_gates(backend):
     """Check circuit fusion in circuit with two-qubit gates only."""
     c = Circuit(2)
@@ -101,7 +139,8 @@ def test_fuse_circuit_three_qubit_gate(backend, max_qubits):
 @pytest.mark.parametrize("nqubits", [4, 5, 10, 11])
 @pytest.mark.parametrize("nlayers", [1, 2])
 @pytest.mark.parametrize("max_qubits", [2, 3, 4])
-def test_variational_layer_fusion(backend, nqubits, nlayers, max_qubits):
+@pytest.mark.parametrize("planner", ["greedy", "cost"])
+def test_variational_layer_fusion(backend, nqubits, nlayers, max_qubits, planner):
     """Check fused variational layer execution."""
     theta = 2 * np.pi * np.random.random((2 * nlayers * nqubits,))
     theta_iter = iter(theta)
@@ -114,14 +153,15 @@ def test_variational_layer_fusion(backend, nqubits, nlayers, max_qubits):
         c.add(gates.CZ(i, i + 1) for i in range(1, nqubits - 1, 2))
         c.add(gates.CZ(0, nqubits - 1))
 
-    fused_c = c.fuse(max_qubits=max_qubits)
+    fused_c = c.fuse(max_qubits=max_qubits, planner=planner)
     backend.assert_circuitclose(fused_c, c)
 
 
 @pytest.mark.parametrize("nqubits", [4, 5])
 @pytest.mark.parametrize("ngates", [10, 20])
 @pytest.mark.parametrize("max_qubits", [2, 3, 4])
-def test_random_circuit_fusion(backend, nqubits, ngates, max_qubits):
+@pytest.mark.parametrize("planner", ["greedy", "cost"])
+def test_random_circuit_fusion(backend, nqubits, ngates, max_qubits, planner):
     """Check gate fusion in randomly generated circuits."""
     one_qubit_gates = [gates.RX, gates.RY, gates.RZ]
     two_qubit_gates = [gates.CNOT, gates.CZ, gates.SWAP]
@@ -136,7 +176,7 @@ def test_random_circuit_fusion(backend, nqubits, ngates, max_qubits):
         while q0 == q1:
             q0, q1 = np.random.randint(0, nqubits, (2,))
         c.add(gate(q0, q1))
-    fused_c = c.fuse(max_qubits=max_qubits)
+    fused_c = c.fuse(max_qubits=max_qubits, planner=planner)
     backend.assert_circuitclose(fused_c, c, atol=1e-7)
 
 
@@ -188,18 +228,69 @@ def test_set_parameters_fusion(backend):
 
 
 @pytest.mark.parametrize("max_qubits", [1, 2, 3])
-def test_fusion_with_measurements(backend, max_qubits):
+@pytest.mark.parametrize("planner", ["greedy", "cost"])
+def test_fusion_with_measurements(backend, max_qubits, planner):
     c = Circuit(3, density_matrix=True)
     c.add(gates.X(i) for i in range(3))
     c.add(gates.M(0))
     c.add(gates.CNOT(0, 1))
     c.add(gates.H(2))
     c.add(gates.M(0, 1, 2))
-    fused_c = c.fuse(max_qubits=max_qubits)
+    fused_c = c.fuse(max_qubits=max_qubits, planner=planner)
     assert fused_c.measurements == c.measurements
     backend.assert_circuitclose(fused_c, c)
 
 
+@pytest.mark.parametrize("max_qubits", [3, 4, 5])
+def test_cost_fusion_reorders_commuting_gates(backend, max_qubits):
+    """Check that the cost planner moves gates past commuting blocks."""
+    nqubits = 6
+    c = Circuit(nqubits)
+    for q in range(nqubits):
+        c.add(gates.RY(q, theta=0.1 * (q + 1)))
+    c.add(gates.CZ(q, q + 1) for q in range(nqubits - 1))
+    c.add(gates.Z(0))
+    c.add(gates.CNOT(0, 1))
+    c.add(gates.RX(q, theta=0.2 * (q + 1)) for q in range(nqubits))
+    greedy_c = c.fuse(max_qubits=max_qubits)
+    fused_c = c.fuse(max_qubits=max_qubits, planner="cost")
+    report = fused_c.fusion_report
+    assert report.gates == c.ngates
+    assert report.blocks == len(fused_c.queue)
+    assert report.passes_saved == c.ngates - len(fused_c.queue)
+    assert report.fused_cost <= greedy_c.fusion_report.fused_cost
+    assert report.fused_cost < report.cost
+    backend.assert_circuitclose(fused_c, c)
+
+
+def test_cost_fusion_callbacks(backend):
+    """Check that the cost planner does not move gates past callbacks."""
+    from qibo import callbacks
+
+    entropy = callbacks.EntanglementEntropy([0])
+    c = Circuit(3)
+    c.add(gates.H(0))
+    c.add(gates.CallbackGate(entropy))
+    c.add(gates.CNOT(0, 1))
+    c.add(gates.CallbackGate(entropy))
+    c.add(gates.X(2))
+    fused_c = c.fuse(max_qubits=3, planner="cost")
+    assert fused_c.fusion_report.passes_saved == 0
+    backend.assert_circuitclose(fused_c, c)
+    final_entropy = [backend.to_numpy(x) for x in entropy[:]]
+    backend.assert_allclose(final_entropy, [0.0, 1.0, 0.0, 1.0], atol=1e-7)
+
+
+@pytest.mark.parametrize("max_qubits", [0, 6, 2.5])
+def test_cost_fusion_errors(max_qubits):
+    c = Circuit(2)
+    c.add(gates.H(0))
+    with pytest.raises(ValueError):
+        c.fuse(max_qubits=max_qubits, planner="cost")
+    with pytest.raises(ValueError):
+        c.fuse(planner="unknown")
+
+
 def test_add_fused_gate(backend):
     """Check adding fused gate to a circuit."""
     c = Circuit(2)
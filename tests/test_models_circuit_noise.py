@@ -174,6 +174,8 @@ def test_density_matrix_circuit_measurement(backend):
 
 def test_circuit_add_sampling(backend):
     """Check measurements when simulating added circuits with noise"""
+    # simulate one trajectory at a time, to draw the same random numbers
+    backend.set_trajectory_batch_size(1)
     # Create random noisy circuit and add noiseless inverted circuit
     gates_set = [gates.X, gates.Y, gates.Z, gates.H, gates.S, gates.SDG, gates.I]
     circ = Circuit(1)
@@ -248,3 +250,69 @@ def test_probabilities_repeated_execution(backend, nqubits):
     result_density_matrix = result_density_matrix.probabilities()
 
     backend.assert_allclose(result, result_density_matrix, rtol=2e-2, atol=5e-3)
+
+
+def test_repeated_execution_deterministic_segments(backend):
+    # simulate one trajectory at a time, to draw the same random numbers
+    backend.set_trajectory_batch_size(1)
+    nqubits, nshots = 3, 20
+    initial_state = random_statevector(2**nqubits, seed=10, backend=backend)
+    c = Circuit(nqubits)
+    c.add([gates.H(0), gates.CNOT(0, 1), gates.RY(2, theta=0.3), gates.CZ(1, 2)])
+    c.add(gates.PauliNoiseChannel(1, [("X", 0.3), ("Z", 0.2)]))
+    c.add([gates.RX(0, theta=0.2), gates.T(1), gates.SWAP(0, 2)])
+    c.add(gates.PauliNoiseChannel(0, [("Y", 0.4)]))
+    c.add(gates.H(2))
+    c.add(gates.M(*range(nqubits)))
+    backend.set_seed(123)
+    samples = backend.execute_circuit(
+        c, backend.np.copy(initial_state), nshots=nshots
+    ).samples()
+
+    # every trajectory simulated from the initial state
+    backend.set_seed(123)
+    target_samples = []
+    for _ in range(nshots):
+        state = backend.np.copy(initial_state)
+        for gate in c.queue[:-1]:
+            state = gate.apply(backend, state, nqubits)
+        measurement = Circuit(nqubits)
+        measurement.add(gates.M(*range(nqubits)))
+        result = backend.execute_circuit(measurement, state, nshots=1)
+        target_samples.append(backend.to_numpy(result.samples()))
+    backend.assert_allclose(samples, np.concatenate(target_samples, axis=0))
+
+
+@pytest.mark.parametrize("batch_size", [None, 1, 7])
+def test_repeated_execution_batched_trajectories(backend, batch_size):
+    if backend.name != "numpy" and batch_size is not None:
+        pytest.skip("Trajectories are batched only by the numpy backend.")
+    nqubits, nshots = 3, 2000
+
+    def circuit(density_matrix, p0=None):
+        c = Circuit(nqubits, density_matrix=density_matrix)
+        c.add([gates.H(0), gates.CNOT(0, 1), gates.RY(2, theta=0.3)])
+        c.add(gates.PauliNoiseChannel(1, [("X", 0.3), ("Z", 0.2)]))
+        c.add([gates.RX(0, theta=0.2), gates.SWAP(0, 2), gates.CZ(1, 2)])
+        c.add(gates.PauliNoiseChannel(0, [("Y", 0.4)]))
+        c.add(gates.Unitary(random_unitary(4, seed=10, backend=backend), 1, 2))
+        c.add(gates.M(2, 0, p0=p0))
+        return c
+
+    target = backend.execute_circuit(circuit(True)).probabilities(qubits=[2, 0])
+    target = backend.to_numpy(target)
+    # bitflips with probability 0.1 on both measured qubits
+    flips = np.array([[0.9, 0.1], [0.1, 0.9]])
+    target = np.kron(flips, flips) @ target
+
+    backend.set_seed(123)
+    backend.set_trajectory_batch_size(batch_size)
+    try:
+        result = backend.execute_circuit(circuit(False, p0=0.1), nshots=nshots)
+    finally:
+        backend.set_trajectory_batch_size(None)
+    assert tuple(result.samples().shape) == (nshots, 2)
+    assert sum(result.frequencies().values()) == nshots
+    backend.assert_allclose(result.probabilities(), target, atol=5e-2)
+    with pytest.raises(ValueError):
+        backend.set_trajectory_batch_size(0)
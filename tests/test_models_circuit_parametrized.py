@@ -6,6 +6,7 @@ import numpy as np
 import pytest
 
 from qibo import Circuit, gates
+from qibo.quantum_info import random_statevector
 
 
 def test_rx_parameter_setter(backend):
@@ -238,3 +239,118 @@ def test_variable_theta():
     c.add(gates.RY(1, 0.4321))
     target_state = backend.execute_circuit(c).state()
     backend.assert_allclose(final_state, target_state)
+
+
+@pytest.mark.parametrize("batched_initial_state", [False, True])
+def test_execute_parametrized(backend, batched_initial_state):
+    nqubits, nsets = 3, 4
+    c = Circuit(nqubits)
+    c.add(gates.RX(0, theta=0))
+    c.add(gates.RY(1, theta=0))
+    c.add(gates.RZ(2, theta=0))
+    c.add(gates.CNOT(0, 1))
+    c.add(gates.U3(2, theta=0, phi=0, lam=0))
+    c.add(gates.RY(0, theta=0.3, trainable=False))
+    c.add(gates.CRX(1, 2, theta=0))
+    c.add(gates.RZZ(0, 2, theta=0))
+    c.add(gates.fSim(1, 0, theta=0, phi=0))
+    c.add(gates.U1(0, theta=0).controlled_by(1, 2))
+    c.add(gates.RXXYY(2, 0, theta=0))
+    nparams = c.trainable_gates.nparams
+    parameters = np.random.default_rng(10).uniform(0, 2 * np.pi, (nsets, nparams))
+    if batched_initial_state:
+        initial_state = random_statevector(2**nqubits, seed=10, backend=backend)
+        initial_state = backend.cast(
+            [backend.np.roll(initial_state, i) for i in range(nsets)]
+        )
+    else:
+        initial_state = None
+
+    if backend.name != "numpy":
+        with pytest.raises(NotImplementedError):
+            backend.execute_parametrized(c, parameters)
+        return
+
+    result = backend.execute_parametrized(c, parameters, initial_state)
+    assert len(result) == nsets
+    for i in range(nsets):
+        c.set_parameters(parameters[i])
+        state = None if initial_state is None else initial_state[i]
+        target_state = backend.execute_circuit(c, state).state()
+        backend.assert_allclose(result[i].state(), target_state, atol=1e-10)
+
+
+def test_execute_parametrized_errors(backend):
+    c = Circuit(2)
+    c.add(gates.RX(0, theta=0))
+    c.add(gates.RY(1, theta=0))
+    with pytest.raises(ValueError):
+        backend.execute_parametrized(c, np.zeros((3, 3)))
+    with pytest.raises(ValueError):
+        backend.execute_parametrized(c, np.zeros((3, 2)), np.zeros((2, 4)))
+    c.add(gates.Unitary(np.eye(2), 0))
+    with pytest.raises(NotImplementedError):
+        backend.execute_parametrized(c, np.zeros((3, 2 + 4)))
+
+
+def test_circuit_template(backend):
+    nqubits = 3
+    c = Circuit(nqubits)
+    c.add(gates.RX(0, theta=0))
+    c.add(gates.CNOT(0, 1))
+    c.add(gates.U3(2, theta=0, phi=0, lam=0))
+    c.add(gates.RY(0, theta=0.3, trainable=False))
+    c.add(gates.Unitary(np.eye(2), 1))
+    c.add(gates.CRX(1, 2, theta=0))
+    c.add(gates.fSim(1, 0, theta=0, phi=0))
+    if backend.name != "numpy":
+        with pytest.raises(NotImplementedError):
+            c.template(backend)
+        return
+
+    batch_template = c.template(backend)
+    c.add(gates.M(0, 2))
+    template = c.template(backend)
+    # later changes of the circuit do not affect the template
+    c.queue[3].parameters = 0.5
+    nparams = c.trainable_gates.nparams
+    assert template.nparams == nparams
+    rng = np.random.default_rng(10)
+    parameters = rng.uniform(0, 2 * np.pi, (4, nparams))
+    initial_state = random_statevector(2**nqubits, seed=10, backend=backend)
+
+    results = [template(params, initial_state) for params in parameters]
+    batch = batch_template.execute(parameters, initial_state)
+    c.queue[3].parameters = 0.3
+    for params, result, state in zip(parameters, results, batch):
+        c.set_parameters(params)
+        target = backend.execute_circuit(c, initial_state)
+        backend.assert_allclose(result.state(), target.state(), atol=1e-10)
+        backend.assert_allclose(state.state(), target.state(), atol=1e-10)
+        assert result.measurements[0] is not c.measurements[0]
+        assert sum(result.frequencies().values()) == 1000
+
+
+def test_circuit_template_errors():
+    from qibo.backends import NumpyBackend
+
+    backend = NumpyBackend()
+    c = Circuit(2)
+    c.add(gates.RX(0, theta=0))
+    c.add(gates.RY(1, theta=0))
+    template = c.template(backend)
+    with pytest.raises(ValueError):
+        template(np.zeros(3))
+    with pytest.raises(ValueError):
+        template(np.zeros(2), np.zeros(2))
+    c.add(gates.M(0))
+    with pytest.raises(NotImplementedError):
+        c.template(backend)(np.zeros((3, 2)))
+    c = Circuit(2)
+    c.add(gates.RX(0, theta=0))
+    c.add(gates.CNOT(0, 1))
+    with pytest.raises(NotImplementedError):
+        c.fuse().template(backend)
+    c = Circuit(2, density_matrix=True)
+    with pytest.raises(NotImplementedError):
+        c.template(backend)
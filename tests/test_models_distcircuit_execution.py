@@ -4,6 +4,7 @@ import numpy as np
 import pytest
 
 from qibo import Circuit, gates
+from qibo.backends import _process_pool
 from qibo.quantum_info import random_statevector
 
 
@@ -169,3 +170,41 @@ def test_distributed_circuit_empty_execution(backend, accelerators):  # pragma:
     # test re-executing the circuit with the default initial state
     final_state = backend.execute_circuit(c)
     backend.assert_allclose(final_state, target_state)
+
+
+def test_distributed_circuit_execution_set_parameters(
+    backend, accelerators
+):  # pragma: no cover
+    nqubits = 6
+    thetas = np.random.random((2, 2 * nqubits))
+    dist_c = Circuit(nqubits, accelerators)
+    c = Circuit(nqubits)
+    for circuit in (dist_c, c):
+        circuit.add(gates.RY(q, theta=0) for q in range(nqubits))
+        circuit.add(gates.CZ(q, q + 1) for q in range(0, nqubits - 1, 2))
+        circuit.add(gates.RX(q, theta=0) for q in range(nqubits))
+        circuit.add(gates.CNOT(q, q + 1) for q in range(1, nqubits - 1, 2))
+        circuit.add(gates.M(0, 3))
+
+    for parameters in thetas:
+        dist_c.set_parameters(parameters)
+        c.set_parameters(parameters)
+        final_state = backend.execute_circuit(dist_c).state()
+        target_state = backend.execute_circuit(c).state()
+        backend.assert_allclose(final_state, target_state, atol=1e-7)
+
+
+def test_distributed_circuit_execution_pool(backend, accelerators):  # pragma: no cover
+    if backend.name != "numpy":
+        pytest.skip("Worker pool is used by the numpy backend.")
+    c = Circuit(4, accelerators)
+    c.add(gates.H(q) for q in range(4))
+    target_state = np.full(16, 0.25)
+    backend.assert_allclose(backend.execute_circuit(c).state(), target_state)
+    pool = _process_pool._plain_pool
+    assert pool is not None
+    backend.assert_allclose(backend.execute_circuit(c).state(), target_state)
+    assert _process_pool._plain_pool is pool
+    _process_pool.shutdown()
+    assert _process_pool._plain_pool is None
+    backend.assert_allclose(backend.execute_circuit(c).state(), target_state)
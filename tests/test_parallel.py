@@ -113,3 +113,68 @@ def test_parallel_parametrized_circuit(backend):
     r1 = [x.state() for x in r1]
     r2 = [x.state() for x in r2]
     backend.assert_allclose(r1, r2)
+
+
+@pytest.mark.skipif(sys.platform == "darwin", reason="Mac tests")
+@pytest.mark.parametrize("density_matrix", [False, True])
+def test_parallel_processes(backend, density_matrix):
+    """Evaluate circuits in the process pool."""
+    if backend.name != "numpy":
+        pytest.skip("Process pool is tested with the numpy backend.")
+    nqubits = 4
+    c = Circuit(nqubits, density_matrix=density_matrix)
+    c.add(gates.RY(q, theta=0) for q in range(nqubits))
+    c.add(gates.CZ(q, q + 1) for q in range(nqubits - 1))
+    c.add(gates.RX(q, theta=0) for q in range(nqubits))
+    c.add(gates.M(0, 1))
+
+    size = len(c.get_parameters())
+    np.random.seed(0)
+    parameters = [np.random.uniform(0, 2 * np.pi, size) for i in range(6)]
+    shape = (2**nqubits, 2**nqubits) if density_matrix else (2**nqubits,)
+    state = backend.cast(np.random.random(shape))
+
+    r1 = []
+    for params in parameters:
+        c.set_parameters(params)
+        r1.append(backend.execute_circuit(c, state))
+    r2 = parallel_parametrized_execution(
+        c, parameters, state, processes=2, backend=backend, mode="processes"
+    )
+    backend.assert_allclose([x.state() for x in r2], [x.state() for x in r1])
+    assert len({id(x.measurements[0]) for x in r2}) == len(parameters)
+    assert sum(r2[0].frequencies().values()) == 1000
+
+    states = [backend.cast(np.random.random(shape)) for _ in range(3)]
+    r2 = parallel_execution(c, states, processes=2, backend=backend, mode="processes")
+    for s, x in zip(states, r2):
+        backend.assert_allclose(x.state(), backend.execute_circuit(c, s).state())
+
+    circuits = [QFT(n) for n in range(1, 6)]
+    r2 = parallel_circuits_execution(
+        circuits, processes=2, backend=backend, mode="processes"
+    )
+    for circuit, x in zip(circuits, r2):
+        assert circuit._final_state is x
+        target = backend.execute_circuit(circuit).state()
+        backend.assert_allclose(x.state(), target)
+
+
+@pytest.mark.skipif(sys.platform == "darwin", reason="Mac tests")
+def test_parallel_processes_errors(backend):
+    c = QFT(3)
+    with pytest.raises(ValueError):
+        parallel_execution(c, [None], backend=backend, mode="fork")
+    with pytest.raises(ValueError):
+        parallel_execution(
+            c, [np.ones(4)], processes=1, backend=backend, mode="processes"
+        )
+    with pytest.raises(ValueError):
+        parallel_execution(c, [None], processes=0, backend=backend, mode="processes")
+    c.add(gates.M(0, collapse=True))
+    with pytest.raises(NotImplementedError):
+        parallel_execution(c, [None], processes=1, backend=backend, mode="processes")
+    c = QFT(3)
+    c.add(gates.CallbackGate(qibo.callbacks.EntanglementEntropy([0])))
+    with pytest.raises(NotImplementedError):
+        parallel_execution(c, [None], processes=1, backend=backend, mode="processes")
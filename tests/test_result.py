@@ -5,7 +5,13 @@ import pytest
 
 from qibo import Circuit, gates, models
 from qibo.config import raise_error
-from qibo.result import CircuitResult, MeasurementOutcomes, load_result
+from qibo.result import (
+    CircuitResult,
+    MeasurementOutcomes,
+    QuantumState,
+    QuantumStateBatch,
+    load_result,
+)
 
 
 @pytest.mark.parametrize("qubits", [None, [0], [1, 2]])
@@ -109,3 +115,120 @@ def test_circuitresult_dump_load(backend, agnostic_load):
         assert loaded_freq[state] == f
     assert backend.np.sum(result.state() - backend.cast(loaded_res.state())) == 0
     remove("tmp.npy")
+
+
+def test_circuitresult_dump_format(backend, tmp_path, monkeypatch):
+    import json
+    import zipfile
+
+    from qibo import result as result_module
+
+    c = Circuit(3)
+    c.add(gates.H(0))
+    c.add(gates.CNOT(0, 2))
+    c.add(gates.M(0, 2))
+    result = backend.execute_circuit(c, nshots=50)
+    samples = backend.to_numpy(result.samples())
+    filename = tmp_path / "result.npz"
+    result.dump(filename)
+    with zipfile.ZipFile(filename) as archive:
+        assert set(archive.namelist()) == {
+            "manifest.json",
+            "probabilities.npy",
+            "samples.npy",
+            "state.npy",
+        }
+        manifest = json.loads(archive.read("manifest.json"))
+    assert manifest["format"] == "qibo-result"
+    assert manifest["version"] == result_module.RESULT_VERSION
+    assert manifest["dtype"] == "CircuitResult"
+    # large arrays are memory-mapped from the file
+    monkeypatch.setattr(result_module, "MMAP_BYTES", 0)
+    with pytest.warns(UserWarning):
+        loaded = load_result(filename)
+    assert isinstance(loaded.state(), np.memmap)
+    assert not loaded.state().flags.writeable
+    backend.assert_allclose(loaded.state(), backend.to_numpy(result.state()))
+    np.testing.assert_array_equal(loaded.samples(), samples)
+
+    # pickled files of older versions are loaded only if allowed
+    filename = tmp_path / "result.npy"
+    np.save(filename, result.to_dict())
+    with pytest.raises(ValueError):
+        load_result(filename)
+    with pytest.warns(UserWarning):
+        loaded = load_result(filename, allow_pickle=True)
+    np.testing.assert_array_equal(loaded.samples(), samples)
+
+
+def test_quantumstate_dump_load_aligned(tmp_path):
+    from qibo import result as result_module
+
+    nqubits = 17
+    state = np.random.random(2**nqubits) + 1j * np.random.random(2**nqubits)
+    assert state.nbytes > result_module.MMAP_BYTES
+    filename = tmp_path / "state.npz"
+    QuantumState(state).dump(filename)
+    loaded = load_result(filename).state()
+    assert isinstance(loaded, np.memmap)
+    assert loaded.flags.aligned
+    assert loaded.offset % np.lib.format.ARRAY_ALIGN == 0
+    np.testing.assert_allclose(np.vdot(loaded, loaded), np.vdot(state, state))
+
+
+def test_quantumstatebatch_dump_load(backend):
+    c = Circuit(2)
+    c.add(gates.H(0))
+    c.add(gates.CNOT(0, 1))
+    initial_states = backend.cast(np.eye(4, dtype=complex))
+    if backend.name != "numpy":
+        pytest.skip("Batched execution is only available for the numpy backend.")
+    result = backend.execute_circuit(c, initial_states)
+    result.dump("tmp.npy")
+    loaded_result = load_result("tmp.npy")
+    remove("tmp.npy")
+    assert isinstance(loaded_result, QuantumStateBatch)
+    backend.assert_allclose(result.state(), loaded_result.state())
+    assert str(loaded_result).count("\n") == 3
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1000])
+def test_measurementoutcomes_iter_samples(backend, chunk_size):
+    from qibo import hamiltonians
+    from qibo.symbols import Z
+
+    c = Circuit(3)
+    c.add(gates.H(0))
+    c.add(gates.RX(1, theta=0.6))
+    c.add(gates.X(2))
+    c.add(gates.M(0, 1, 2))
+    nshots = 4000
+    result = backend.execute_circuit(c, nshots=nshots)
+    chunks = list(result.iter_samples(chunk_size))
+    assert not result.has_samples()
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    samples = backend.np.concatenate(chunks, axis=0)
+    assert tuple(samples.shape) == (nshots, 3)
+    decimal = backend.np.concatenate(list(result.iter_samples(chunk_size, False)))
+    assert tuple(decimal.shape) == (nshots,)
+    # the distribution is prepared once for all chunks and iterations
+    sampler = result._sampler
+    assert sampler is not None
+    list(result.iter_samples(chunk_size))
+    assert result._sampler is sampler
+
+    frequencies = result.stream_frequencies(chunk_size)
+    assert sum(frequencies.values()) == nshots
+    assert set(frequencies) <= {"001", "011", "101", "111"}
+    target = [0.5, np.sin(0.3) ** 2, 1]
+    backend.assert_allclose(result.stream_marginals(chunk_size), target, atol=5e-2)
+    observable = hamiltonians.SymbolicHamiltonian(Z(0) + Z(2), backend=backend)
+    expval = result.stream_expectation(observable, chunk_size)
+    backend.assert_allclose(expval, -1.0, atol=1e-1)
+
+    # samples that already exist are yielded in chunks
+    samples = result.samples()
+    chunks = list(result.iter_samples(chunk_size))
+    backend.assert_allclose(backend.np.concatenate(chunks, axis=0), samples)
+    with pytest.raises(ValueError):
+        next(result.iter_samples(0))